@@ -195,6 +195,11 @@ describe('Операция update', () => {
     const r = generateBotTableHandlers(nodesWithMultipleBotTables);
     expect(r).toContain('_bot_tables_cache = None');
   });
+
+  it('сбрасывает общий набор bot_tables воркера', () => {
+    const r = generateBotTableHandlers(nodesWithMultipleBotTables);
+    expect(r).toContain('_project_cache_invalidate("bot_tables")');
+  });
 });
 
 // ─── Автопереход ─────────────────────────────────────────────────────────────
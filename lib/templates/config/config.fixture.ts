@@ -66,7 +66,7 @@ if os.getenv("DISABLE_ASYNC_LOG", "true").lower() == "true":
     logging.getLogger("asyncpg").setLevel(logging.CRITICAL)
 
 # Создание бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
+bot = Bot(token=BOT_TOKEN, session=globals().get("WORKER_BOT_SESSION"))
 dp = Dispatcher()
 
 # Список администраторов (загружается из .env)
@@ -83,8 +83,8 @@ logging.info(f"📁 PROJECT_ID: {PROJECT_ID}")
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
 logging.info(f"📁 PROJECT_DIR: {PROJECT_DIR}")
 
-# Хранилище пользователей (временное состояние)
-user_data = {}
+# Хранилище пользователей (временное состояние): лимит USER_STATE_MAX_USERS, вытеснение LRU/TTL
+user_data = UserStateStore(USER_STATE_MAX_USERS)
 all_user_vars = {}  # Глобальные переменные пользователя
 
 # ┌─────────────────────────────────────────┐
@@ -124,7 +124,7 @@ if os.getenv("DISABLE_ASYNC_LOG", "true").lower() == "true":
     logging.getLogger("asyncpg").setLevel(logging.CRITICAL)
 
 # Создание бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
+bot = Bot(token=BOT_TOKEN, session=globals().get("WORKER_BOT_SESSION"))
 dp = Dispatcher()
 
 # Список администраторов (загружается из .env)
@@ -134,8 +134,8 @@ ADMIN_IDS = [int(x.strip()) for x in os.getenv("ADMIN_IDS", "").replace(" ", "")
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
 logging.info(f"📁 PROJECT_DIR: {PROJECT_DIR}")
 
-# Хранилище пользователей (временное состояние)
-user_data = {}
+# Хранилище пользователей (временное состояние): лимит USER_STATE_MAX_USERS, вытеснение LRU/TTL
+user_data = UserStateStore(USER_STATE_MAX_USERS)
 all_user_vars = {}  # Глобальные переменные пользователя
 
 # Пул соединений с базой данных (БД выключена — остаётся None,
@@ -169,7 +169,7 @@ if os.getenv("DISABLE_ASYNC_LOG", "true").lower() == "true":
     logging.getLogger("asyncpg").setLevel(logging.CRITICAL)
 
 # Создание бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
+bot = Bot(token=BOT_TOKEN, session=globals().get("WORKER_BOT_SESSION"))
 dp = Dispatcher()
 
 # Список администраторов (загружается из .env)
@@ -179,8 +179,8 @@ ADMIN_IDS = [int(x.strip()) for x in os.getenv("ADMIN_IDS", "").replace(" ", "")
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
 logging.info(f"📁 PROJECT_DIR: {PROJECT_DIR}")
 
-# Хранилище пользователей (временное состояние)
-user_data = {}
+# Хранилище пользователей (временное состояние): лимит USER_STATE_MAX_USERS, вытеснение LRU/TTL
+user_data = UserStateStore(USER_STATE_MAX_USERS)
 all_user_vars = {}  # Глобальные переменные пользователя
 
 # ┌─────────────────────────────────────────┐
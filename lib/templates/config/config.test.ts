@@ -173,7 +173,7 @@ describe('config.py.jinja2 шаблон', () => {
         assert.ok(result.includes('load_dotenv()'));
         assert.ok(result.includes('BOT_TOKEN = os.getenv'));
         assert.ok(result.includes('TOKEN_ID = int(os.getenv("TOKEN_ID", "0"))'));
-        assert.ok(result.includes('bot = Bot(token=BOT_TOKEN)'));
+        assert.ok(result.includes('bot = Bot(token=BOT_TOKEN, session=globals().get("WORKER_BOT_SESSION"))'));
         assert.ok(result.includes('dp = Dispatcher(storage=PostgresStorage())'));
       });
 
@@ -192,10 +192,37 @@ describe('config.py.jinja2 шаблон', () => {
       it('должен включать user_data и all_user_vars', () => {
         const result = generateConfig(validParamsAllDisabled);
 
-        assert.ok(result.includes('user_data = {}'));
+        assert.ok(result.includes('user_data = UserStateStore(USER_STATE_MAX_USERS)'));
         assert.ok(result.includes('all_user_vars = {}'));
       });
 
+      it('user_data — UserStateStore с лимитом и вытеснением LRU/TTL', () => {
+        const result = generateConfig(validParamsAllDisabled);
+
+        assert.ok(result.includes('class UserStateStore(OrderedDict):'));
+        assert.ok(result.includes('__slots__ = ("seen",)'));
+        assert.ok(result.includes('USER_STATE_MAX_USERS = max(1, int(os.getenv("USER_STATE_MAX_USERS", "50000")))'));
+        assert.ok(result.includes('async def user_state_middleware(handler, event, data):'));
+        assert.ok(!result.includes('SELECT user_data FROM bot_users'), 'без БД догрузка из bot_users не нужна');
+      });
+
+      it('вытеснение не теряет состояние: без Redis и для системного пользователя 0', () => {
+        const result = generateConfig(validParamsAllDisabled);
+        const evict = result.slice(result.indexOf('def _evict_lru'), result.indexOf('def sweep'));
+
+        assert.ok(evict.indexOf('if not (_redis_connected and _redis_client is not None):') < evict.indexOf('popitem(last=False)'));
+        assert.ok(evict.includes('self.move_to_end(0)'));
+        assert.ok(result.includes('def __missing__(self, user_id):'));
+        assert.ok(result.includes('self._unspill(batch)'));
+        assert.ok(!result.includes('"lost"'), 'вытесненные не отбрасываются');
+      });
+
+      it('с БД вытесненный пользователь догружается из bot_users', () => {
+        const result = generateConfig(validParamsAllEnabled);
+
+        assert.ok(result.includes('SELECT user_data FROM bot_users WHERE user_id = $1 AND project_id = $2 AND token_id = $3'));
+      });
+
       it('должен включать PROJECT_DIR', () => {
         const result = generateConfig(validParamsAllDisabled);
 
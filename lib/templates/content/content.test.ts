@@ -51,6 +51,13 @@ describe('generateContentCode()', () => {
     const result = generateContentCode(validParams);
     expect(result).toContain('reload_content');
   });
+
+  it('в worker pool делит _content с ботами проекта', () => {
+    const result = generateContentCode({ ...validParams, contentCache: true });
+    expect(result).toContain('async def _fetch_content(pool) -> dict');
+    expect(result).toContain('"content", lambda: _fetch_content(pool), ttl=60, table_derived=True');
+    expect(result).toContain('if globals().get("WORKER_PROJECT_CACHE") is not None:');
+  });
 });
 
 // ─── contentParamsSchema ─────────────────────────────────────────────────────
@@ -103,6 +103,22 @@ describe('database.py.jinja2 шаблон', () => {
         assert.ok(result.includes('avatar_url: str = None'));
         assert.ok(result.includes('avatar_url = COALESCE(EXCLUDED.avatar_url'));
       });
+
+      it('должен включать буфер отложенной записи переменных с одним upsert на пакет', () => {
+        const result = generateDatabase({ userDatabaseEnabled: true });
+
+        assert.ok(result.includes('class _UserVarWriter:'));
+        assert.ok(result.includes('_user_var_writer = _UserVarWriter()'));
+        assert.ok(result.includes('FROM unnest($3::bigint[], $4::text[]) AS u(user_id, patch)'));
+        assert.ok(result.includes("user_data = COALESCE(bot_users.user_data, '{}'::jsonb) || EXCLUDED.user_data"));
+      });
+
+      it('прямая запись update_user_data_in_db снимает отложенное значение ключа', () => {
+        const result = generateDatabase({ userDatabaseEnabled: true });
+        const fnIdx = result.indexOf('async def update_user_data_in_db');
+
+        assert.ok(result.indexOf('_user_var_writer.discard(user_id, data_key)', fnIdx) > fnIdx);
+      });
     });
 
     describe('Невалидные данные', () => {
@@ -174,6 +190,14 @@ describe('database.py.jinja2 шаблон', () => {
         assert.ok(result.includes('asyncpg.create_pool'));
       });
 
+      it('отмечает этапы db и ddl для таймлайна старта', () => {
+        const result = generateDatabase({ userDatabaseEnabled: true });
+        const pool = result.indexOf('asyncpg.create_pool');
+        const db = result.indexOf('_startup_mark("db")');
+        const ddl = result.indexOf('_startup_mark("ddl")');
+        assert.ok(pool >= 0 && pool < db && db < ddl);
+      });
+
       it('должен включать JSONB для user_data', () => {
         const result = generateDatabase({ userDatabaseEnabled: true });
 
@@ -300,8 +300,8 @@ describe('main.py.jinja2 шаблон', () => {
       it('должен содержать distributed lock через Redis', () => {
         const result = generateMain({ userDatabaseEnabled: false });
         assert.ok(result.includes('bot:lock:'), 'Redis lock ключ не найден');
-        assert.ok(result.includes('_lock_acquired'), '_lock_acquired не найден');
-        assert.ok(result.includes('nx=True'), 'nx=True (атомарный SET NX) не найден');
+        assert.ok(result.includes('_lease = _BotLease(_redis_client, BOT_TOKEN)'), '_BotLease не найден');
+        assert.ok(result.includes("'NX', 'PX'"), 'SET NX PX (атомарный lease) не найден');
       });
 
       it('не должен пересоздавать Dispatcher при переключении на Redis storage', () => {
@@ -311,22 +311,24 @@ describe('main.py.jinja2 шаблон', () => {
         assert.ok(result.includes('dp.fsm.storage = RedisStorage(_redis_client, TOKEN_ID)'));
       });
 
-      it('должен инициализировать _lock_acquired до try, чтобы finally не падал', () => {
+      it('должен инициализировать _lease до try, чтобы finally не падал', () => {
         const result = generateMain({ userDatabaseEnabled: false });
-        assert.ok(result.includes('_lock_acquired = False'));
-        assert.ok(result.indexOf('_lock_acquired = False') < result.indexOf('try:'));
+        const mainIdx = result.indexOf('async def main():');
+        assert.ok(result.indexOf('_lease = None', mainIdx) > mainIdx);
+        assert.ok(result.indexOf('_lease = None', mainIdx) < result.indexOf('try:', mainIdx));
       });
 
-      it('должен освобождать lock в finally', () => {
+      it('должен освобождать свой lease в finally', () => {
         const result = generateMain({ userDatabaseEnabled: false });
-        assert.ok(result.includes('_lock_acquired'), 'освобождение lock не найдено');
-        assert.ok(result.includes('_redis_client.delete'), '_redis_client.delete не найден в finally');
+        assert.ok(result.includes('if _lease is not None and _lease.is_leader:'), 'освобождение lease не найдено');
+        assert.ok(result.includes('await _lease.release()'), '_lease.release() не найден в finally');
       });
 
-      it('должен обновлять lock TTL через _refresh_lock', () => {
+      it('должен продлевать lease через _lease.keep() и поддерживать standby', () => {
         const result = generateMain({ userDatabaseEnabled: false });
-        assert.ok(result.includes('_refresh_lock'), 'фоновая задача _refresh_lock не найдена');
-        assert.ok(result.includes('expire'), 'expire для обновления TTL не найден');
+        assert.ok(result.includes('asyncio.create_task(_lease.keep())'), 'фоновая задача _lease.keep() не найдена');
+        assert.ok(result.includes('elif not BOT_STANDBY:'), 'ветка без standby не найдена');
+        assert.ok(result.includes('_bot_role("standby")'), 'роль standby не сообщается');
       });
 
       it('lock не блокирует запуск если Redis недоступен', () => {
@@ -334,6 +336,61 @@ describe('main.py.jinja2 шаблон', () => {
         assert.ok(result.includes('if _redis_connected and _redis_client is not None'), 'проверка доступности Redis не найдена');
       });
 
+      it('middleware регистрируются через _setup_dispatcher_middlewares() и в main()', () => {
+        const result = generateMain(validParamsEnabled);
+        const fnIdx = result.indexOf('def _setup_dispatcher_middlewares():');
+        const mainIdx = result.indexOf('async def main():');
+        assert.ok(fnIdx >= 0 && fnIdx < mainIdx);
+        assert.ok(result.indexOf('_setup_dispatcher_middlewares()', mainIdx) > mainIdx);
+        assert.strictEqual(result.split('dp.message.middleware(stale_update_filter_middleware)').length - 1, 1);
+      });
+
+      it('горячая замена кода забирает ресурсы прежней версии', () => {
+        const result = generateMain({ userDatabaseEnabled: true });
+        const idx = result.indexOf('async def _hot_reload_adopt(old):');
+        assert.ok(idx >= 0, '_hot_reload_adopt не найден');
+        const block = result.slice(idx, result.indexOf('def request_bot_stop', idx));
+        assert.ok(block.includes('bot = old.bot'));
+        assert.ok(block.includes('dp.fsm.storage = old.dp.fsm.storage'));
+        assert.ok(block.includes('user_data = old.user_data'));
+        assert.ok(block.includes('_setup_dispatcher_middlewares()'));
+      });
+
+      it('webhook в воркере регистрируется в общем сервере, вне воркера — свой TCPSite', () => {
+        const result = generateMain({ userDatabaseEnabled: false });
+        const idx = result.indexOf('if WEBHOOK_URL:');
+        assert.ok(idx >= 0, 'webhook-ветка не найдена');
+        const block = result.slice(idx, result.indexOf('else:\n            # Polling', idx));
+        assert.ok(block.includes('globals().get("WORKER_WEBHOOK_ROUTER")'));
+        assert.ok(block.includes('await _worker_webhook.register(TOKEN_ID, dp, bot, secret_token=_webhook_secret)'));
+        assert.ok(block.includes('bot.set_webhook(full_webhook_url, secret_token=_webhook_secret)'));
+        assert.ok(block.includes('web.TCPSite(runner, host="0.0.0.0", port=WEBHOOK_PORT)'));
+      });
+
+      it('отмечает этапы старта для таймлайна воркера (вне воркера — no-op)', () => {
+        const result = generateMain({
+          userDatabaseEnabled: true,
+          menuCommands: [{ command: 'start', description: 'Старт' }],
+        });
+        assert.ok(result.includes('_startup_mark = globals().get("WORKER_STARTUP_MARK") or (lambda _phase: None)'));
+        const redis = result.indexOf('_startup_mark("redis")');
+        const db = result.indexOf('await init_database()');
+        const caches = result.indexOf('_startup_mark("caches")');
+        const commands = result.indexOf('_startup_mark("commands")');
+        assert.ok(redis >= 0 && redis < db, 'redis отмечается до init_database');
+        assert.ok(db < caches && caches < commands, 'caches, затем commands');
+      });
+
+      it('отмечает конец сетевой инициализации: set_webhook и polling (слот старта воркера)', () => {
+        const result = generateMain({ userDatabaseEnabled: false });
+        const setWebhook = result.indexOf('await bot.set_webhook(full_webhook_url, secret_token=_webhook_secret)');
+        const webhookMark = result.indexOf('_startup_mark("set_webhook")');
+        assert.ok(setWebhook >= 0 && webhookMark > setWebhook, 'set_webhook отмечается после регистрации');
+        const pollingMark = result.indexOf('_startup_mark("polling")');
+        const startPolling = result.indexOf('asyncio.create_task(dp.start_polling(bot))');
+        assert.ok(pollingMark >= 0 && pollingMark < startPolling, 'polling отмечается до start_polling');
+      });
+
       it('CancelledError из воркера должен re-raise (статус stopped в worker)', () => {
         const result = generateMain({ userDatabaseEnabled: false });
         const idx = result.indexOf('except asyncio.CancelledError:');
@@ -72,6 +72,33 @@ describe('init_all_user_vars()', () => {
     expect(r).not.toContain('bot_users');
   });
 
+  it('слой БД собирается один раз за апдейт через контекст переменных', () => {
+    const r = generateUtils(validParamsEnabled);
+    expect(r).toContain('async def update_vars_middleware(handler, event, data):');
+    expect(r).toContain('_update_vars.set({})');
+    expect(r).toContain('_layer = await _user_vars_layer(user_id)');
+    expect(r).toContain('_update_vars_counters["db_queries"] += 1');
+  });
+
+  it('возвращает UserVarsView вместо разворачивания в плоские ключи', () => {
+    const r = generateUtils(validParamsDisabled);
+    expect(r).toContain('class UserVarsView(dict):');
+    expect(r).toContain('return UserVarsView(all_vars)');
+    expect(r).not.toContain('_flatten_dict');
+  });
+
+  it('each-блок копирует переменные с сохранением разрешения путей', () => {
+    expect(generateUtils(validParamsDisabled)).toContain('_item_vars = variables.copy()');
+  });
+
+  it('память читается при каждом вызове и важнее слоя БД', () => {
+    const r = generateUtils(validParamsEnabled);
+    const fnIdx = r.indexOf('async def init_all_user_vars');
+    const body = r.slice(fnIdx, r.indexOf('return all_vars', fnIdx));
+    expect(body).toContain('all_vars = dict(user_data.get(user_id, {}))');
+    expect(body).toContain('if _k not in all_vars:');
+  });
+
   it('добавляет project_id как системную переменную', () => {
     const r = generateUtils(validParamsDisabled);
     expect(r).toContain('"project_id" not in all_vars');
@@ -83,6 +110,13 @@ describe('init_all_user_vars()', () => {
     expect(r).toContain('"token_id" not in all_vars');
     expect(r).toContain('all_vars["token_id"] = str(TOKEN_ID) if TOKEN_ID else ""');
   });
+
+  it('в worker pool берёт Bot Tables из общего кэша проекта', () => {
+    const r = generateUtils(validParamsDisabled);
+    expect(r).toContain('async def _load_bot_tables() -> dict');
+    expect(r).toContain('globals().get("WORKER_PROJECT_CACHE")');
+    expect(r).toContain('_project_cache.get("bot_tables", _load_bot_tables, ttl=60, table_derived=True)');
+  });
 });
 
 // ─── check_auth ───────────────────────────────────────────────────────────────
@@ -118,6 +152,16 @@ describe('set_user_var()', () => {
     const r = generateUtils(validParamsDisabled);
     expect(r).not.toContain('sync_user_attribution_to_db');
   });
+
+  it('с БД пишет переменную через буфер, а не задачей на каждую переменную', () => {
+    const r = generateUtils(validParamsEnabled);
+    expect(r).toContain('_user_var_writer.put(user_id, key, value)');
+    expect(r).not.toContain('_persist_user_var');
+  });
+
+  it('без БД не использует буфер записи', () => {
+    expect(generateUtils(validParamsDisabled)).not.toContain('_user_var_writer');
+  });
 });
 
 // ─── is_admin ─────────────────────────────────────────────────────────────────
@@ -152,8 +196,8 @@ describe('replace_variables_in_text()', () => {
 
   it('поддерживает dot-notation для вложенных JSON путей', () => {
     const r = generateUtils(validParamsDisabled);
-    // Функция должна содержать логику разбора пути через точку (через _re.split)
-    expect(r).toContain("_re.split(r'\\.");
+    // Путь разбирается по точкам (вне [...]) один раз — при компиляции текста
+    expect(r).toContain("_TPL_PATH_SPLIT = _re_tpl.compile(r'\\.");
   });
 
   it('разворачивает вложенный путь из JSON-строки', () => {
@@ -179,6 +223,40 @@ describe('replace_variables_in_text()', () => {
     // Паттерн поддерживает {var}, {a.b.c}, {a.b[0][1].c}
     expect(r).toContain(String.raw`r'\{([\w.\[\]]+)\}'`);
   });
+
+  it('компилирует текст в сегменты с LRU-кэшем по тексту', () => {
+    const r = generateUtils(validParamsDisabled);
+    expect(r).toContain('TEXT_TEMPLATE_CACHE_SIZE = max(16, int(os.getenv("TEXT_TEMPLATE_CACHE_SIZE", "1024")))');
+    expect(r).toContain('@_lru_cache(maxsize=TEXT_TEMPLATE_CACHE_SIZE)\ndef _compile_text_template(text: str) -> tuple:');
+    expect(r).toContain('_segments, _builtins = _compile_text_template(text)');
+  });
+
+  it('текст без { возвращается без компиляции', () => {
+    const r = generateUtils(validParamsDisabled);
+    const fn = r.slice(r.indexOf('def replace_variables_in_text'), r.indexOf('def _tpl_var_sub'));
+    expect(fn.indexOf('if "{" not in text:')).toBeGreaterThan(-1);
+    expect(fn.indexOf('if "{" not in text:')).toBeLessThan(fn.indexOf('_compile_text_template(text)'));
+  });
+
+  it('встроенные now/today/time считаются только при упоминании в тексте', () => {
+    const r = generateUtils(validParamsDisabled);
+    const fn = r.slice(r.indexOf('def replace_variables_in_text'), r.indexOf('def _tpl_var_sub'));
+    expect(fn).toContain('_tpl_time_builtins(variables, _builtins)');
+    expect(fn).not.toContain('import pytz');
+    expect(r).toContain('_TPL_TIME_BUILTINS = frozenset(("now", "today", "time", "__now", "__now__"))');
+  });
+
+  it('вложенные each-блоки закрываются парно', () => {
+    const r = generateUtils(validParamsDisabled);
+    expect(r).toContain('def _tpl_each_close(text: str, pos: int) -> int:');
+    expect(r).toContain('_close = _tpl_each_close(text, _m.end())');
+  });
+
+  it('повторные проходы подстановки — только если значения содержат {переменные}', () => {
+    const r = generateUtils(validParamsDisabled);
+    expect(r).toContain('if _changed and "{" in result:');
+    expect(r).toContain('for _pass in range(2):');
+  });
 });
 
 // ─── utilsParamsSchema ────────────────────────────────────────────────────────
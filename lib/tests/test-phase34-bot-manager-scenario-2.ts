@@ -511,9 +511,9 @@ test('Q16', 'синтаксис Python OK для всего расширенно
 // ══ Блок R: Dot-notation глубже одного уровня ══════════════════════════════
 console.log('\n══ Блок R: Dot-notation глубже одного уровня ══════════════════════');
 
-test('R01', 'init_all_user_vars содержит рекурсивную функцию _flatten_dict', () => {
-  ok(code.includes('_flatten_dict'), 'рекурсивная функция _flatten_dict не найдена — двухуровневые переменные не будут подставляться');
-  ok(code.includes('_max_depth'), 'параметр _max_depth не найден — нет защиты от глубокой рекурсии');
+test('R01', 'init_all_user_vars разрешает пути через UserVarsView', () => {
+  ok(code.includes('def _resolve_var_path('), 'функция _resolve_var_path не найдена — двухуровневые переменные не будут подставляться');
+  ok(code.includes('_VAR_PATH_MAX_DEPTH'), 'ограничение _VAR_PATH_MAX_DEPTH не найдено — нет защиты от глубокой рекурсии');
 });
 
 test('R02', 'token_status.instance.statusLabel подставляется через одноуровневый ключ', () => {
@@ -526,10 +526,10 @@ test('R03', 'синтаксис Python OK после добавления рек
   ok(r.ok, `Синтаксическая ошибка:\n${r.error}`);
 });
 
-test('R04', '_flatten_dict разворачивает списки с индексами [0][1]...', () => {
+test('R04', '_resolve_var_path разрешает списки с индексами [0][1]...', () => {
   // Проверяем что в сгенерированном коде есть поддержка индексов списков
   ok(code.includes('[0]') || code.includes('isinstance(v, list)'),
-     '_flatten_dict не поддерживает индексы списков — {var.array[0][0].field} не будет подставляться');
+     '_resolve_var_path не поддерживает индексы списков — {var.array[0][0].field} не будет подставляться');
 });
 
 // ══ Блок S: Аватарка бота в карточке токена ══════════════════════════════════
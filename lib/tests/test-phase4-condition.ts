@@ -2344,14 +2344,15 @@ test('W09', 'трёхуровневая dot-notation: a.b.c.d подставля
   syntax(code, 'w09');
 });
 
-test('W10', 'init_all_user_vars содержит рекурсивную функцию _flatten_dict', () => {
-  // Проверяем что в сгенерированном коде есть рекурсивная функция разворачивания
+test('W10', 'init_all_user_vars возвращает UserVarsView с разрешением путей по запросу', () => {
+  // Проверяем что в сгенерированном коде пути a.b[0].c разрешаются лениво, а не разворачиваются заранее
   const p = makeCleanProject([
     makeConditionNode('cond1', 'x', [makeBranch('filled')]),
   ]);
   const code = gen(p, 'w10');
-  ok(code.includes('_flatten_dict'), 'рекурсивная функция _flatten_dict не найдена в коде');
-  ok(code.includes('_max_depth'), 'параметр _max_depth не найден — защита от глубокой рекурсии отсутствует');
+  ok(code.includes('class UserVarsView(dict):'), 'класс UserVarsView не найден в коде');
+  ok(code.includes('return UserVarsView(all_vars)'), 'init_all_user_vars должен возвращать UserVarsView');
+  ok(code.includes('_VAR_PATH_MAX_DEPTH'), 'ограничение глубины _VAR_PATH_MAX_DEPTH не найдено — защита от глубокой рекурсии отсутствует');
   syntax(code, 'w10');
 });
 
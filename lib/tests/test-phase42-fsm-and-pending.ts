@@ -201,12 +201,12 @@ test('C03', 'PostgresStorage определяется ДО dp = Dispatcher', ()
   ok(classIdx < dpIdx, 'PostgresStorage должен быть определён ДО dp = Dispatcher');
 });
 
-test('C04', 'user_data = {} определяется ДО PostgresStorage', () => {
-  const udIdx    = codeNoDb.indexOf('user_data = {}');
+test('C04', 'user_data = UserStateStore(...) определяется ДО PostgresStorage', () => {
+  const udIdx    = codeNoDb.indexOf('user_data = UserStateStore(USER_STATE_MAX_USERS)');
   const classIdx = codeNoDb.indexOf('class PostgresStorage');
-  ok(udIdx    !== -1, 'user_data = {} не найден');
+  ok(udIdx    !== -1, 'user_data = UserStateStore(...) не найден');
   ok(classIdx !== -1, 'class PostgresStorage не найден');
-  ok(udIdx < classIdx, 'user_data = {} должен быть определён ДО PostgresStorage');
+  ok(udIdx < classIdx, 'user_data должен быть определён ДО PostgresStorage');
 });
 
 // ══ Блок D: Stale update filter ═══════════════════════════════════════════════
@@ -299,7 +299,7 @@ test('G02', 'get_state читает из user_data.get(uid, {}).get("__fsm_state
 test('G03', 'FSM данные хранятся в той же структуре что и обычные переменные пользователя', () => {
   // user_data[uid] используется и для FSM (__fsm_state__, __fsm_data__) и для обычных переменных
   ok(codeNoDb.includes('user_data[uid]'), 'user_data[uid] не найден — FSM и user_data не интегрированы');
-  ok(codeNoDb.includes('user_data = {}'), 'user_data = {} не найден — общее хранилище отсутствует');
+  ok(codeNoDb.includes('user_data = UserStateStore(USER_STATE_MAX_USERS)'), 'user_data = UserStateStore(...) не найден — общее хранилище отсутствует');
 });
 
 // ══ Блок H: FSM в обработчиках ════════════════════════════════════════════════
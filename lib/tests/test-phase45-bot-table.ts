@@ -18,6 +18,7 @@
  * Блок N: WHERE операторы (N01–N07)
  * Блок O: Автопереход (O01–O03)
  * Блок P: Синтаксис полных сценариев (P01–P05)
+ * Блок Q: Запись и чтение таблицы в одном апдейте (Q01–Q02)
  */
 
 import fs from 'fs';
@@ -532,6 +533,48 @@ test('P05', 'Полный сценарий: cmd → upsert + returnInsertedId 
   ]), 'P05'), 'P05');
 });
 
+// ─── Блок Q: Запись и чтение таблицы в одном апдейте ─────────────────────────
+
+test('Q01', 'insert сбрасывает кэш Bot Tables через _project_cache_invalidate', () => {
+  const code = gen(makeCleanProject([makeBT('bt_q1', { operation: 'insert', tableName: 'players', row: { score: '5' } })]), 'Q01');
+  ok(code.includes('_project_cache_invalidate("bot_tables")'), 'Нет _project_cache_invalidate("bot_tables")');
+  const fnIdx = code.indexOf('def _project_cache_invalidate');
+  const body = code.slice(fnIdx, code.indexOf('_project_cache = globals()', fnIdx));
+  ok(body.includes('_update_vars.get()') && body.includes('_ctx.clear()'), 'Слой переменных апдейта не сбрасывается');
+});
+
+test('Q02', 'Python: после записи в таблицу следующий узел того же апдейта читает новые table.*', () => {
+  const code = gen(makeCleanProject([makeBT('bt_q2', { operation: 'insert', tableName: 'players', row: { score: '5' } })]), 'Q02');
+  const invStart = code.indexOf('def _project_cache_invalidate');
+  const invEnd = code.indexOf('# Глубина путей', invStart);
+  const layerStart = code.indexOf('async def _user_vars_layer');
+  const layerEnd = code.indexOf('async def init_all_user_vars', layerStart);
+  ok(invStart > -1 && invEnd > invStart && layerStart > -1 && layerEnd > layerStart, 'Не найдены функции слоя переменных');
+  const script = [
+    'import asyncio',
+    code.slice(invStart, invEnd),
+    code.slice(layerStart, layerEnd),
+    '_loads = []',
+    'async def _load_user_vars_base(user_id):',
+    '    _loads.append(user_id)',
+    '    return {"table.players.score": str(len(_loads))}',
+    'async def _handler(event, data):',
+    '    _first = (await _user_vars_layer(1))["base"]["table.players.score"]',
+    '    _again = (await _user_vars_layer(1))["base"]["table.players.score"]',
+    '    _project_cache_invalidate("bot_tables")',
+    '    _after = (await _user_vars_layer(1))["base"]["table.players.score"]',
+    '    print(_first, _again, _after)',
+    'asyncio.run(update_vars_middleware(_handler, None, {}))',
+  ].join('\n');
+  const tmp = '_tmp_p45_Q02.py';
+  fs.writeFileSync(tmp, script, 'utf-8');
+  let out = '';
+  try { out = execSync(`python ${tmp}`, { stdio: 'pipe', encoding: 'utf8' }).toString().trim(); }
+  catch (e: any) { throw new Error(e.stderr?.toString() ?? String(e)); }
+  finally { try { fs.unlinkSync(tmp); } catch {} }
+  ok(out === '1 1 2', `Ожидалось "1 1 2" (слой из контекста, затем перечитан после записи), получено "${out}"`);
+});
+
 // ─── Итоги ───────────────────────────────────────────────────────────────────
 const passed = results.filter(r => r.passed).length;
 const failed = results.filter(r => !r.passed).length;
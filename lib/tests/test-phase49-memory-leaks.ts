@@ -2,14 +2,14 @@
  * @fileoverview     (Memory Leaks)
  *
  *     :
- *  1. USER_DATA_TTL + _user_last_seen + cleanup_user_data (utils.py.jinja2)
+ *  1. USER_DATA_TTL + user_data.touch + cleanup_user_data (utils.py.jinja2)
  *  2. asyncio.create_task(cleanup_user_data())  main() (main.py.jinja2)
  *  3. signal_handler  loop.stop()  sys.exit(0) (main.py.jinja2)
  *  4. templateCache  MAX_CACHE_SIZE = 100 (template-renderer.ts)
  *
  * :
  *  A. USER_DATA_TTL  (10 )
- *  B. _user_last_seen  (10 )
+ *  B. user_data.touch  (10 )
  *  C. cleanup_user_data  (15 )
  *  D. asyncio.create_task(cleanup_user_data())  main() (10 )
  *  E. signal_handler  loop.stop()  sys.exit() (15 )
@@ -350,76 +350,76 @@ test('A10', '
 });
 
 // ===============================================================================
-//  B: _user_last_seen 
+//  B: user_data.touch 
 // ===============================================================================
 
-console.log('\n--  B: _user_last_seen  -----------------------------');
+console.log('\n--  B: user_data.touch  -----------------------------');
 
-test('B01', '_user_last_seen: dict[int, float] = {}   ', () => {
+test('B01', '__slots__ = ("seen",)   ', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'B01');
-  ok(code.includes('_user_last_seen: dict[int, float] = {}'), '_user_last_seen: dict[int, float] = {}  ');
+  ok(code.includes('__slots__ = ("seen",)'), '__slots__ = ("seen",)  ');
 });
 
-test('B02', '_user_last_seen   DB ', () => {
+test('B02', 'user_data.touch   DB ', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')], true);
   const code = genDB(p, 'B02');
-  ok(code.includes('_user_last_seen'), '_user_last_seen   DB=true');
+  ok(code.includes('user_data.touch'), 'user_data.touch   DB=true');
 });
 
-test('B03', '_user_last_seen   DB ', () => {
+test('B03', 'user_data.touch   DB ', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')], false);
   const code = gen(p, 'B03');
-  ok(code.includes('_user_last_seen'), '_user_last_seen   DB=false');
+  ok(code.includes('user_data.touch'), 'user_data.touch   DB=false');
 });
 
-test('B04', '_user_last_seen[user_id] = time.monotonic()   init_user_variables', () => {
+test('B04', 'user_data.touch(user_id)   init_user_variables', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'B04');
-  ok(code.includes('_user_last_seen[user_id] = time.monotonic()'), '_user_last_seen[user_id] = time.monotonic()  ');
+  ok(code.includes('user_data.touch(user_id)'), 'user_data.touch(user_id)  ');
 });
 
-test('B05', '_user_last_seen    init_user_variables', () => {
+test('B05', 'user_data.touch    init_user_variables', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'B05');
   const initIdx = code.indexOf('async def init_user_variables');
   ok(initIdx !== -1, 'init_user_variables  ');
   const afterInit = code.slice(initIdx, initIdx + 600);
-  ok(afterInit.includes('_user_last_seen'), '_user_last_seen     init_user_variables');
+  ok(afterInit.includes('user_data.touch'), 'user_data.touch     init_user_variables');
 });
 
-test('B06', '_user_last_seen.items()   cleanup_user_data', () => {
+test('B06', 'user_data.sweep(USER_DATA_TTL)   cleanup_user_data', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'B06');
-  ok(code.includes('_user_last_seen.items()'), '_user_last_seen.items()  ');
+  ok(code.includes('user_data.sweep(USER_DATA_TTL)'), 'user_data.sweep(USER_DATA_TTL)  ');
 });
 
-test('B07', '_user_last_seen.pop(uid, None) ', () => {
+test('B07', 'OrderedDict.__delitem__(self, user_id) ', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'B07');
-  ok(code.includes('_user_last_seen.pop(uid, None)'), '_user_last_seen.pop(uid, None)  ');
+  ok(code.includes('OrderedDict.__delitem__(self, user_id)'), 'OrderedDict.__delitem__(self, user_id)  ');
 });
 
-test('B08', '_user_last_seen     adminOnly', () => {
+test('B08', 'user_data.touch     adminOnly', () => {
   const cmd = makeCommandTriggerNode('cmd1', '/admin', 'msg1');
   cmd.data = { ...cmd.data, adminOnly: true } as any;
   const p = makeCleanProject([cmd, makeMessageNode('msg1')]);
   const code = gen(p, 'B08');
-  ok(code.includes('_user_last_seen'), '_user_last_seen   adminOnly');
+  ok(code.includes('user_data.touch'), 'user_data.touch   adminOnly');
 });
 
-test('B09', '_user_last_seen     requiresAuth', () => {
+test('B09', 'user_data.touch     requiresAuth', () => {
   const cmd = makeCommandTriggerNode('cmd1', '/profile', 'msg1');
   cmd.data = { ...cmd.data, requiresAuth: true } as any;
   const p = makeCleanProject([cmd, makeMessageNode('msg1')]);
   const code = gen(p, 'B09');
-  ok(code.includes('_user_last_seen'), '_user_last_seen   requiresAuth');
+  ok(code.includes('user_data.touch'), 'user_data.touch   requiresAuth');
 });
 
-test('B10', ' Python OK   _user_last_seen', () => {
+test('B10', ' Python OK   user_data.touch', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'B10');
-  ok(code.includes('_user_last_seen'), '_user_last_seen ');
+  ok(code.includes('user_data.touch'), 'user_data.touch ');
   syntax(code, 'B10');
 });
 
@@ -444,31 +444,31 @@ test('C02', 'cleanup_user_data 
   ok(fnBody.includes('while True:'), 'while True:    cleanup_user_data');
 });
 
-test('C03', 'cleanup_user_data  await asyncio.sleep(USER_DATA_TTL)', () => {
+test('C03', 'cleanup_user_data  await asyncio.sleep(USER_STATE_TICK)', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'C03');
-  ok(code.includes('await asyncio.sleep(USER_DATA_TTL)'), 'await asyncio.sleep(USER_DATA_TTL)  ');
+  ok(code.includes('await asyncio.sleep(USER_STATE_TICK)'), 'await asyncio.sleep(USER_STATE_TICK)  ');
 });
 
-test('C04', 'cleanup_user_data  time.monotonic()', () => {
+test('C04', 'cleanup_user_data  user_data.flush_spill()', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'C04');
   const fnIdx = code.indexOf('async def cleanup_user_data()');
   ok(fnIdx !== -1, 'cleanup_user_data  ');
   const fnBody = code.slice(fnIdx, fnIdx + 800);
-  ok(fnBody.includes('time.monotonic()'), 'time.monotonic()    cleanup_user_data');
+  ok(fnBody.includes('user_data.flush_spill()'), 'user_data.flush_spill()    cleanup_user_data');
 });
 
-test('C05', 'cleanup_user_data  user_data.pop(uid, None)', () => {
+test('C05', 'cleanup_user_data  expired = user_data.sweep(USER_DATA_TTL)', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'C05');
-  ok(code.includes('user_data.pop(uid, None)'), 'user_data.pop(uid, None)  ');
+  ok(code.includes('expired = user_data.sweep(USER_DATA_TTL)'), 'expired = user_data.sweep(USER_DATA_TTL)  ');
 });
 
-test('C06', 'cleanup_user_data  _user_last_seen.pop(uid, None)', () => {
+test('C06', 'cleanup_user_data  await user_data.flush_spill()', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'C06');
-  ok(code.includes('_user_last_seen.pop(uid, None)'), '_user_last_seen.pop(uid, None)  ');
+  ok(code.includes('await user_data.flush_spill()'), 'await user_data.flush_spill()  ');
 });
 
 test('C07', 'cleanup_user_data  logging.debug', () => {
@@ -480,13 +480,13 @@ test('C07', 'cleanup_user_data 
   ok(fnBody.includes('logging.debug'), 'logging.debug    cleanup_user_data');
 });
 
-test('C08', 'cleanup_user_data uses USER_DATA_TTL and _user_last_seen', () => {
+test('C08', 'cleanup_user_data uses USER_DATA_TTL and user_data.sweep', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'C08');
   const cleanupIdx = code.indexOf('async def cleanup_user_data');
   ok(cleanupIdx !== -1, 'cleanup_user_data not found');
   const cleanupBody = code.slice(cleanupIdx, cleanupIdx + 800);
-  ok(cleanupBody.includes('USER_DATA_TTL') && cleanupBody.includes('_user_last_seen'), 'TTL cleanup logic missing');
+  ok(cleanupBody.includes('USER_DATA_TTL') && cleanupBody.includes('user_data.sweep'), 'TTL cleanup logic missing');
 });
 
 test('C09', 'cleanup_user_data   DB ', () => {
@@ -942,9 +942,9 @@ test('G09', 'renderPartialTemplate utils/utils.py.jinja2 
   ok(result.includes('USER_DATA_TTL'), 'USER_DATA_TTL    utils.py.jinja2');
 });
 
-test('G10', 'renderPartialTemplate utils/utils.py.jinja2  _user_last_seen', () => {
+test('G10', 'renderPartialTemplate utils/utils.py.jinja2  user_data.touch', () => {
   const result = renderPartialTemplate('utils/utils.py.jinja2', { adminOnly: false, userDatabaseEnabled: false });
-  ok(result.includes('_user_last_seen'), '_user_last_seen    utils.py.jinja2');
+  ok(result.includes('user_data.touch'), 'user_data.touch    utils.py.jinja2');
 });
 
 // ===============================================================================
@@ -1129,11 +1129,11 @@ test('I02', 'import sys 
   ok(!handlerBody.includes('import sys'), 'import sys   signal_handler  !');
 });
 
-test('I03', 'user_data    _user_last_seen (  )', () => {
+test('I03', 'user_data    user_data.touch (  )', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'I03');
   ok(code.includes('user_data'), 'user_data    ');
-  ok(code.includes('_user_last_seen'), '_user_last_seen       ');
+  ok(code.includes('user_data.touch'), 'user_data.touch       ');
 });
 
 test('I04', 'cleanup_user_data       5  ', () => {
@@ -1174,11 +1174,11 @@ test('I07', 'USER_DATA_TTL 
   ok(count === 1, `USER_DATA_TTL = 3600  ${count} (),  1`);
 });
 
-test('I08', '_user_last_seen   1 ', () => {
+test('I08', 'UserStateStore   1 ', () => {
   const p = makeCleanProject([makeStartNode(), makeMessageNode('msg1')]);
   const code = gen(p, 'I08');
-  const count = (code.match(/_user_last_seen: dict\[int, float\] = \{\}/g) || []).length;
-  ok(count === 1, `_user_last_seen: dict[int, float] = {}  ${count} (),  1`);
+  const count = (code.match(/class UserStateStore\(OrderedDict\):/g) || []).length;
+  ok(count === 1, `class UserStateStore(OrderedDict):  ${count} (),  1`);
 });
 
 test('I09', 'cleanup_user_data   1 ', () => {
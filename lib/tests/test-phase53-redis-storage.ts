@@ -170,14 +170,14 @@ test('B06', 'при Redis storage Dispatcher не пересоздаётся и
   ok(codeNoDb.includes('dp.fsm.storage = RedisStorage(_redis_client, TOKEN_ID)'), 'переключение dp.fsm.storage на RedisStorage(TOKEN_ID) не найдено');
 });
 
-test('B07', '_lock_acquired инициализируется до try', () => {
+test('B07', '_lease инициализируется до try', () => {
   const mainIndex = codeNoDb.indexOf('async def main():');
-  const lockIndex = codeNoDb.indexOf('_lock_acquired = False', mainIndex);
+  const lockIndex = codeNoDb.indexOf('_lease = None', mainIndex);
   const tryIndex = codeNoDb.indexOf('try:', mainIndex);
   ok(mainIndex !== -1, 'async def main(): не найден');
-  ok(lockIndex !== -1, '_lock_acquired = False не найден');
+  ok(lockIndex !== -1, '_lease = None не найден');
   ok(tryIndex !== -1, 'try: не найден');
-  ok(lockIndex < tryIndex, '_lock_acquired должен инициализироваться до try');
+  ok(lockIndex < tryIndex, '_lease должен инициализироваться до try');
 });
 
 test('B08', 'init_redis_client делает retry с backoff', () => {
@@ -241,21 +241,33 @@ test('F01', 'bot:lock: ключ присутствует в main()', () => {
   ok(codeNoDb.includes('bot:lock:'), 'Redis lock ключ bot:lock: не найден');
 });
 
-test('F02', '_lock_acquired присутствует', () => {
-  ok(codeNoDb.includes('_lock_acquired'), '_lock_acquired не найден');
+test('F02', '_BotLease с коротким TTL (BOT_LEASE_TTL)', () => {
+  ok(codeNoDb.includes('class _BotLease'), 'класс _BotLease не найден');
+  ok(codeNoDb.includes('BOT_LEASE_TTL = max(3.0, float(os.getenv("BOT_LEASE_TTL", "10")))'), 'BOT_LEASE_TTL не найден');
 });
 
-test('F03', 'nx=True — атомарный SET NX для lock', () => {
-  ok(codeNoDb.includes('nx=True'), 'nx=True не найден — lock не атомарный');
+test('F03', 'SET NX PX + fence атомарно в Lua', () => {
+  ok(codeNoDb.includes("'NX', 'PX'"), 'SET NX PX не найден — lease не атомарный');
+  ok(codeNoDb.includes("redis.call('incr', KEYS[2])"), 'INCR fence не найден');
+  ok(codeNoDb.includes('bot:lock_fence:'), 'ключ bot:lock_fence: не найден');
 });
 
-test('F04', '_refresh_lock обновляет TTL каждые 30 секунд', () => {
-  ok(codeNoDb.includes('_refresh_lock'), 'фоновая задача _refresh_lock не найдена');
-  ok(codeNoDb.includes('expire'), 'expire для обновления TTL не найден');
+test('F04', 'продление lease каждые TTL/3 только своим значением', () => {
+  ok(codeNoDb.includes('_interval = BOT_LEASE_TTL / 3'), 'интервал продления TTL/3 не найден');
+  ok(codeNoDb.includes("redis.call('pexpire', KEYS[1], ARGV[2])"), 'pexpire в _LEASE_RENEW_LUA не найден');
+  ok(!codeNoDb.includes('_refresh_lock'), 'старый _refresh_lock не должен остаться');
 });
 
-test('F05', 'lock освобождается в finally', () => {
-  ok(codeNoDb.includes('_redis_client.delete'), '_redis_client.delete не найден в finally');
+test('F05', 'lease освобождается в finally и будит standby', () => {
+  ok(codeNoDb.includes('await _lease.release()'), '_lease.release() не найден в finally');
+  ok(codeNoDb.includes('bot:lock_released:'), 'канал bot:lock_released: не найден');
+});
+
+test('F05b', 'standby ждёт лидерства без getUpdates', () => {
+  ok(codeNoDb.includes('BOT_STANDBY = os.getenv("BOT_STANDBY", "false")'), 'BOT_STANDBY не найден');
+  ok(codeNoDb.includes('await _lease.wait_role(_stop_event, leader=True)'), 'ожидание лидерства не найдено');
+  ok(codeNoDb.includes('await _lease.wait_role(_stop_event, leader=False)'), 'остановка polling при потере lease не найдена');
+  ok(codeNoDb.includes('_startup_mark("standby")'), 'этап standby не найден');
 });
 
 test('F06', 'lock не блокирует запуск если Redis недоступен', () => {
@@ -340,6 +352,12 @@ test('H06', 'emit обёрнут в try/except RuntimeError', () => {
   ok(codeNoDb.includes('except RuntimeError'), 'except RuntimeError не найден в emit');
 });
 
+test('H06b', '_RedisLogHandler ограничивает поток token bucket и публикует сводку пропущенного', () => {
+  ok(codeNoDb.includes('LOG_REDIS_RATE'), 'LOG_REDIS_RATE не найден');
+  ok(codeNoDb.includes('globals().get("WORKER_LOG_LIMITS")'), 'лимиты воркера не используются');
+  ok(codeNoDb.includes('loop.call_later(self._SUMMARY_INTERVAL, self._publish_dropped)'), 'сводка пропущенного не найдена');
+});
+
 test('H07', 'синтаксис Python OK с _RedisLogHandler', () => {
   syntax(codeNoDb, 'h07');
 });
@@ -2,8 +2,8 @@
  * @fileoverview Фаза 63 — Inline Expressions {=...} в текстах сообщений
  *
  * Тестирует что шаблон utils.py.jinja2 содержит обработку inline-выражений
- * через regex {=([^}]+)} и функцию _inline_expr_replacer, и что эта обработка
- * происходит до основной замены переменных (_resolve).
+ * через regex {=([^}]+)}: при компиляции текста выражение становится сегментом
+ * _SEG_EXPR (после #each, до переменных {var}) и вычисляется через _eval_expr.
  */
 
 import { renderPartialTemplate } from '../templates/template-renderer.ts';
@@ -43,9 +43,9 @@ console.log('╚═════════════════════
 
 // ─── Тесты ───────────────────────────────────────────────────────────────────
 
-test('01', 'Содержит функцию _inline_expr_replacer', () => {
+test('01', 'Inline-выражение компилируется в отдельный сегмент _SEG_EXPR', () => {
   const code = renderUtils();
-  ok(code.includes('_inline_expr_replacer'), 'Должен содержать _inline_expr_replacer');
+  ok(code.includes('_segments.append((_SEG_EXPR, _m.group(1), _m.group(0)))'), 'Должен создавать сегмент _SEG_EXPR');
 });
 
 test('02', 'Содержит regex для {=...}', () => {
@@ -53,39 +53,41 @@ test('02', 'Содержит regex для {=...}', () => {
   ok(code.includes('\\{=([^}]+)\\}'), 'Должен содержать regex \\{=([^}]+)\\}');
 });
 
-test('03', 'Содержит вызов _eval_expr внутри _inline_expr_replacer', () => {
+test('03', 'Сегмент выражения вычисляется через _eval_expr', () => {
   const code = renderUtils();
-  const fnStart = code.indexOf('def _inline_expr_replacer');
-  const fnEnd = code.indexOf('result = _re.sub', fnStart);
-  ok(fnStart > -1, '_inline_expr_replacer должен быть определён');
-  ok(fnEnd > fnStart, 're.sub должен быть после определения функции');
+  const fnStart = code.indexOf('def replace_variables_in_text');
+  const fnEnd = code.indexOf('def _tpl_var_sub', fnStart);
+  ok(fnStart > -1, 'replace_variables_in_text должен быть определён');
+  ok(fnEnd > fnStart, '_tpl_var_sub должен быть после replace_variables_in_text');
   const fnBody = code.slice(fnStart, fnEnd);
-  ok(fnBody.includes('_eval_expr'), '_inline_expr_replacer должен вызывать _eval_expr');
+  ok(fnBody.includes('_eval_expr(_seg[1], variables)'), 'Сегмент _SEG_EXPR должен вычисляться через _eval_expr');
 });
 
-test('04', 'Inline expressions обрабатываются до _resolve', () => {
+test('04', 'Inline expressions распознаются до переменных {var}', () => {
   const code = renderUtils();
-  const inlinePos = code.indexOf('_inline_expr_replacer');
-  const resolvePos = code.indexOf('def _resolve(var_path');
-  ok(inlinePos > -1, '_inline_expr_replacer должен быть в коде');
-  ok(resolvePos > -1, '_resolve должен быть в коде');
-  ok(inlinePos < resolvePos, 'Inline expressions должны обрабатываться до _resolve');
+  const fnStart = code.indexOf('def _compile_text_template');
+  const inlinePos = code.indexOf('_TPL_INLINE.match(text, _pos)', fnStart);
+  const varPos = code.indexOf('_TPL_VAR.match(text, _pos)', fnStart);
+  ok(inlinePos > -1, '_TPL_INLINE должен проверяться при компиляции');
+  ok(varPos > -1, '_TPL_VAR должен проверяться при компиляции');
+  ok(inlinePos < varPos, 'Inline expressions должны распознаваться до переменных');
 });
 
-test('05', 'Inline expressions обрабатываются после #each', () => {
+test('05', 'Inline expressions распознаются после #each', () => {
   const code = renderUtils();
-  const eachPos = code.indexOf('_each_pattern.sub(_expand_each');
-  const inlinePos = code.indexOf('_inline_expr_replacer');
-  ok(eachPos > -1, '_each_pattern.sub должен быть в коде');
-  ok(inlinePos > eachPos, 'Inline expressions должны быть после #each');
+  const fnStart = code.indexOf('def _compile_text_template');
+  const eachPos = code.indexOf('_TPL_EACH_OPEN.match(text, _pos)', fnStart);
+  const inlinePos = code.indexOf('_TPL_INLINE.match(text, _pos)', fnStart);
+  ok(eachPos > -1, '_TPL_EACH_OPEN должен проверяться при компиляции');
+  ok(inlinePos > eachPos, 'Inline expressions должны распознаваться после #each');
 });
 
 test('06', 'Fallback: если _eval_expr вернул исходное — оставляем {=...}', () => {
   const code = renderUtils();
-  const fnStart = code.indexOf('def _inline_expr_replacer');
-  const fnEnd = code.indexOf('result = _re.sub', fnStart);
+  const fnStart = code.indexOf('def replace_variables_in_text');
+  const fnEnd = code.indexOf('def _tpl_var_sub', fnStart);
   const fnBody = code.slice(fnStart, fnEnd);
-  ok(fnBody.includes('_m_expr.group(0)'), 'Должен возвращать исходный match при ошибке');
+  ok(fnBody.includes('_seg[2] if str(_expr_result) == _seg[1]'), 'Должен возвращать исходный текст выражения при ошибке');
 });
 
 test('07', 'Runtime: thousands(10000) вычисляется корректно', () => {
@@ -103,12 +105,12 @@ test('08', 'Regex не матчит обычные переменные {var}',
   ok(code.includes('\\{=([^}]+)\\}'), 'Regex должен требовать = после открывающей скобки');
 });
 
-test('09', '_eval_expr определён до _inline_expr_replacer', () => {
+test('09', '_eval_expr определён до replace_variables_in_text', () => {
   const code = renderUtils();
   const evalPos = code.indexOf('def _eval_expr(');
-  const inlinePos = code.indexOf('def _inline_expr_replacer');
+  const replacePos = code.indexOf('def replace_variables_in_text');
   ok(evalPos > -1, '_eval_expr должен быть определён');
-  ok(evalPos < inlinePos, '_eval_expr должен быть определён до _inline_expr_replacer');
+  ok(evalPos < replacePos, '_eval_expr должен быть определён до replace_variables_in_text');
 });
 
 test('10', 'reversed добавлен в whitelist _safe_funcs', () => {
@@ -235,6 +235,11 @@ test('D01', 'Старт вызывает await _load_media_file_id_cache()', ()
   ok(codeVideo.includes('await _load_media_file_id_cache()'), 'нет вызова load при старте');
 });
 
+test('D02', 'Worker pool: file_id проекта одним запросом, бот берёт срез своего токена', () => {
+  ok(codeVideo.includes('_project_cache.get("media_file_ids", _fetch_project_media_file_ids)'), 'нет общего набора');
+  ok(codeVideo.includes('_by_token.setdefault(TOKEN_ID, {})'), 'нет среза по TOKEN_ID');
+});
+
 test('E01', 'Синтаксис Python: video', () => {
   syntax(codeVideo, 'video');
 });
@@ -0,0 +1,289 @@
+"""
+Бенчмарк event loop воркера: asyncio против uvloop на одном и том же сгенерированном боте.
+
+Скрипт поднимает локальный фейковый Bot API (aiohttp), запускает настоящий
+server/python/worker.py с WORKER_EVENT_LOOP=<loop>, стартует в нём бота командой
+start_bot и отдаёт ему через getUpdates N сообщений от разных пользователей.
+Ответ бота (первый вызов метода с chat_id пользователя) закрывает замер.
+
+Результат на каждый loop (медиана по --repeat прогонам):
+  - updates/s — отвеченные апдейты / время от первого getUpdates до последнего ответа;
+  - p50/p99 задержки обработчика — от выдачи апдейта до ответа бота (мс);
+  - p99 lag loop — из команды metrics воркера.
+
+Запуск:
+  python scripts/bench_worker_loop.py --bot bots/<проект>/bot.py --updates 2000 --repeat 3
+  python scripts/bench_worker_loop.py --bot ... --loops asyncio,uvloop --json bench.json
+
+Бот не меняется: сессия aiogram перенаправляется на фейковый API через sitecustomize
+во временном каталоге (PYTHONPATH воркера). Нужны aiohttp/aiogram из requirements.txt,
+для uvloop — установленный uvloop (иначе воркер откатится на asyncio, это видно в отчёте).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKER = ROOT / "server" / "python" / "worker.py"
+BENCH_TOKEN = "123456:BENCHMARK"
+BENCH_TOKEN_ID = 1
+# chat_id пользователя = CHAT_BASE + update_id
+CHAT_BASE = 10_000_000
+
+_SITECUSTOMIZE = '''
+import os
+
+_base = os.environ.get("BENCH_TELEGRAM_API")
+if _base:
+    try:
+        from aiogram.client.session import base as _session_base
+        from aiogram.client.telegram import TelegramAPIServer
+
+        _api = TelegramAPIServer.from_base(_base)
+        _orig_init = _session_base.BaseSession.__init__
+
+        def _bench_init(self, *args, **kwargs):
+            if not args and "api" not in kwargs:
+                kwargs["api"] = _api
+            _orig_init(self, *args, **kwargs)
+
+        _session_base.BaseSession.__init__ = _bench_init
+    except ImportError:
+        pass
+'''
+
+
+class FakeBotApi:
+    """Минимальный Bot API: getMe, getUpdates с N апдейтами, ответы на остальное."""
+
+    def __init__(self, total: int, text: str, batch: int):
+        self.total = total
+        self.text = text
+        self.batch = batch
+        self.issued_at: Dict[int, float] = {}
+        self.latencies_ms: List[float] = []
+        self.first_issue: Optional[float] = None
+        self.last_answer: Optional[float] = None
+        self.done = asyncio.Event()
+        self._message_id = 0
+
+    def _update(self, update_id: int) -> Dict[str, Any]:
+        chat_id = CHAT_BASE + update_id
+        user = {"id": chat_id, "is_bot": False, "first_name": f"u{update_id}"}
+        message: Dict[str, Any] = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": self.text,
+        }
+        if self.text.startswith("/"):
+            command = self.text.split()[0]
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        return {"update_id": update_id, "message": message}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        form = await request.post()
+        result: Any = True
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method == "getUpdates":
+            result = await self._get_updates(form)
+        elif "chat_id" in form:
+            result = self._answer(form)
+        return web.json_response({"ok": True, "result": result})
+
+    async def _get_updates(self, form) -> List[Dict[str, Any]]:
+        offset = max(1, int(form.get("offset") or 1))
+        last = min(self.total, offset + self.batch - 1)
+        if offset > self.total:
+            # Всё выдано — держим long polling, как настоящий API
+            timeout = float(form.get("timeout") or 0)
+            await asyncio.sleep(min(timeout, 0.5))
+            return []
+        now = time.perf_counter()
+        if self.first_issue is None:
+            self.first_issue = now
+        updates = []
+        for update_id in range(offset, last + 1):
+            self.issued_at.setdefault(update_id, now)
+            updates.append(self._update(update_id))
+        return updates
+
+    def _answer(self, form) -> Dict[str, Any]:
+        chat_id = int(form["chat_id"])
+        update_id = chat_id - CHAT_BASE
+        issued = self.issued_at.pop(update_id, None)
+        if issued is not None:
+            now = time.perf_counter()
+            self.latencies_ms.append((now - issued) * 1000)
+            self.last_answer = now
+            if len(self.latencies_ms) >= self.total:
+                self.done.set()
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": str(form.get("text", "")),
+        }
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def _read_frames(stream: asyncio.StreamReader, frames: "asyncio.Queue[Dict[str, Any]]") -> None:
+    while True:
+        raw = await stream.readline()
+        if not raw:
+            return
+        try:
+            frames.put_nowait(json.loads(raw))
+        except json.JSONDecodeError:
+            continue
+
+
+async def _wait_frame(frames: "asyncio.Queue[Dict[str, Any]]", match, timeout: float) -> Dict[str, Any]:
+    deadline = time.monotonic() + timeout
+    while True:
+        frame = await asyncio.wait_for(frames.get(), max(0.01, deadline - time.monotonic()))
+        if match(frame):
+            return frame
+
+
+async def run_once(loop_name: str, args: argparse.Namespace, shim_dir: str) -> Dict[str, Any]:
+    """Один прогон: фейковый API + воркер с выбранным loop + N апдейтов."""
+    api = FakeBotApi(args.updates, args.text, args.batch)
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+
+    env = {
+        **os.environ,
+        "PROJECT_ID": "0",
+        "WORKER_EVENT_LOOP": loop_name,
+        "BENCH_TELEGRAM_API": f"http://127.0.0.1:{port}",
+        "PYTHONPATH": os.pathsep.join(filter(None, [shim_dir, os.environ.get("PYTHONPATH")])),
+    }
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-u", str(WORKER),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        env=env,
+        cwd=str(WORKER.parent),
+        limit=16 * 1024 * 1024,
+    )
+    frames: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    reader = asyncio.create_task(_read_frames(proc.stdout, frames))  # type: ignore[arg-type]
+
+    def send(cmd: Dict[str, Any]) -> None:
+        proc.stdin.write((json.dumps(cmd) + "\n").encode())  # type: ignore[union-attr]
+
+    result: Dict[str, Any] = {"loop": loop_name}
+    try:
+        await _wait_frame(frames, lambda f: f.get("content") == "worker_ready", 30)
+        send({"cmd": "start_bot", "token": BENCH_TOKEN, "token_id": BENCH_TOKEN_ID,
+              "bot_file": str(Path(args.bot).resolve())})
+        await _wait_frame(frames, lambda f: f.get("content") == f"bot_started:{BENCH_TOKEN_ID}", 60)
+        try:
+            await asyncio.wait_for(api.done.wait(), args.timeout)
+        except asyncio.TimeoutError:
+            result["timeout"] = True
+
+        send({"cmd": "metrics", "req_id": 1})
+        metrics = await _wait_frame(frames, lambda f: f.get("type") == "metrics", 10)
+        data = metrics.get("data", {})
+        result["event_loop"] = data.get("event_loop")
+        result["lag_p99_ms"] = data.get("loop", {}).get("lag_p99_ms")
+    finally:
+        send({"cmd": "shutdown"})
+        try:
+            await asyncio.wait_for(proc.wait(), 30)
+        except asyncio.TimeoutError:
+            proc.kill()
+        reader.cancel()
+        await runner.cleanup()
+
+    answered = len(api.latencies_ms)
+    elapsed = (api.last_answer or 0) - (api.first_issue or 0)
+    result.update({
+        "answered": answered,
+        "updates_per_s": round(answered / elapsed, 1) if elapsed > 0 else None,
+        "p50_ms": _percentile(api.latencies_ms, 0.50),
+        "p99_ms": _percentile(api.latencies_ms, 0.99),
+    })
+    return result
+
+
+def _median(runs: List[Dict[str, Any]], key: str) -> Optional[float]:
+    values = [r[key] for r in runs if r.get(key) is not None]
+    return round(statistics.median(values), 2) if values else None
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"bot": args.bot, "updates": args.updates, "runs": {}, "summary": {}}
+    with tempfile.TemporaryDirectory(prefix="bench-worker-") as shim_dir:
+        Path(shim_dir, "sitecustomize.py").write_text(_SITECUSTOMIZE, encoding="utf-8")
+        for loop_name in args.loops:
+            runs = []
+            for i in range(args.repeat):
+                run = await run_once(loop_name, args, shim_dir)
+                print(f"  {loop_name} #{i + 1}: {run}", flush=True)
+                runs.append(run)
+            report["runs"][loop_name] = runs
+            report["summary"][loop_name] = {
+                "event_loop": runs[-1].get("event_loop"),
+                "updates_per_s": _median(runs, "updates_per_s"),
+                "p50_ms": _median(runs, "p50_ms"),
+                "p99_ms": _median(runs, "p99_ms"),
+                "lag_p99_ms": _median(runs, "lag_p99_ms"),
+            }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="asyncio vs uvloop для worker.py")
+    parser.add_argument("--bot", required=True, help="Путь к сгенерированному bot.py")
+    parser.add_argument("--loops", default="asyncio,uvloop", type=lambda s: [x.strip() for x in s.split(",") if x.strip()])
+    parser.add_argument("--updates", type=int, default=2000, help="Апдейтов на прогон")
+    parser.add_argument("--batch", type=int, default=100, help="Апдейтов в одном ответе getUpdates")
+    parser.add_argument("--text", default="/start", help="Текст входящих сообщений")
+    parser.add_argument("--repeat", type=int, default=3, help="Прогонов на каждый loop (в отчёте медиана)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Таймаут прогона (с)")
+    parser.add_argument("--json", help="Куда сохранить полный отчёт")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print()
+    print(f"{'loop':<10}{'фактически':<12}{'updates/s':>12}{'p50, мс':>10}{'p99, мс':>10}{'lag p99':>10}")
+    for loop_name, s in report["summary"].items():
+        print(f"{loop_name:<10}{str(s['event_loop']):<12}{str(s['updates_per_s']):>12}"
+              f"{str(s['p50_ms']):>10}{str(s['p99_ms']):>10}{str(s['lag_p99_ms']):>10}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,10 @@
 /**
  * @fileoverview Менеджер воркеров ботов — управляет Python worker процессами
- * Модель: 1 проект = 1 воркер = N ботов внутри одного asyncio event loop
+ * Модель: 1 проект = 1..N шардов-воркеров = N ботов внутри asyncio event loop шарда
  * @module server/bots/botWorkerManager
  */
 
-import { spawn, ChildProcess, execSync } from "node:child_process";
+import { spawn, execSync } from "node:child_process";
 import { join, dirname } from "node:path";
 import { fileURLToPath } from "node:url";
 import { EventEmitter } from "node:events";
@@ -18,6 +18,39 @@ import {
   WORKER_START_CONFIRM_TIMEOUT_MS,
 } from "./waitForWorkerBotStart";
 import { formatBotRuntimeErrorShort } from "./formatBotRuntimeError";
+import {
+  cooledBotsFromMetrics,
+  dedicatedShardFor,
+  hotBotsFromMetrics,
+  loopSharesFromMetrics,
+  pickShard,
+  recordSlowCallback,
+  resolveHotBotCpuShare,
+  resolveRebalanceIntervalMs,
+  resolveRebalanceLoopBusy,
+  resolveShardCount,
+  resolveSlowCallbackQuarantine,
+  selectHotBots,
+  shouldPollShardMetrics,
+  type ShardLoopMetrics,
+} from "./workerSharding";
+import { POST_STOP_COOLDOWN_MS, sleepMs } from "./restartTiming";
+import { WorkerZygote, type WorkerProcess } from "./workerZygote";
+import {
+  WorkerStartBatcher,
+  formatStartupTimeline,
+  resolveStartBatchWindowMs,
+  type StartupTimeline,
+  type WorkerStartEntry,
+} from "./workerStartBatch";
+import {
+  buildLogLevelCommand,
+  buildLogLimitCommand,
+  mergeLogLevelRule,
+  mergeLogLimitRule,
+  type WorkerLogLevelRule,
+  type WorkerLogLimitRule,
+} from "./workerLogLevels";
 
 /** Задержка перед killWorker когда activeBots пуст (мс) */
 const WORKER_DRAIN_MS = 2_000;
@@ -30,53 +63,178 @@ const __dirname = dirname(__filename);
 interface WorkerMessage {
   /** ID токена бота (для маршрутизации логов) */
   token_id?: number;
-  /** Тип сообщения: stdout, stderr, system, status */
+  /** Тип сообщения: stdout, stderr, system, status, metrics, reply, startup */
   type: string;
   /** Содержимое сообщения */
   content?: string;
-  /** Данные статуса (для type=status) */
+  /** Данные статуса (для type=status, type=metrics и таймлайн type=startup) */
   data?: any;
+  /** ID запроса из команды (для type=reply и status) */
+  req_id?: number;
+  /** Команда, на которую пришёл ответ (type=reply) */
+  cmd?: string;
+  /** Успешность команды (type=reply) */
+  ok?: boolean;
+  /** Текст ошибки команды (type=reply) */
+  error?: string;
 }
 
+/** Ответ воркера на команду с req_id */
+export interface WorkerReply {
+  /** Команда */
+  cmd?: string;
+  /** Успешность */
+  ok: boolean;
+  /** Текст ошибки */
+  error?: string;
+}
+
+/** Таймаут ожидания ответа на команду с req_id (мс) */
+const WORKER_REPLY_TIMEOUT_MS = 30_000;
+
 /** Команда для отправки воркеру через stdin */
 interface WorkerCommand {
   /** Тип команды */
-  cmd: "start_bot" | "stop_bot" | "status" | "shutdown";
+  cmd:
+    | "start_bot"
+    | "start_bots"
+    | "stop_bot"
+    | "reload_bot"
+    | "set_log_level"
+    | "set_log_limit"
+    | "status"
+    | "metrics"
+    | "shutdown";
   /** Токен бота */
   token?: string;
   /** ID токена */
   token_id?: number;
   /** Путь к файлу бота */
   bot_file?: string;
+  /** Публичный базовый URL webhook (webhook-режим) */
+  webhook_url?: string;
+  /** Порт собственного aiohttp бота (вне общего webhook-сервера воркера) */
+  webhook_port?: number;
+  /** Секрет X-Telegram-Bot-Api-Secret-Token */
+  webhook_secret?: string;
+  /** Боты пакетного старта (start_bots) */
+  bots?: WorkerStartEntry[];
+  /** Имя логгера (set_log_level) */
+  logger?: string;
+  /** Уровень логов; null — снять правило (set_log_level) */
+  level?: string | null;
+  /** Выборка DEBUG/INFO: 1 из N (set_log_level) */
+  sample?: number;
+  /** Строк лога в секунду; null — сброс (set_log_limit) */
+  rate?: number | null;
+  /** Запас строк сверх rate (set_log_limit) */
+  burst?: number;
+  /** ID запроса: воркер вернёт его в ответе type=reply */
+  req_id?: number;
 }
 
-/** Контекст воркера проекта */
+/** Параметры запуска бота — нужны для переноса в другой шард */
+interface BotLaunchSpec {
+  /** Токен бота */
+  token: string;
+  /** Путь к сгенерированному bot.py */
+  botFile: string;
+  /** Webhook-режим, если включён */
+  webhook?: WorkerWebhookSpec;
+}
+
+/** Параметры webhook-режима бота в воркере */
+export interface WorkerWebhookSpec {
+  /** Публичный базовый URL (Telegram шлёт на {url}/api/webhook/{projectId}/{tokenId}) */
+  webhookUrl: string;
+  /** Порт собственного aiohttp бота (если общий webhook-сервер воркера выключен) */
+  webhookPort: number;
+  /** Секрет X-Telegram-Bot-Api-Secret-Token из настроек токена */
+  secretToken?: string | null;
+}
+
+/** Контекст воркера (шарда) проекта */
 interface ProjectWorker {
   /** ID проекта */
   projectId: number;
-  /** Python процесс воркера */
-  process: ChildProcess;
+  /** Индекс шарда внутри проекта (0 — единственный при WORKER_SHARDS=1) */
+  shard: number;
+  /** Python процесс воркера (spawn или fork из zygote) */
+  process: WorkerProcess;
   /** Множество активных tokenId внутри воркера */
   activeBots: Set<number>;
   /** Статус воркера */
   status: "starting" | "ready" | "error" | "stopped";
   /** Время создания */
   createdAt: Date;
+  /** Порт общего webhook-сервера воркера (после webhook_server:PORT) */
+  webhookPort?: number;
+}
+
+/**
+ * Поля webhook для start_bot / reload_bot.
+ * @param webhook - Параметры webhook-режима (undefined — polling)
+ */
+function webhookCommandFields(
+  webhook?: WorkerWebhookSpec,
+): Pick<WorkerCommand, "webhook_url" | "webhook_port" | "webhook_secret"> {
+  if (!webhook) return {};
+  return {
+    webhook_url: webhook.webhookUrl,
+    webhook_port: webhook.webhookPort,
+    ...(webhook.secretToken ? { webhook_secret: webhook.secretToken } : {}),
+  };
+}
+
+/**
+ * Ключ воркера в карте workers.
+ * @param projectId - ID проекта
+ * @param shard - Индекс шарда
+ */
+function workerKey(projectId: number, shard: number): string {
+  return `${projectId}:${shard}`;
 }
 
 /**
  * Менеджер воркеров — управляет жизненным циклом Python worker процессов.
- * Один воркер на проект, все боты проекта работают внутри одного процесса.
+ * Боты проекта раскладываются по шардам (см. workerSharding), по умолчанию шард один.
  */
 class BotWorkerManager extends EventEmitter {
-  /** Карта воркеров: projectId → ProjectWorker */
-  private workers = new Map<number, ProjectWorker>();
+  /** Карта воркеров: `${projectId}:${shard}` → ProjectWorker */
+  private workers = new Map<string, ProjectWorker>();
 
   /** Очередь lifecycle per projectId:tokenId */
   private tokenLocks = new Map<string, Promise<unknown>>();
 
-  /** Отложенный killWorker при пустом activeBots */
-  private drainTimers = new Map<number, ReturnType<typeof setTimeout>>();
+  /** Отложенный kill шарда при пустом activeBots: ключ workerKey */
+  private drainTimers = new Map<string, ReturnType<typeof setTimeout>>();
+
+  /** Закреплённые за выделенным шардом «горячие» боты: projectId:tokenId → shard */
+  private pinnedShards = new Map<string, number>();
+
+  /** Боты в карантине slow_callback (projectId:tokenId): не возвращаются по остыванию */
+  private quarantinedBots = new Set<string>();
+
+  /** Последние параметры запуска бота: projectId:tokenId → spec */
+  private launchSpecs = new Map<string, BotLaunchSpec>();
+
+  /** Правила set_log_level проекта: повторяются в каждом новом шарде */
+  private logLevelRules = new Map<number, WorkerLogLevelRule[]>();
+
+  /** Лимиты set_log_limit проекта: повторяются в каждом новом шарде */
+  private logLimitRules = new Map<number, WorkerLogLimitRule[]>();
+
+  /** Моменты slow_callback бота за окно карантина: projectId:tokenId → ms[] */
+  private slowCallbacks = new Map<string, number[]>();
+
+  /** Правило карантина (WORKER_QUARANTINE_SLOW_CALLBACKS / WORKER_QUARANTINE_WINDOW_MS) */
+  private slowCallbackQuarantine = resolveSlowCallbackQuarantine();
+
+  /** Таймер опроса metrics шардов (WORKER_REBALANCE_INTERVAL_MS) */
+  private rebalanceTimer: ReturnType<typeof setInterval> | null = null;
+
+  /** Проекты, для которых сейчас идёт rebalanceHotBots */
+  private rebalancing = new Set<number>();
 
   /** Путь к Python worker скрипту */
   private workerScript: string;
@@ -87,18 +245,116 @@ class BotWorkerManager extends EventEmitter {
   /** Последняя stderr-ошибка бота для errorMessage в БД */
   private lastBotErrors = new Map<number, string>();
 
-  /** projectId, для которых killWorker/shutdownAll намеренно гасят воркер */
-  private intentionalKills = new Set<number>();
+  /** Ключи шардов (workerKey), которые killWorker/shutdownAll намеренно гасят */
+  private intentionalKills = new Set<string>();
+
+  /** Счётчик req_id для команд с ответом */
+  private nextReqId = 1;
+
+  /** Ожидающие ответа команды: req_id → resolve */
+  private pendingReplies = new Map<number, (reply: WorkerReply | null) => void>();
 
   /** Подробные логи stdout воркера (JSON) */
   private workerVerbose = process.env.WORKER_POOL_VERBOSE === "true";
 
+  /** Zygote с предзагруженными модулями (WORKER_ZYGOTE=true, только POSIX) */
+  private zygote: WorkerZygote | null = null;
+
+  /** Старты одного шарда за окно WORKER_START_BATCH_MS → одна команда start_bots */
+  private startBatcher = new WorkerStartBatcher(resolveStartBatchWindowMs(), (key, command) =>
+    this.writeCommand(this.workers.get(key), command),
+  );
+
   constructor() {
     super();
     this.workerScript = join(__dirname, "..", "python", "worker.py");
     this.pythonPath =
       process.env.PYTHON_PATH ||
       (process.platform === "win32" ? "python" : "python3");
+    if (process.env.WORKER_ZYGOTE === "true" && WorkerZygote.isSupported()) {
+      this.zygote = new WorkerZygote(this.pythonPath, join(__dirname, "..", "python", "zygote.py"));
+    }
+    this.on("worker-metrics", (projectId: number, data: ShardLoopMetrics | undefined, shard: number) =>
+      this.handleWorkerMetrics(projectId, shard, data),
+    );
+    const interval = resolveRebalanceIntervalMs();
+    if (interval > 0) {
+      this.rebalanceTimer = setInterval(() => this.pollWorkerMetrics(), interval);
+      this.rebalanceTimer.unref();
+    }
+  }
+
+  /**
+   * Запрашивает metrics у общих шардов, где боту есть с кем делить loop,
+   * и у выделенных — чтобы вернуть остывших ботов.
+   */
+  private pollWorkerMetrics(): void {
+    for (const worker of this.workers.values()) {
+      if (shouldPollShardMetrics(worker.shard, worker.status === "ready", worker.activeBots.size)) {
+        this.writeCommand(worker, { cmd: "metrics" });
+      }
+    }
+  }
+
+  /**
+   * Кадр metrics шарда: при загруженном loop горячие боты переносятся в выделенные шарды,
+   * остывшие боты выделенных шардов возвращаются в общие.
+   * @param projectId - ID проекта
+   * @param shard - Шард-источник кадра
+   * @param data - Кадр metrics (loop_busy, bots)
+   */
+  private handleWorkerMetrics(projectId: number, shard: number, data: ShardLoopMetrics | undefined): void {
+    if (this.rebalancing.has(projectId)) return;
+    const threshold = resolveHotBotCpuShare();
+    const cooled = cooledBotsFromMetrics(shard, data, threshold).filter(
+      (tokenId) => !this.quarantinedBots.has(workerKey(projectId, tokenId)),
+    );
+    let moves: Promise<unknown>;
+    if (cooled.length > 0) {
+      moves = (async () => {
+        for (const tokenId of cooled) await this.moveToSharedShard(projectId, tokenId);
+      })();
+    } else if (hotBotsFromMetrics(shard, data, threshold, resolveRebalanceLoopBusy()).length > 0) {
+      moves = this.rebalanceHotBots(projectId, loopSharesFromMetrics(data?.bots), threshold);
+    } else {
+      return;
+    }
+    this.rebalancing.add(projectId);
+    moves
+      .catch((err) => console.error(`🏭 [WorkerPool:${projectId}] перенос ботов между шардами не удался:`, err))
+      .finally(() => this.rebalancing.delete(projectId));
+  }
+
+  /**
+   * Запускает процесс воркера: fork из zygote или обычный spawn.
+   * @param env - Дополнительные переменные окружения воркера
+   */
+  private launchWorkerProcess(env: Record<string, string>): WorkerProcess {
+    if (this.zygote) {
+      return this.zygote.fork(env);
+    }
+    return spawn(this.pythonPath, ["-u", this.workerScript], {
+      stdio: ["pipe", "pipe", "pipe"],
+      env: {
+        ...process.env,
+        ...env,
+      },
+    });
+  }
+
+  /**
+   * Предзапуск zygote, чтобы первый проект не ждал импорта модулей.
+   * Если zygote не поднялся — дальше воркеры запускаются обычным spawn.
+   */
+  async warmUp(): Promise<void> {
+    if (!this.zygote) return;
+    try {
+      await this.zygote.warmUp();
+    } catch (err) {
+      this.zygote.stop();
+      this.zygote = null;
+      throw err;
+    }
   }
 
   /**
@@ -131,78 +387,124 @@ class BotWorkerManager extends EventEmitter {
     }
   }
 
-  /** Отменяет отложенный kill воркера */
-  private cancelWorkerDrain(projectId: number): void {
-    const t = this.drainTimers.get(projectId);
+  /** Отменяет отложенный kill шарда */
+  private cancelWorkerDrain(projectId: number, shard: number): void {
+    const key = workerKey(projectId, shard);
+    const t = this.drainTimers.get(key);
     if (t) {
       clearTimeout(t);
-      this.drainTimers.delete(projectId);
+      this.drainTimers.delete(key);
     }
   }
 
-  /** Планирует killWorker через WORKER_DRAIN_MS если activeBots пуст */
-  private scheduleWorkerDrain(projectId: number): void {
-    this.cancelWorkerDrain(projectId);
+  /** Планирует kill шарда через WORKER_DRAIN_MS если activeBots пуст */
+  private scheduleWorkerDrain(projectId: number, shard: number): void {
+    this.cancelWorkerDrain(projectId, shard);
+    const key = workerKey(projectId, shard);
     const timer = setTimeout(() => {
-      this.drainTimers.delete(projectId);
-      const w = this.workers.get(projectId);
+      this.drainTimers.delete(key);
+      const w = this.workers.get(key);
       if (w && w.activeBots.size === 0 && w.status === "ready") {
-        void this.killWorker(projectId);
+        void this.killShard(w);
       }
     }, WORKER_DRAIN_MS);
-    this.drainTimers.set(projectId, timer);
+    this.drainTimers.set(key, timer);
+  }
+
+  /**
+   * Все шарды проекта.
+   * @param projectId - ID проекта
+   */
+  private projectWorkers(projectId: number): ProjectWorker[] {
+    return [...this.workers.values()].filter((w) => w.projectId === projectId);
+  }
+
+  /**
+   * Шард, в котором бот должен жить: закреплённый или по consistent hash.
+   * @param projectId - ID проекта
+   * @param tokenId - ID токена
+   */
+  shardFor(projectId: number, tokenId: number): number {
+    const pinned = this.pinnedShards.get(workerKey(projectId, tokenId));
+    if (pinned !== undefined) return pinned;
+    return pickShard(tokenId, resolveShardCount(projectId));
+  }
+
+  /**
+   * Шард, где бот сейчас запущен; иначе — расчётный.
+   * @param projectId - ID проекта
+   * @param tokenId - ID токена
+   */
+  private locateShard(projectId: number, tokenId: number): number {
+    const owner = this.projectWorkers(projectId).find((w) => w.activeBots.has(tokenId));
+    return owner ? owner.shard : this.shardFor(projectId, tokenId);
   }
 
   /**
-   * Получает или создаёт воркер для проекта
+   * Адрес общего webhook-сервера воркера, где запущен бот.
    * @param projectId - ID проекта
+   * @param tokenId - ID токена
+   * @returns URL маршрута бота или null (бот не в воркере / сервер не поднят)
+   */
+  webhookTarget(projectId: number, tokenId: number): string | null {
+    const owner = this.projectWorkers(projectId).find((w) => w.activeBots.has(tokenId));
+    if (!owner || owner.webhookPort === undefined) return null;
+    return `http://127.0.0.1:${owner.webhookPort}/webhook/${tokenId}`;
+  }
+
+  /**
+   * Получает или создаёт воркер (шард) для проекта
+   * @param projectId - ID проекта
+   * @param shard - Индекс шарда
    * @returns Промис с воркером в состоянии ready
    */
-  async getOrCreateWorker(projectId: number): Promise<ProjectWorker> {
-    const existing = this.workers.get(projectId);
+  async getOrCreateWorker(projectId: number, shard = 0): Promise<ProjectWorker> {
+    const existing = this.workers.get(workerKey(projectId, shard));
     if (existing && existing.status === "ready") {
       return existing;
     }
 
     // Если воркер в процессе запуска — ждём
     if (existing && existing.status === "starting") {
-      return this.waitForReady(projectId);
+      return this.waitForReady(projectId, shard);
     }
 
     // Создаём новый воркер
-    return this.createWorker(projectId);
+    return this.createWorker(projectId, shard);
   }
 
   /**
-   * Создаёт новый Python worker процесс для проекта
+   * Создаёт новый Python worker процесс (шард) для проекта
    * @param projectId - ID проекта
+   * @param shard - Индекс шарда
    * @returns Промис с воркером в состоянии ready
    */
-  private createWorker(projectId: number): Promise<ProjectWorker> {
+  private createWorker(projectId: number, shard: number): Promise<ProjectWorker> {
     return new Promise((resolve, reject) => {
-      console.log(`🏭 [WorkerPool] Создаём воркер для проекта ${projectId}`);
+      const key = workerKey(projectId, shard);
+      console.log(`🏭 [WorkerPool] Создаём воркер для проекта ${projectId} (шард ${shard})`);
       console.log(`🏭 [WorkerPool] Python: ${this.pythonPath}`);
       console.log(`🏭 [WorkerPool] Script: ${this.workerScript}`);
 
-      const workerProcess = spawn(this.pythonPath, ["-u", this.workerScript], {
-        stdio: ["pipe", "pipe", "pipe"],
-        env: {
-          ...process.env,
-          PROJECT_ID: projectId.toString(),
-        },
+      const workerProcess = this.launchWorkerProcess({
+        PROJECT_ID: projectId.toString(),
+        WORKER_SHARD: shard.toString(),
       });
 
-      console.log(`🏭 [WorkerPool] Процесс воркера создан, PID: ${workerProcess.pid}`);
+      console.log(
+        `🏭 [WorkerPool] Процесс воркера создан, ${this.zygote ? "fork из zygote" : `PID: ${workerProcess.pid}`}`,
+      );
 
       const worker: ProjectWorker = {
         projectId,
+        shard,
         process: workerProcess,
         activeBots: new Set(),
         status: "starting",
         createdAt: new Date(),
       };
 
-      this.workers.set(projectId, worker);
+      this.workers.set(key, worker);
 
       // Таймаут на запуск
       const timeout = setTimeout(() => {
@@ -228,13 +530,19 @@ class BotWorkerManager extends EventEmitter {
           if (!line.trim()) continue;
           try {
             const msg: WorkerMessage = JSON.parse(line);
-            this.handleWorkerMessage(projectId, msg);
+            this.handleWorkerMessage(worker, msg);
 
             // Воркер готов
             if (msg.type === "system" && msg.content === "worker_ready") {
               clearTimeout(timeout);
               worker.status = "ready";
-              this.emit("worker-ready", projectId);
+              for (const rule of this.logLevelRules.get(projectId) ?? []) {
+                this.writeCommand(worker, buildLogLevelCommand(rule));
+              }
+              for (const rule of this.logLimitRules.get(projectId) ?? []) {
+                this.writeCommand(worker, buildLogLimitCommand(rule));
+              }
+              this.emit("worker-ready", projectId, shard);
               resolve(worker);
             }
           } catch {
@@ -262,8 +570,8 @@ class BotWorkerManager extends EventEmitter {
         const wasReady = worker.status === "ready";
         worker.status = "stopped";
 
-        const intentional = this.intentionalKills.has(projectId);
-        this.intentionalKills.delete(projectId);
+        const intentional = this.intentionalKills.has(key);
+        this.intentionalKills.delete(key);
         // Неожиданная смерть процесса (OOM/cgroup/kill -9), не кнопка Стоп и не shutdown
         const unexpected = !intentional;
 
@@ -272,9 +580,11 @@ class BotWorkerManager extends EventEmitter {
           this.emit("bot-exited", projectId, tokenId, code, undefined, unexpected);
         }
         worker.activeBots.clear();
-        this.workers.delete(projectId);
+        if (this.workers.get(key) === worker) {
+          this.workers.delete(key);
+        }
 
-        this.emit("worker-exited", projectId, code, signal);
+        this.emit("worker-exited", projectId, code, signal, shard);
 
         if (!wasReady && worker.status !== "ready") {
           reject(new Error(`Воркер проекта ${projectId} завершился с кодом ${code}`));
@@ -284,7 +594,9 @@ class BotWorkerManager extends EventEmitter {
       workerProcess.on("error", (err) => {
         clearTimeout(timeout);
         worker.status = "error";
-        this.workers.delete(projectId);
+        if (this.workers.get(key) === worker) {
+          this.workers.delete(key);
+        }
         reject(err);
       });
     });
@@ -293,18 +605,19 @@ class BotWorkerManager extends EventEmitter {
   /**
    * Ожидает готовности воркера который уже запускается
    * @param projectId - ID проекта
+   * @param shard - Индекс шарда
    */
-  private waitForReady(projectId: number): Promise<ProjectWorker> {
+  private waitForReady(projectId: number, shard: number): Promise<ProjectWorker> {
     return new Promise((resolve, reject) => {
       const timeout = setTimeout(() => {
         reject(new Error(`Таймаут ожидания воркера проекта ${projectId}`));
       }, 10000);
 
-      const handler = (readyProjectId: number) => {
-        if (readyProjectId === projectId) {
+      const handler = (readyProjectId: number, readyShard: number) => {
+        if (readyProjectId === projectId && readyShard === shard) {
           clearTimeout(timeout);
           this.removeListener("worker-ready", handler);
-          const worker = this.workers.get(projectId);
+          const worker = this.workers.get(workerKey(projectId, shard));
           if (worker) resolve(worker);
           else reject(new Error("Воркер не найден после ready"));
         }
@@ -316,17 +629,39 @@ class BotWorkerManager extends EventEmitter {
 
   /**
    * Обрабатывает JSON-сообщение от воркера
-   * @param projectId - ID проекта
+   * @param worker - Шард-источник сообщения
    * @param msg - Распарсенное сообщение
    */
-  private handleWorkerMessage(projectId: number, msg: WorkerMessage): void {
+  private handleWorkerMessage(worker: ProjectWorker, msg: WorkerMessage): void {
+    const { projectId } = worker;
     if (msg.type === "system") {
-      this.handleSystemMessage(projectId, msg.content || "");
+      this.handleSystemMessage(worker, msg.content || "");
       return;
     }
 
     if (msg.type === "status") {
-      this.emit("worker-status", projectId, msg.data);
+      this.emit("worker-status", projectId, msg.data, worker.shard);
+      return;
+    }
+
+    if (msg.type === "metrics") {
+      this.emit("worker-metrics", projectId, msg.data, worker.shard);
+      return;
+    }
+
+    if (msg.type === "startup" && msg.token_id !== undefined) {
+      const timeline = msg.data as StartupTimeline;
+      console.log(`🏭 [WorkerPool:${projectId}] старт бота ${msg.token_id}: ${formatStartupTimeline(timeline)}`);
+      this.emit("bot-startup-timeline", projectId, msg.token_id, timeline);
+      return;
+    }
+
+    if (msg.type === "reply") {
+      if (msg.req_id !== undefined) {
+        const resolve = this.pendingReplies.get(msg.req_id);
+        this.pendingReplies.delete(msg.req_id);
+        resolve?.({ cmd: msg.cmd, ok: msg.ok === true, error: msg.error });
+      }
       return;
     }
 
@@ -348,12 +683,14 @@ class BotWorkerManager extends EventEmitter {
 
   /**
    * Обрабатывает системные сообщения воркера
-   * @param projectId - ID проекта
+   * @param source - Шард-источник сообщения
    * @param content - Содержимое системного сообщения
    */
-  private handleSystemMessage(projectId: number, content: string): void {
+  private handleSystemMessage(source: ProjectWorker, content: string): void {
     const ev = parseWorkerSystemMessage(content);
-    const worker = this.workers.get(projectId);
+    const { projectId } = source;
+    // Шард мог быть уже заменён новым процессом — тогда учёт не ведём
+    const worker = this.workers.get(workerKey(projectId, source.shard)) === source ? source : undefined;
 
     if (ev.kind === "bot_started" && ev.tokenId !== undefined) {
       this.lastBotErrors.delete(ev.tokenId);
@@ -379,23 +716,78 @@ class BotWorkerManager extends EventEmitter {
       this.emit("bot-exited", projectId, ev.tokenId, status, runtimeError, false);
       // Drain: не убиваем воркер мгновенно (гонка с restart)
       if (worker && worker.activeBots.size === 0 && worker.status === "ready") {
-        this.scheduleWorkerDrain(projectId);
+        this.scheduleWorkerDrain(projectId, worker.shard);
       }
       return;
     }
 
+    if (ev.kind === "bot_reloaded" && ev.tokenId !== undefined) {
+      console.log(`🏭 [WorkerPool:${projectId}] бот ${ev.tokenId}: код заменён без перезапуска`);
+      this.emit("bot-reloaded", projectId, ev.tokenId);
+      return;
+    }
+
+    if (ev.kind === "webhook_server" && ev.port !== undefined) {
+      if (worker) worker.webhookPort = ev.port;
+      console.log(`🏭 [WorkerPool:${projectId}] шард ${source.shard}: webhook-сервер на порту ${ev.port}`);
+      return;
+    }
+
+    if (ev.kind === "bot_role" && ev.tokenId !== undefined) {
+      const fence = ev.role === "leader" ? ` (fence ${ev.fence})` : "";
+      console.log(`🏭 [WorkerPool:${projectId}] бот ${ev.tokenId}: роль ${ev.role}${fence}`);
+      this.emit("bot-role", projectId, ev.tokenId, ev.role, ev.fence ?? 0);
+      return;
+    }
+
+    if (ev.kind === "slow_callback" && ev.tokenId !== undefined) {
+      this.handleSlowCallback(projectId, source, ev.tokenId, ev.durationMs ?? 0);
+      return;
+    }
+
     if (content === "stdin_closed" || content === "worker_exited" || content === "shutting_down") {
       return;
     }
   }
 
   /**
-   * Отправляет команду воркеру через stdin
+   * Watchdog воркера поймал колбэк, надолго занявший loop шарда.
+   * Частый нарушитель уезжает в выделенный шард, чтобы не тормозить соседей.
    * @param projectId - ID проекта
+   * @param source - Шард-источник
+   * @param tokenId - ID токена (0 — код самого воркера)
+   * @param durationMs - Длительность колбэка
+   */
+  private handleSlowCallback(projectId: number, source: ProjectWorker, tokenId: number, durationMs: number): void {
+    console.warn(
+      `🏭 [WorkerPool:${projectId}] шард ${source.shard}: колбэк бота ${tokenId} занял loop на ${durationMs} мс`,
+    );
+    this.emit("bot-slow-callback", projectId, tokenId, durationMs);
+    if (tokenId <= 0) return;
+
+    const key = workerKey(projectId, tokenId);
+    const history = this.slowCallbacks.get(key) ?? [];
+    this.slowCallbacks.set(key, history);
+    if (!recordSlowCallback(history, Date.now(), this.slowCallbackQuarantine)) return;
+    // Один в шарде — соседей нет, переносить незачем
+    if (source.activeBots.size < 2) return;
+
+    this.slowCallbacks.delete(key);
+    this.quarantinedBots.add(key);
+    console.warn(
+      `🏭 [WorkerPool:${projectId}] бот ${tokenId}: ${history.length} медленных колбэков — карантин в отдельном процессе`,
+    );
+    this.moveToDedicatedShard(projectId, tokenId).catch((err) => {
+      console.error(`🏭 [WorkerPool:${projectId}] карантин бота ${tokenId} не удался:`, err);
+    });
+  }
+
+  /**
+   * Пишет команду в stdin конкретного шарда
+   * @param worker - Шард
    * @param command - Команда для отправки
    */
-  sendCommand(projectId: number, command: WorkerCommand): boolean {
-    const worker = this.workers.get(projectId);
+  private writeCommand(worker: ProjectWorker | undefined, command: WorkerCommand): boolean {
     if (!worker || worker.status !== "ready") {
       return false;
     }
@@ -409,6 +801,56 @@ class BotWorkerManager extends EventEmitter {
     }
   }
 
+  /**
+   * Отправляет команду воркеру через stdin.
+   * Команда с token_id уходит в шард бота, без него — во все шарды проекта.
+   * @param projectId - ID проекта
+   * @param command - Команда для отправки
+   */
+  sendCommand(projectId: number, command: WorkerCommand): boolean {
+    if (command.token_id !== undefined) {
+      const shard = this.locateShard(projectId, command.token_id);
+      return this.writeCommand(this.workers.get(workerKey(projectId, shard)), command);
+    }
+    let sent = false;
+    for (const worker of this.projectWorkers(projectId)) {
+      sent = this.writeCommand(worker, command) || sent;
+    }
+    return sent;
+  }
+
+  /**
+   * Отправляет команду с req_id и ждёт ответ воркера.
+   * Воркер выполняет команды разных токенов параллельно, поэтому запросы можно
+   * слать пачкой, не дожидаясь предыдущих ответов.
+   * @param projectId - ID проекта
+   * @param command - Команда (req_id проставляется автоматически)
+   * @param timeoutMs - Таймаут ожидания ответа
+   * @returns Ответ воркера или null (не отправлено / таймаут)
+   */
+  request(
+    projectId: number,
+    command: WorkerCommand,
+    timeoutMs: number = WORKER_REPLY_TIMEOUT_MS,
+  ): Promise<WorkerReply | null> {
+    const reqId = this.nextReqId++;
+    return new Promise((resolve) => {
+      const timer = setTimeout(() => {
+        this.pendingReplies.delete(reqId);
+        resolve(null);
+      }, timeoutMs);
+      this.pendingReplies.set(reqId, (reply) => {
+        clearTimeout(timer);
+        resolve(reply);
+      });
+      if (!this.sendCommand(projectId, { ...command, req_id: reqId })) {
+        clearTimeout(timer);
+        this.pendingReplies.delete(reqId);
+        resolve(null);
+      }
+    });
+  }
+
   /**
    * Запускает бота в воркере и ждёт bot_started.
    * @param projectId - ID проекта
@@ -416,10 +858,12 @@ class BotWorkerManager extends EventEmitter {
    * @param tokenId - ID токена
    * @param botFile - Путь к сгенерированному bot.py
    */
-  async startBot(projectId: number, token: string, tokenId: number, botFile: string, webhook?: { webhookUrl: string; webhookPort: number }): Promise<void> {
+  async startBot(projectId: number, token: string, tokenId: number, botFile: string, webhook?: WorkerWebhookSpec): Promise<void> {
     return this.withTokenLock(projectId, tokenId, async () => {
-      this.cancelWorkerDrain(projectId);
-      const worker = await this.getOrCreateWorker(projectId);
+      this.launchSpecs.set(workerKey(projectId, tokenId), { token, botFile, webhook });
+      const shard = this.shardFor(projectId, tokenId);
+      this.cancelWorkerDrain(projectId, shard);
+      const worker = await this.getOrCreateWorker(projectId, shard);
 
       const started = waitForWorkerBotStart(
         this,
@@ -428,12 +872,12 @@ class BotWorkerManager extends EventEmitter {
         WORKER_START_CONFIRM_TIMEOUT_MS,
       );
 
-      const sent = this.sendCommand(projectId, {
-        cmd: "start_bot",
+      // Старты шарда за окно (restore) уходят одной командой start_bots
+      const sent = await this.startBatcher.enqueue(workerKey(projectId, shard), {
         token,
         token_id: tokenId,
         bot_file: botFile,
-        ...(webhook ? { webhook_url: webhook.webhookUrl, webhook_port: webhook.webhookPort } : {}),
+        ...webhookCommandFields(webhook),
       });
       if (!sent) {
         throw new Error(`Не удалось отправить start_bot project=${projectId} token=${tokenId}`);
@@ -452,17 +896,84 @@ class BotWorkerManager extends EventEmitter {
           tokenId,
           WORKER_STOP_CONFIRM_TIMEOUT_MS,
         );
-        this.sendCommand(projectId, { cmd: "stop_bot", token_id: tokenId });
+        this.writeCommand(worker, { cmd: "stop_bot", token_id: tokenId });
         await stopWait;
         worker.activeBots.delete(tokenId);
         if (worker.activeBots.size === 0) {
-          this.scheduleWorkerDrain(projectId);
+          this.scheduleWorkerDrain(projectId, shard);
         }
         throw new Error(`Таймаут bot_started project=${projectId} token=${tokenId}`);
       }
     });
   }
 
+  /**
+   * Горячая замена кода запущенного бота (reload_bot): новая версия грузится рядом
+   * со старой и забирает её polling, Redis lock, пул БД и FSM. Незапущенный бот
+   * просто стартует.
+   * @param projectId - ID проекта
+   * @param token - Токен бота
+   * @param tokenId - ID токена
+   * @param botFile - Путь к пересобранному bot.py
+   * @param webhook - Параметры webhook (для запуска с нуля)
+   * @returns true — апдейты обрабатывает новая версия; false — осталась прежняя
+   */
+  async reloadBot(
+    projectId: number,
+    token: string,
+    tokenId: number,
+    botFile: string,
+    webhook?: WorkerWebhookSpec,
+  ): Promise<boolean> {
+    const running = this.projectWorkers(projectId).some((w) => w.activeBots.has(tokenId));
+    if (!running) {
+      await this.startBot(projectId, token, tokenId, botFile, webhook);
+      return true;
+    }
+    return this.withTokenLock(projectId, tokenId, async () => {
+      const reply = await this.request(projectId, {
+        cmd: "reload_bot",
+        token,
+        token_id: tokenId,
+        bot_file: botFile,
+        ...webhookCommandFields(webhook),
+      });
+      if (!reply?.ok) {
+        console.warn(
+          `🏭 [WorkerPool:${projectId}] горячая замена бота ${tokenId} не удалась: ${reply?.error ?? "нет ответа"}`,
+        );
+        return false;
+      }
+      this.launchSpecs.set(workerKey(projectId, tokenId), { token, botFile, webhook });
+      return true;
+    });
+  }
+
+  /**
+   * Уровень логов бота (или всех ботов проекта, если tokenId не задан) без рестарта:
+   * фильтр в воркере до форматирования записи. Правило запоминается и применяется
+   * к шардам, которые поднимутся позже.
+   * @param projectId - ID проекта
+   * @param rule - Правило: tokenId, logger, level (null — снять), sample
+   * @returns Ответ воркера или null (нет запущенного воркера / таймаут)
+   */
+  async setLogLevel(projectId: number, rule: WorkerLogLevelRule): Promise<WorkerReply | null> {
+    this.logLevelRules.set(projectId, mergeLogLevelRule(this.logLevelRules.get(projectId) ?? [], rule));
+    return this.request(projectId, buildLogLevelCommand(rule));
+  }
+
+  /**
+   * Лимит строк лога бота (или всех ботов проекта): лишнее отбрасывается в воркере
+   * и в _RedisLogHandler бота, вместо него — сводки «пропущено N строк».
+   * @param projectId - ID проекта
+   * @param rule - Лимит: tokenId, rate (null — сброс), burst
+   * @returns Ответ воркера или null (нет запущенного воркера / таймаут)
+   */
+  async setLogLimit(projectId: number, rule: WorkerLogLimitRule): Promise<WorkerReply | null> {
+    this.logLimitRules.set(projectId, mergeLogLimitRule(this.logLimitRules.get(projectId) ?? [], rule));
+    return this.request(projectId, buildLogLimitCommand(rule));
+  }
+
   /**
    * Останавливает бота в воркере и ждёт bot_exited/bot_stopped.
    * @param projectId - ID проекта
@@ -471,7 +982,8 @@ class BotWorkerManager extends EventEmitter {
    */
   async stopBot(projectId: number, tokenId: number): Promise<boolean> {
     return this.withTokenLock(projectId, tokenId, async () => {
-      const worker = this.workers.get(projectId);
+      const shard = this.locateShard(projectId, tokenId);
+      const worker = this.workers.get(workerKey(projectId, shard));
       if (!worker) return true;
 
       const confirmed = waitForWorkerBotStop(
@@ -481,7 +993,7 @@ class BotWorkerManager extends EventEmitter {
         WORKER_STOP_CONFIRM_TIMEOUT_MS,
       );
 
-      const sent = this.sendCommand(projectId, {
+      const sent = this.writeCommand(worker, {
         cmd: "stop_bot",
         token_id: tokenId,
       });
@@ -492,14 +1004,14 @@ class BotWorkerManager extends EventEmitter {
 
       const ok = await confirmed;
       if (!ok) {
-        const w = this.workers.get(projectId);
+        const w = this.workers.get(workerKey(projectId, shard));
         if (w?.activeBots.has(tokenId)) {
           console.warn(
             `[WorkerPool:${projectId}] stop timeout token=${tokenId} — снимаем из activeBots без fake exit`,
           );
           w.activeBots.delete(tokenId);
           if (w.activeBots.size === 0 && w.status === "ready") {
-            this.scheduleWorkerDrain(projectId);
+            this.scheduleWorkerDrain(projectId, shard);
           }
         }
       }
@@ -508,19 +1020,106 @@ class BotWorkerManager extends EventEmitter {
   }
 
   /**
-   * Убивает воркер проекта
+   * Переносит «горячих» ботов в выделенные шарды.
+   * @param projectId - ID проекта
+   * @param cpuShares - Доля wall-времени loop шарда по tokenId (0..1)
+   * @param threshold - Порог доли (по умолчанию WORKER_HOT_BOT_CPU_SHARE)
+   * @returns tokenId перенесённых ботов
+   */
+  async rebalanceHotBots(
+    projectId: number,
+    cpuShares: Map<number, number>,
+    threshold: number = resolveHotBotCpuShare(),
+  ): Promise<number[]> {
+    const moved: number[] = [];
+    for (const tokenId of selectHotBots(cpuShares, threshold)) {
+      if (await this.moveToDedicatedShard(projectId, tokenId)) {
+        moved.push(tokenId);
+      }
+    }
+    return moved;
+  }
+
+  /**
+   * Перезапускает бота в его выделенном шарде (отдельный процесс).
+   * @param projectId - ID проекта
+   * @param tokenId - ID токена
+   * @returns false — бот не запущен через пул или уже в выделенном шарде
+   */
+  private async moveToDedicatedShard(projectId: number, tokenId: number): Promise<boolean> {
+    const key = workerKey(projectId, tokenId);
+    const spec = this.launchSpecs.get(key);
+    const current = this.locateShard(projectId, tokenId);
+    const target = dedicatedShardFor(tokenId);
+    if (!spec || current === target) return false;
+
+    console.log(
+      `🏭 [WorkerPool:${projectId}] бот ${tokenId} перегружает шард ${current} — переносим в шард ${target}`,
+    );
+    await this.stopBot(projectId, tokenId);
+    this.pinnedShards.set(key, target);
+    // Та же пауза, что и при обычном рестарте: иначе getUpdates Conflict
+    await sleepMs(POST_STOP_COOLDOWN_MS);
+    await this.startBot(projectId, spec.token, tokenId, spec.botFile, spec.webhook);
+    return true;
+  }
+
+  /**
+   * Возвращает остывшего бота из выделенного шарда в общий (по tokenId).
+   * @param projectId - ID проекта
+   * @param tokenId - ID токена
+   * @returns false — бот не закреплён за выделенным шардом или не запущен через пул
+   */
+  private async moveToSharedShard(projectId: number, tokenId: number): Promise<boolean> {
+    const key = workerKey(projectId, tokenId);
+    const spec = this.launchSpecs.get(key);
+    const pinned = this.pinnedShards.get(key);
+    if (!spec || pinned === undefined) return false;
+
+    console.log(`🏭 [WorkerPool:${projectId}] бот ${tokenId} остыл — возвращаем из шарда ${pinned} в общий`);
+    await this.stopBot(projectId, tokenId);
+    this.pinnedShards.delete(key);
+    await sleepMs(POST_STOP_COOLDOWN_MS);
+    await this.startBot(projectId, spec.token, tokenId, spec.botFile, spec.webhook);
+    return true;
+  }
+
+  /**
+   * Забывает состояние бота после остановки пользователем или удаления токена:
+   * закрепление за выделенным шардом, карантин, параметры запуска, slow_callback.
+   * @param projectId - ID проекта
+   * @param tokenId - ID токена
+   */
+  forgetBot(projectId: number, tokenId: number): void {
+    const key = workerKey(projectId, tokenId);
+    this.pinnedShards.delete(key);
+    this.quarantinedBots.delete(key);
+    this.launchSpecs.delete(key);
+    this.slowCallbacks.delete(key);
+  }
+
+  /**
+   * Убивает все шарды воркера проекта
    * @param projectId - ID проекта
    */
   async killWorker(projectId: number): Promise<void> {
-    this.cancelWorkerDrain(projectId);
-    const worker = this.workers.get(projectId);
-    if (!worker) return;
+    await Promise.all(this.projectWorkers(projectId).map((w) => this.killShard(w)));
+  }
+
+  /**
+   * Убивает один шард воркера
+   * @param worker - Шард
+   */
+  private async killShard(worker: ProjectWorker): Promise<void> {
+    const key = workerKey(worker.projectId, worker.shard);
+    this.cancelWorkerDrain(worker.projectId, worker.shard);
+    if (this.workers.get(key) !== worker) return;
 
     // Чтобы exit-handler не принял наш kill за OOM
-    this.intentionalKills.add(projectId);
+    this.intentionalKills.add(key);
 
     // Пытаемся graceful shutdown
-    const sent = this.sendCommand(projectId, { cmd: "shutdown" });
+    const sent = this.writeCommand(worker, { cmd: "shutdown" });
 
     if (sent) {
       // Ждём завершения до 5 секунд
@@ -543,18 +1142,25 @@ class BotWorkerManager extends EventEmitter {
       } catch { /* уже завершён */ }
     }
 
-    this.workers.delete(projectId);
+    if (this.workers.get(key) === worker) {
+      this.workers.delete(key);
+    }
   }
 
   /**
    * Останавливает все воркеры (graceful shutdown)
    */
   async shutdownAll(): Promise<void> {
+    if (this.rebalanceTimer) {
+      clearInterval(this.rebalanceTimer);
+      this.rebalanceTimer = null;
+    }
     const promises: Promise<void>[] = [];
-    for (const projectId of this.workers.keys()) {
-      promises.push(this.killWorker(projectId));
+    for (const worker of this.workers.values()) {
+      promises.push(this.killShard(worker));
     }
     await Promise.all(promises);
+    this.zygote?.stop();
   }
 
   /**
@@ -563,8 +1169,7 @@ class BotWorkerManager extends EventEmitter {
    * @param tokenId - ID токена
    */
   isBotRunning(projectId: number, tokenId: number): boolean {
-    const worker = this.workers.get(projectId);
-    return worker?.activeBots.has(tokenId) ?? false;
+    return this.projectWorkers(projectId).some((w) => w.activeBots.has(tokenId));
   }
 
   /**
@@ -572,8 +1177,7 @@ class BotWorkerManager extends EventEmitter {
    * @param projectId - ID проекта
    */
   hasWorker(projectId: number): boolean {
-    const worker = this.workers.get(projectId);
-    return worker?.status === "ready";
+    return this.projectWorkers(projectId).some((w) => w.status === "ready");
   }
 
   /**
@@ -581,16 +1185,16 @@ class BotWorkerManager extends EventEmitter {
    * @param projectId - ID проекта
    */
   getBotsCount(projectId: number): number {
-    return this.workers.get(projectId)?.activeBots.size ?? 0;
+    return this.projectWorkers(projectId).reduce((sum, w) => sum + w.activeBots.size, 0);
   }
 
   /**
    * Возвращает общую статистику по всем воркерам, включая RAM
    */
-  getStats(): { workers: number; totalBots: number; totalMemoryMb: number; details: Array<{ projectId: number; botsCount: number; memoryMb: number; pid: number | undefined }> } {
+  getStats(): { workers: number; totalBots: number; totalMemoryMb: number; details: Array<{ projectId: number; shard: number; botsCount: number; memoryMb: number; pid: number | undefined }> } {
     let totalBots = 0;
     let totalMemoryMb = 0;
-    const details: Array<{ projectId: number; botsCount: number; memoryMb: number; pid: number | undefined }> = [];
+    const details: Array<{ projectId: number; shard: number; botsCount: number; memoryMb: number; pid: number | undefined }> = [];
 
     for (const worker of this.workers.values()) {
       const botsCount = worker.activeBots.size;
@@ -625,7 +1229,7 @@ class BotWorkerManager extends EventEmitter {
       }
 
       totalMemoryMb += memoryMb;
-      details.push({ projectId: worker.projectId, botsCount, memoryMb, pid: worker.process.pid });
+      details.push({ projectId: worker.projectId, shard: worker.shard, botsCount, memoryMb, pid: worker.process.pid });
     }
 
     return { workers: this.workers.size, totalBots, totalMemoryMb, details };
@@ -5,7 +5,7 @@
 
 import { describe, it } from 'node:test';
 import assert from 'node:assert';
-import { buildBotRedisLockKey } from './clearBotRedisLock';
+import { buildBotRedisLockKey, shouldClearBotRedisLock } from './clearBotRedisLock';
 
 describe('buildBotRedisLockKey', () => {
   it('берёт последние 10 символов токена', () => {
@@ -19,3 +19,14 @@ describe('buildBotRedisLockKey', () => {
     assert.strictEqual(buildBotRedisLockKey('short'), 'bot:lock:short');
   });
 });
+
+describe('shouldClearBotRedisLock', () => {
+  it('без standby lock снимается перед стартом', () => {
+    assert.strictEqual(shouldClearBotRedisLock({}), true);
+    assert.strictEqual(shouldClearBotRedisLock({ BOT_STANDBY: 'false' }), true);
+  });
+
+  it('с BOT_STANDBY lease живого лидера не отбирается', () => {
+    assert.strictEqual(shouldClearBotRedisLock({ BOT_STANDBY: 'true' }), false);
+  });
+});
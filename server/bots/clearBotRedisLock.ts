@@ -14,9 +14,18 @@ export function buildBotRedisLockKey(token: string): string {
   return `bot:lock:${token.slice(-10)}`;
 }
 
+/**
+ * Можно ли снимать lock перед стартом: с BOT_STANDBY lease может держать живой
+ * лидер на другом хосте — его не отбираем, упавший отдаст lease за BOT_LEASE_TTL.
+ * @param env - Переменные окружения
+ */
+export function shouldClearBotRedisLock(env: { BOT_STANDBY?: string } = process.env): boolean {
+  return (env.BOT_STANDBY ?? '').toLowerCase() !== 'true';
+}
+
 /**
  * Удаляет Redis lock бота, чтобы следующий старт не получил «уже запущен».
- * Безопасно при отсутствии Redis / ошибках сети — lock истечёт по TTL (~60с).
+ * Безопасно при отсутствии Redis / ошибках сети — lease истечёт по TTL (BOT_LEASE_TTL, ~10с).
  * @param token - Полная строка токена бота (или null/undefined — no-op)
  * @param tokenId - ID токена для лога (опционально)
  * @returns true если del выполнен без исключения
@@ -25,7 +34,7 @@ export async function clearBotRedisLock(
   token: string | null | undefined,
   tokenId?: number,
 ): Promise<boolean> {
-  if (!token) return false;
+  if (!token || !shouldClearBotRedisLock()) return false;
   const pub = getRedisPublisher();
   if (!pub) return false;
   try {
@@ -1,16 +1,32 @@
 /**
- * @fileoverview Разбор system-сообщений Python worker (bot_started / bot_exited)
+ * @fileoverview Разбор system-сообщений Python worker (bot_started / bot_exited / slow_callback / webhook_server / bot_role)
  * @module server/bots/parseWorkerSystemMessage
  */
 
 /** Разобранное system-событие воркера */
 export interface ParsedWorkerSystemEvent {
   /** Вид события */
-  kind: 'bot_started' | 'bot_exited' | 'bot_stopped' | 'other';
+  kind:
+    | 'bot_started'
+    | 'bot_exited'
+    | 'bot_stopped'
+    | 'bot_reloaded'
+    | 'slow_callback'
+    | 'webhook_server'
+    | 'bot_role'
+    | 'other';
   /** ID токена, если есть */
   tokenId?: number;
   /** Статус из bot_exited */
   status?: string;
+  /** Сколько колбэк держал loop (мс, для slow_callback) */
+  durationMs?: number;
+  /** Порт общего webhook-сервера воркера (для webhook_server) */
+  port?: number;
+  /** Роль по Redis lease: leader | standby (для bot_role) */
+  role?: string;
+  /** Fencing-номер лидерства (для bot_role, 0 — не лидер) */
+  fence?: number;
   /** Исходная строка */
   raw: string;
 }
@@ -44,5 +60,36 @@ export function parseWorkerSystemMessage(content: string): ParsedWorkerSystemEve
       raw: content,
     };
   }
+  if (content.startsWith('bot_reloaded:')) {
+    const tokenId = parseInt(content.split(':')[1], 10);
+    return { kind: 'bot_reloaded', tokenId: Number.isFinite(tokenId) ? tokenId : undefined, raw: content };
+  }
+  if (content.startsWith('slow_callback:')) {
+    const parts = content.split(':');
+    const tokenId = parseInt(parts[1], 10);
+    const durationMs = parseFloat(parts[2]);
+    return {
+      kind: 'slow_callback',
+      tokenId: Number.isFinite(tokenId) ? tokenId : undefined,
+      durationMs: Number.isFinite(durationMs) ? durationMs : undefined,
+      raw: content,
+    };
+  }
+  if (content.startsWith('webhook_server:')) {
+    const port = parseInt(content.split(':')[1], 10);
+    return { kind: 'webhook_server', port: Number.isFinite(port) ? port : undefined, raw: content };
+  }
+  if (content.startsWith('bot_role:')) {
+    const parts = content.split(':');
+    const tokenId = parseInt(parts[1], 10);
+    const fence = parseInt(parts[3], 10);
+    return {
+      kind: 'bot_role',
+      tokenId: Number.isFinite(tokenId) ? tokenId : undefined,
+      role: parts[2] || undefined,
+      fence: Number.isFinite(fence) ? fence : 0,
+      raw: content,
+    };
+  }
   return { kind: 'other', raw: content };
 }
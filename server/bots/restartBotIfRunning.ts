@@ -36,12 +36,8 @@ export async function restartBotIfRunning(projectId: number): Promise<{ success:
     const launchToken = tokenRecord.token;
 
     if (process.env.USE_WORKER_POOL !== 'false') {
-      const stopResult = await stopBot(projectId, tokenId);
-      if (!stopResult.success) {
-        return { success: false, error: stopResult.error };
-      }
-      await sleepMs(POST_STOP_COOLDOWN_MS);
-      return await startBot(projectId, launchToken, tokenId);
+      // Горячая замена кода (reload_bot); stop/start — только если воркер её не принял
+      return await startBot(projectId, launchToken, tokenId, { hotReload: true });
     }
 
     const stopResult = await stopBot(projectId, tokenId);
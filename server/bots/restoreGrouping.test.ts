@@ -5,7 +5,12 @@
 
 import { describe, it } from 'node:test';
 import assert from 'node:assert';
-import { groupRestoreInstancesByProject } from './restoreGrouping';
+import {
+  DEFAULT_RESTORE_PROJECT_CONCURRENCY,
+  forEachWithConcurrency,
+  groupRestoreInstancesByProject,
+  resolveRestoreProjectConcurrency,
+} from './restoreGrouping';
 
 describe('groupRestoreInstancesByProject', () => {
   it('группирует по projectId', () => {
@@ -46,3 +51,26 @@ describe('groupRestoreInstancesByProject', () => {
     assert.deepStrictEqual(groupRestoreInstancesByProject([]), []);
   });
 });
+
+describe('restore внутри проекта с ограниченным параллелизмом', () => {
+  it('RESTORE_PROJECT_CONCURRENCY из env, мусор — по умолчанию', () => {
+    assert.strictEqual(resolveRestoreProjectConcurrency({}), DEFAULT_RESTORE_PROJECT_CONCURRENCY);
+    assert.strictEqual(resolveRestoreProjectConcurrency({ RESTORE_PROJECT_CONCURRENCY: '1' }), 1);
+    assert.strictEqual(resolveRestoreProjectConcurrency({ RESTORE_PROJECT_CONCURRENCY: '0' }), DEFAULT_RESTORE_PROJECT_CONCURRENCY);
+  });
+
+  it('не больше limit одновременно, каждый элемент ровно один раз', async () => {
+    let running = 0;
+    let peak = 0;
+    const seen: number[] = [];
+    await forEachWithConcurrency([1, 2, 3, 4, 5], 2, async (item) => {
+      running += 1;
+      peak = Math.max(peak, running);
+      await new Promise((r) => setTimeout(r, 5));
+      seen.push(item);
+      running -= 1;
+    });
+    assert.strictEqual(peak, 2);
+    assert.deepStrictEqual(seen.sort(), [1, 2, 3, 4, 5]);
+  });
+});
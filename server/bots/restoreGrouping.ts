@@ -33,3 +33,40 @@ export function groupRestoreInstancesByProject<T extends RestoreGroupInstance>(
 
   return [...byProject.values()];
 }
+
+/** Сколько ботов одного проекта restore поднимает одновременно по умолчанию */
+export const DEFAULT_RESTORE_PROJECT_CONCURRENCY = 4;
+
+/**
+ * Параллелизм restore внутри проекта из RESTORE_PROJECT_CONCURRENCY (1 — строго по очереди).
+ * Одновременные старты одного шарда воркер получает пакетом start_bots.
+ * @param env - Переменные окружения
+ */
+export function resolveRestoreProjectConcurrency(
+  env: { RESTORE_PROJECT_CONCURRENCY?: string } = process.env,
+): number {
+  const n = parseInt(env.RESTORE_PROJECT_CONCURRENCY ?? "", 10);
+  return Number.isFinite(n) && n > 0 ? n : DEFAULT_RESTORE_PROJECT_CONCURRENCY;
+}
+
+/**
+ * Обходит элементы не более чем limit «дорожками»; каждая берёт следующий по порядку.
+ * @param items - Элементы
+ * @param limit - Число одновременно выполняемых fn
+ * @param fn - Обработчик (индекс — позиция в items)
+ */
+export async function forEachWithConcurrency<T>(
+  items: T[],
+  limit: number,
+  fn: (item: T, index: number) => Promise<void>,
+): Promise<void> {
+  let next = 0;
+  const lane = async (): Promise<void> => {
+    while (next < items.length) {
+      const index = next++;
+      await fn(items[index], index);
+    }
+  };
+  const lanes = Math.max(1, Math.min(limit, items.length));
+  await Promise.all(Array.from({ length: lanes }, lane));
+}
@@ -16,7 +16,11 @@ import {
   markRestoreStarted,
   markTokenRestored,
 } from "./restoreState";
-import { groupRestoreInstancesByProject } from "./restoreGrouping";
+import {
+  forEachWithConcurrency,
+  groupRestoreInstancesByProject,
+  resolveRestoreProjectConcurrency,
+} from "./restoreGrouping";
 
 export interface RestoreRunningBotsResult {
   /** Сколько ботов пытались поднять */
@@ -45,7 +49,9 @@ function isAbruptShutdown(errorMessage: string | null | undefined): boolean {
 }
 
 /**
- * Восстанавливает одну группу ботов одного проекта последовательно (один WorkerPool).
+ * Восстанавливает одну группу ботов одного проекта (один WorkerPool): не больше
+ * RESTORE_PROJECT_CONCURRENCY стартов сразу, каждая «дорожка» — со stagger-паузой.
+ * Одновременные старты шард получает одной командой start_bots.
  * @param group - Инстансы одного projectId
  * @returns Счётчики успеха и неудач
  */
@@ -56,8 +62,7 @@ async function restoreProjectGroup(
   const failedTokenIds: number[] = [];
   const groupTotal = group.length;
 
-  for (let i = 0; i < group.length; i++) {
-    const instance = group[i];
+  await forEachWithConcurrency(group, resolveRestoreProjectConcurrency(), async (instance, i) => {
     const tokenId = instance.tokenId;
 
     try {
@@ -81,7 +86,7 @@ async function restoreProjectGroup(
         });
         if (tokenId != null) failedTokenIds.push(tokenId);
         markTokenRestored(tokenId ?? -1);
-        continue;
+        return;
       }
 
       const inactiveError = refuseInactiveBotStart(tokenRecord.isActive);
@@ -95,7 +100,7 @@ async function restoreProjectGroup(
           errorMessage: inactiveError,
         });
         markTokenRestored(tokenId);
-        continue;
+        return;
       }
 
       await clearBotRedisLock(launchToken, tokenId);
@@ -142,7 +147,7 @@ async function restoreProjectGroup(
     if (i < group.length - 1) {
       await waitRestoreStagger(RESTORE_START_STAGGER_MS);
     }
-  }
+  });
 
   return { restored, failedTokenIds };
 }
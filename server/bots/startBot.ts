@@ -52,6 +52,7 @@ import { pendingLaunchIds } from '../terminal/setupBotProcessListeners';
 import { clearBotLogs } from '../terminal/botLogsBuffer';
 import { setActiveLaunchId, clearActiveLaunchId } from '../terminal/activeLaunchIds';
 import { closeActiveLaunchHistory } from './closeActiveLaunchHistory';
+import { POST_STOP_COOLDOWN_MS, sleepMs } from './restartTiming';
 import {
   getRestartDelay,
   incrementRestartCounter,
@@ -83,6 +84,8 @@ import {
  * @param {number} projectId - Идентификатор проекта, к которому относится бот
  * @param {string} token - Токен Telegram-бота, используемый для аутентификации
  * @param {number} tokenId - Идентификатор токена в системе
+ * @param {object} [options] - clearLogs; reuseGeneratedCode; hotReload — запущенный в воркере бот
+ *   получает новый код через reload_bot без остановки (при отказе — stop/start)
  *
  * @returns {Promise<{ success: boolean; error?: string; processId?: string; }>} Объект с результатом операции:
  *   - success: true если бот успешно запущен, false в случае ошибки
@@ -117,7 +120,7 @@ export async function startBot(
   projectId: number,
   token: string,
   tokenId: number,
-  options?: { clearLogs?: boolean; reuseGeneratedCode?: boolean },
+  options?: { clearLogs?: boolean; reuseGeneratedCode?: boolean; hotReload?: boolean },
 ): Promise<{ success: boolean; error?: string; processId?: string | undefined; }> {
   const shouldClearLogs = options?.clearLogs !== false; // по умолчанию true
   try {
@@ -425,11 +428,23 @@ export async function startBot(
       }
 
       try {
-        await workerManager.startBot(projectId, token, tokenId, mainFile, effectiveWebhookUrl ? {
+        const webhook = effectiveWebhookUrl ? {
           webhookUrl: effectiveWebhookUrl,
           webhookPort: 9000 + tokenId,
-        } : undefined);
-        console.log(`🏭 [WorkerPool] Бот ${projectId}/${tokenId} отправлен в воркер`);
+          secretToken: tokenSettings?.webhookSecretToken ?? null,
+        } : undefined;
+        if (options?.hotReload && workerManager.isBotRunning(projectId, tokenId)) {
+          // Новый код подхватывается без паузы getUpdates; при отказе — обычный stop/start
+          if (!await workerManager.reloadBot(projectId, token, tokenId, mainFile, webhook)) {
+            await workerManager.stopBot(projectId, tokenId);
+            await sleepMs(POST_STOP_COOLDOWN_MS);
+            await workerManager.startBot(projectId, token, tokenId, mainFile, webhook);
+          }
+          console.log(`🏭 [WorkerPool] Бот ${projectId}/${tokenId} перезагружен в воркере`);
+        } else {
+          await workerManager.startBot(projectId, token, tokenId, mainFile, webhook);
+          console.log(`🏭 [WorkerPool] Бот ${projectId}/${tokenId} отправлен в воркер`);
+        }
       } catch (workerError) {
         console.error(`🏭 [WorkerPool] Ошибка запуска бота через воркер:`, workerError);
         const errMsg = workerError instanceof Error ? workerError.message : 'Ошибка воркера';
@@ -499,6 +514,7 @@ export async function startBot(
         ...(effectiveWebhookUrl ? {
           WEBHOOK_URL: effectiveWebhookUrl,
           WEBHOOK_PORT: String(9000 + tokenId),
+          ...(tokenSettings?.webhookSecretToken ? { WEBHOOK_SECRET_TOKEN: tokenSettings.webhookSecretToken } : {}),
         } : {})
       }
     });
@@ -81,6 +81,8 @@ export async function stopBot(projectId: number, tokenId: number): Promise<{ suc
         };
       }
 
+      // Остановленный пользователем бот стартует заново в своём общем шарде
+      workerManager.forgetBot(projectId, tokenId);
       await storage.closeAllRunningLaunchHistory(tokenId, {
         status: 'stopped',
         stoppedAt: new Date(),
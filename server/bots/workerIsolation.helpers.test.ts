@@ -31,6 +31,21 @@ describe('parseWorkerSystemMessage', () => {
     assert.strictEqual(ev.tokenId, 10);
   });
 
+  it('парсит webhook_server с портом', () => {
+    const ev = parseWorkerSystemMessage('webhook_server:41235');
+    assert.strictEqual(ev.kind, 'webhook_server');
+    assert.strictEqual(ev.port, 41235);
+  });
+
+  it('парсит bot_role с ролью и fence', () => {
+    const ev = parseWorkerSystemMessage('bot_role:42:leader:7');
+    assert.strictEqual(ev.kind, 'bot_role');
+    assert.strictEqual(ev.tokenId, 42);
+    assert.strictEqual(ev.role, 'leader');
+    assert.strictEqual(ev.fence, 7);
+    assert.strictEqual(parseWorkerSystemMessage('bot_role:42:standby:0').role, 'standby');
+  });
+
   it('other для неизвестных', () => {
     assert.strictEqual(parseWorkerSystemMessage('worker_ready').kind, 'other');
   });
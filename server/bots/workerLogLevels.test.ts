@@ -0,0 +1,89 @@
+/**
+ * @fileoverview Тесты правил уровня и лимита логов воркера
+ * @module server/bots/workerLogLevels.test
+ */
+
+import { describe, it } from 'node:test';
+import assert from 'node:assert';
+import {
+  buildLogLevelCommand,
+  buildLogLimitCommand,
+  mergeLogLevelRule,
+  mergeLogLimitRule,
+  parseLogLevelRule,
+  parseLogLimitRule,
+} from './workerLogLevels';
+
+describe('workerLogLevels', () => {
+  it('команда set_log_level по правилу', () => {
+    assert.deepStrictEqual(buildLogLevelCommand({ tokenId: 42, level: 'DEBUG' }), {
+      cmd: 'set_log_level',
+      token_id: 42,
+      level: 'DEBUG',
+    });
+    assert.deepStrictEqual(buildLogLevelCommand({ logger: 'aiogram', level: 'WARNING', sample: 10 }), {
+      cmd: 'set_log_level',
+      logger: 'aiogram',
+      level: 'WARNING',
+      sample: 10,
+    });
+  });
+
+  it('правило того же бота и логгера заменяет прежнее', () => {
+    let rules = mergeLogLevelRule([], { tokenId: 42, level: 'DEBUG' });
+    rules = mergeLogLevelRule(rules, { tokenId: 42, logger: 'aiogram', level: 'INFO' });
+    rules = mergeLogLevelRule(rules, { tokenId: 42, level: 'WARNING' });
+    rules = mergeLogLevelRule(rules, { tokenId: 42, sample: 20 });
+    assert.deepStrictEqual(rules, [
+      { tokenId: 42, logger: 'aiogram', level: 'INFO' },
+      { tokenId: 42, level: 'WARNING' },
+      { tokenId: 42, sample: 20 },
+    ]);
+  });
+
+  it('сброс убирает все правила бота, чужие остаются', () => {
+    let rules = mergeLogLevelRule([], { tokenId: 42, level: 'DEBUG' });
+    rules = mergeLogLevelRule(rules, { level: 'WARNING' });
+    rules = mergeLogLevelRule(rules, { tokenId: 42, level: null });
+    assert.deepStrictEqual(rules, [{ level: 'WARNING' }]);
+  });
+
+  it('лимит: последний на бота, null — сброс', () => {
+    assert.deepStrictEqual(buildLogLimitCommand({ tokenId: 42, rate: 20, burst: 100 }), {
+      cmd: 'set_log_limit',
+      token_id: 42,
+      rate: 20,
+      burst: 100,
+    });
+    let rules = mergeLogLimitRule([], { rate: 500 });
+    rules = mergeLogLimitRule(rules, { tokenId: 42, rate: 20 });
+    rules = mergeLogLimitRule(rules, { tokenId: 42, rate: 10 });
+    assert.deepStrictEqual(rules, [{ rate: 500 }, { tokenId: 42, rate: 10 }]);
+    assert.deepStrictEqual(mergeLogLimitRule(rules, { tokenId: 42, rate: null }), [{ rate: 500 }]);
+  });
+
+  it('тело запроса log-level → правило или ошибка', () => {
+    assert.deepStrictEqual(parseLogLevelRule({ tokenId: 'token_42', logger: 'aiogram', level: 'debug' }), {
+      tokenId: 42,
+      logger: 'aiogram',
+      level: 'DEBUG',
+    });
+    assert.deepStrictEqual(parseLogLevelRule({ sample: 10 }), { level: null, sample: 10 });
+    assert.deepStrictEqual(parseLogLevelRule({}), { level: null });
+    assert.ok('error' in parseLogLevelRule({ level: 'LOUD' }));
+    assert.ok('error' in parseLogLevelRule({ sample: 0 }));
+    assert.ok('error' in parseLogLevelRule({ tokenId: 'abc' }));
+  });
+
+  it('тело запроса log-limit → лимит или ошибка', () => {
+    assert.deepStrictEqual(parseLogLimitRule({ tokenId: 42, rate: 20, burst: 100 }), {
+      tokenId: 42,
+      rate: 20,
+      burst: 100,
+    });
+    assert.deepStrictEqual(parseLogLimitRule({ rate: null }), { rate: null });
+    assert.ok('error' in parseLogLimitRule({}));
+    assert.ok('error' in parseLogLimitRule({ rate: -1 }));
+    assert.ok('error' in parseLogLimitRule({ rate: '20' }));
+  });
+});
@@ -0,0 +1,178 @@
+/**
+ * @fileoverview Уровни и лимиты логов ботов в воркере (команды set_log_level, set_log_limit)
+ *
+ * Правила хранятся по проекту и повторно отправляются в каждый новый шард
+ * (респаун воркера, перенос бота), чтобы бот под отладкой не терял DEBUG.
+ * @module server/bots/workerLogLevels
+ */
+
+/** Правило уровня логов: бот (или все боты воркера) и, при желании, логгер */
+export interface WorkerLogLevelRule {
+  /** ID токена; не задан — все боты воркера */
+  tokenId?: number;
+  /** Имя логгера (aiogram, aiogram.event, …); не задан — все логгеры бота */
+  logger?: string;
+  /** DEBUG | INFO | WARNING | ERROR | CRITICAL; null — снять правило */
+  level?: string | null;
+  /** Выборка DEBUG/INFO: 1 из N записей с одного места вызова */
+  sample?: number;
+}
+
+/** Команда set_log_level для stdin воркера */
+export interface WorkerLogLevelCommand {
+  cmd: "set_log_level";
+  token_id?: number;
+  logger?: string;
+  level: string | null;
+  sample?: number;
+}
+
+/**
+ * Команда воркера по правилу.
+ * @param rule - Правило уровня логов
+ */
+export function buildLogLevelCommand(rule: WorkerLogLevelRule): WorkerLogLevelCommand {
+  const command: WorkerLogLevelCommand = { cmd: "set_log_level", level: rule.level ?? null };
+  if (rule.tokenId !== undefined) command.token_id = rule.tokenId;
+  if (rule.logger) command.logger = rule.logger;
+  if (rule.sample !== undefined) command.sample = rule.sample;
+  return command;
+}
+
+/**
+ * Полный сброс правил бота: без уровня, логгера и выборки.
+ * @param rule - Правило уровня логов
+ */
+function isReset(rule: WorkerLogLevelRule): boolean {
+  return (rule.level ?? null) === null && !rule.logger && rule.sample === undefined;
+}
+
+/**
+ * Добавляет правило к сохранённым: сброс убирает все правила бота, правило с тем же
+ * ботом, логгером и видом (уровень/выборка) заменяет прежнее.
+ * @param rules - Сохранённые правила проекта (в порядке применения)
+ * @param rule - Новое правило
+ * @returns Новый список правил
+ */
+export function mergeLogLevelRule(
+  rules: WorkerLogLevelRule[],
+  rule: WorkerLogLevelRule,
+): WorkerLogLevelRule[] {
+  const tokenId = rule.tokenId ?? 0;
+  const sameBot = (r: WorkerLogLevelRule) => (r.tokenId ?? 0) === tokenId;
+  if (isReset(rule)) {
+    return rules.filter((r) => !sameBot(r));
+  }
+  const kind = (r: WorkerLogLevelRule) => (r.sample !== undefined ? "sample" : "level");
+  const kept = rules.filter(
+    (r) => !(sameBot(r) && (r.logger ?? "") === (rule.logger ?? "") && kind(r) === kind(rule)),
+  );
+  return [...kept, rule];
+}
+
+/** Лимит строк лога бота (token bucket в воркере и в _RedisLogHandler бота) */
+export interface WorkerLogLimitRule {
+  /** ID токена; не задан — все боты воркера */
+  tokenId?: number;
+  /** Строк в секунду (0 — без лимита); null — сбросить к лимиту по умолчанию */
+  rate: number | null;
+  /** Запас строк сверх rate (по умолчанию = rate) */
+  burst?: number;
+}
+
+/** Команда set_log_limit для stdin воркера */
+export interface WorkerLogLimitCommand {
+  cmd: "set_log_limit";
+  token_id?: number;
+  rate: number | null;
+  burst?: number;
+}
+
+/**
+ * Команда воркера по лимиту.
+ * @param rule - Лимит строк лога
+ */
+export function buildLogLimitCommand(rule: WorkerLogLimitRule): WorkerLogLimitCommand {
+  const command: WorkerLogLimitCommand = { cmd: "set_log_limit", rate: rule.rate };
+  if (rule.tokenId !== undefined) command.token_id = rule.tokenId;
+  if (rule.burst !== undefined) command.burst = rule.burst;
+  return command;
+}
+
+/**
+ * Добавляет лимит к сохранённым: у бота (или у всех ботов) действует последний.
+ * @param rules - Сохранённые лимиты проекта
+ * @param rule - Новый лимит
+ * @returns Новый список лимитов
+ */
+export function mergeLogLimitRule(
+  rules: WorkerLogLimitRule[],
+  rule: WorkerLogLimitRule,
+): WorkerLogLimitRule[] {
+  const kept = rules.filter((r) => (r.tokenId ?? 0) !== (rule.tokenId ?? 0));
+  return rule.rate === null ? kept : [...kept, rule];
+}
+
+/** Имена уровней, которые принимает log_control воркера */
+const LOG_LEVEL_NAMES = new Set(["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]);
+
+/**
+ * ID токена из тела запроса: число, "42" или "token_42"; не задан — все боты.
+ * @param raw - Сырое значение tokenId
+ * @returns ID, undefined (не задан) или null (некорректный)
+ */
+function parseRuleTokenId(raw: unknown): number | undefined | null {
+  if (raw === undefined || raw === null || raw === "") return undefined;
+  const n = typeof raw === "number" ? raw : Number(String(raw).match(/(\d+)$/)?.[1]);
+  return Number.isInteger(n) && n > 0 ? n : null;
+}
+
+/**
+ * Правило уровня логов из тела POST /api/projects/:id/bot/log-level.
+ * @param body - { tokenId?, logger?, level?, sample? }
+ * @returns Правило или { error } с текстом для 400
+ */
+export function parseLogLevelRule(body: unknown): WorkerLogLevelRule | { error: string } {
+  const raw = (body ?? {}) as Record<string, unknown>;
+  const tokenId = parseRuleTokenId(raw.tokenId);
+  if (tokenId === null) return { error: "Некорректный tokenId" };
+  const rule: WorkerLogLevelRule = { level: null };
+  if (tokenId !== undefined) rule.tokenId = tokenId;
+  if (raw.logger !== undefined && raw.logger !== null && raw.logger !== "") {
+    if (typeof raw.logger !== "string") return { error: "logger должен быть строкой" };
+    rule.logger = raw.logger;
+  }
+  if (raw.level !== undefined && raw.level !== null) {
+    const level = String(raw.level).trim().toUpperCase();
+    if (!LOG_LEVEL_NAMES.has(level)) return { error: `Неизвестный уровень лога: ${String(raw.level)}` };
+    rule.level = level;
+  }
+  if (raw.sample !== undefined && raw.sample !== null) {
+    if (!Number.isInteger(raw.sample) || (raw.sample as number) < 1) {
+      return { error: "sample должен быть целым >= 1" };
+    }
+    rule.sample = raw.sample as number;
+  }
+  return rule;
+}
+
+/**
+ * Лимит строк лога из тела POST /api/projects/:id/bot/log-limit.
+ * @param body - { tokenId?, rate (null — сброс), burst? }
+ * @returns Лимит или { error } с текстом для 400
+ */
+export function parseLogLimitRule(body: unknown): WorkerLogLimitRule | { error: string } {
+  const raw = (body ?? {}) as Record<string, unknown>;
+  const tokenId = parseRuleTokenId(raw.tokenId);
+  if (tokenId === null) return { error: "Некорректный tokenId" };
+  if (raw.rate === undefined) return { error: "Требуется rate (null — сброс)" };
+  const isCount = (v: unknown) => typeof v === "number" && Number.isFinite(v) && v >= 0;
+  if (raw.rate !== null && !isCount(raw.rate)) return { error: "rate должен быть числом >= 0" };
+  if (raw.burst !== undefined && raw.burst !== null && !isCount(raw.burst)) {
+    return { error: "burst должен быть числом >= 0" };
+  }
+  const rule: WorkerLogLimitRule = { rate: raw.rate as number | null };
+  if (tokenId !== undefined) rule.tokenId = tokenId;
+  if (typeof raw.burst === "number") rule.burst = raw.burst;
+  return rule;
+}
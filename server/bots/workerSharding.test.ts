@@ -0,0 +1,145 @@
+/**
+ * @fileoverview Тесты шардирования ботов по воркерам проекта
+ * @module server/bots/workerSharding.test
+ */
+
+import { describe, it } from 'node:test';
+import assert from 'node:assert';
+import {
+  DEDICATED_SHARD_BASE,
+  MAX_SHARDS_PER_PROJECT,
+  DEFAULT_REBALANCE_INTERVAL_MS,
+  DEFAULT_REBALANCE_LOOP_BUSY,
+  cooledBotsFromMetrics,
+  dedicatedShardFor,
+  hotBotsFromMetrics,
+  jumpConsistentHash,
+  loopSharesFromMetrics,
+  parseShardOverrides,
+  pickShard,
+  recordSlowCallback,
+  resolveHotBotCpuShare,
+  resolveRebalanceIntervalMs,
+  resolveRebalanceLoopBusy,
+  resolveShardCount,
+  resolveSlowCallbackQuarantine,
+  selectHotBots,
+  shouldPollShardMetrics,
+} from './workerSharding';
+
+describe('workerSharding', () => {
+  it('по умолчанию один шард', () => {
+    assert.strictEqual(resolveShardCount(1, {}, 8), 1);
+  });
+
+  it('auto = число ядер, per-project переопределяет глобальное', () => {
+    assert.strictEqual(resolveShardCount(1, { WORKER_SHARDS: 'auto' }, 8), 8);
+    const env = { WORKER_SHARDS: '2', WORKER_SHARDS_PROJECTS: '12:4, 15:auto' };
+    assert.strictEqual(resolveShardCount(12, env, 8), 4);
+    assert.strictEqual(resolveShardCount(15, env, 8), 8);
+    assert.strictEqual(resolveShardCount(99, env, 8), 2);
+  });
+
+  it('мусор в env игнорируется, число шардов ограничено', () => {
+    assert.deepStrictEqual([...parseShardOverrides('x:1,3:y,,7:0', 4)], []);
+    assert.strictEqual(resolveShardCount(1, { WORKER_SHARDS: '1000' }, 4), MAX_SHARDS_PER_PROJECT);
+  });
+
+  it('размещение детерминировано и в диапазоне', () => {
+    for (let t = 1; t < 500; t++) {
+      const s = pickShard(t, 4);
+      assert.ok(s >= 0 && s < 4);
+      assert.strictEqual(pickShard(t, 4), s);
+    }
+    assert.strictEqual(jumpConsistentHash(42, 1), 0);
+  });
+
+  it('при добавлении шарда переезжает малая доля токенов', () => {
+    let moved = 0;
+    const total = 2000;
+    for (let t = 1; t <= total; t++) {
+      if (pickShard(t, 4) !== pickShard(t, 5)) moved++;
+    }
+    assert.ok(moved / total < 0.3, `moved=${moved}`);
+  });
+
+  it('горячие боты выбираются только при соседях', () => {
+    assert.deepStrictEqual(selectHotBots(new Map([[1, 0.9]]), 0.5), []);
+    const shares = new Map([[1, 0.1], [2, 0.75], [3, 0.15]]);
+    assert.deepStrictEqual(selectHotBots(shares, 0.5), [2]);
+    assert.strictEqual(dedicatedShardFor(7), DEDICATED_SHARD_BASE + 7);
+    assert.strictEqual(resolveHotBotCpuShare({ WORKER_HOT_BOT_CPU_SHARE: '2' }), 0.6);
+  });
+
+  it('доли loop из ответа metrics', () => {
+    const shares = loopSharesFromMetrics([
+      { token_id: 1, loop_share: 0.02 },
+      { token_id: 2, loop_share: 0.95 },
+    ]);
+    assert.deepStrictEqual(selectHotBots(shares, 0.6), [2]);
+    assert.strictEqual(loopSharesFromMetrics(undefined).size, 0);
+  });
+
+  it('опрос metrics: готовые общие шарды с соседями и выделенные шарды', () => {
+    // По умолчанию опрос выключен
+    assert.strictEqual(resolveRebalanceIntervalMs({}), 0);
+    assert.strictEqual(resolveRebalanceIntervalMs({ WORKER_REBALANCE_INTERVAL_MS: '60000' }), 60_000);
+    assert.strictEqual(resolveRebalanceIntervalMs({ WORKER_REBALANCE_INTERVAL_MS: '0' }), 0);
+    assert.strictEqual(resolveRebalanceIntervalMs({ WORKER_REBALANCE_INTERVAL_MS: 'x' }), DEFAULT_REBALANCE_INTERVAL_MS);
+    assert.strictEqual(shouldPollShardMetrics(0, true, 3), true);
+    assert.strictEqual(shouldPollShardMetrics(0, false, 3), false);
+    assert.strictEqual(shouldPollShardMetrics(1, true, 1), false);
+    // Выделенный шард опрашивается, чтобы вернуть остывшего бота
+    assert.strictEqual(shouldPollShardMetrics(DEDICATED_SHARD_BASE + 7, true, 1), true);
+    assert.strictEqual(shouldPollShardMetrics(DEDICATED_SHARD_BASE + 7, true, 0), false);
+  });
+
+  it('остывший бот выделенного шарда возвращается в общий', () => {
+    const shard = DEDICATED_SHARD_BASE + 2;
+    assert.deepStrictEqual(cooledBotsFromMetrics(shard, { bots: [{ token_id: 2, loop_share: 0.1 }] }, 0.6), [2]);
+    // Между половиной порога и порогом — остаётся (без переноса туда-обратно)
+    assert.deepStrictEqual(cooledBotsFromMetrics(shard, { bots: [{ token_id: 2, loop_share: 0.4 }] }, 0.6), []);
+    assert.deepStrictEqual(cooledBotsFromMetrics(0, { bots: [{ token_id: 2, loop_share: 0.1 }] }, 0.6), []);
+  });
+
+  it('кадр metrics общего шарда запускает перенос горячего бота', () => {
+    const bots = [
+      { token_id: 1, loop_share: 0.05 },
+      { token_id: 2, loop_share: 0.8 },
+      { token_id: 3, loop_share: 0.1 },
+    ];
+    assert.deepStrictEqual(hotBotsFromMetrics(0, { loop_busy: 0.95, bots }, 0.6, 0.8), [2]);
+    assert.deepStrictEqual(hotBotsFromMetrics(0, { loop_busy: 0.95, bots }, 0.9, 0.8), []);
+    // Бот уже в выделенном шарде — переносить некуда
+    assert.deepStrictEqual(hotBotsFromMetrics(DEDICATED_SHARD_BASE + 2, { loop_busy: 0.95, bots }, 0.6, 0.8), []);
+    assert.deepStrictEqual(hotBotsFromMetrics(0, undefined, 0.6, 0.8), []);
+  });
+
+  it('почти простаивающий loop не перебалансируется', () => {
+    // Доли от wall-времени: самый занятый бот держит loop 3% окна
+    const bots = [
+      { token_id: 1, loop_share: 0.001 },
+      { token_id: 2, loop_share: 0.03 },
+    ];
+    assert.deepStrictEqual(hotBotsFromMetrics(0, { loop_busy: 0.031, bots }, 0.6, 0.8), []);
+    // Кадр старого воркера без loop_busy — не переносим
+    assert.deepStrictEqual(hotBotsFromMetrics(0, { bots: [{ token_id: 1, loop_share: 0.9 }, { token_id: 2, loop_share: 0.1 }] }, 0.6, 0.8), []);
+    assert.strictEqual(resolveRebalanceLoopBusy({}), DEFAULT_REBALANCE_LOOP_BUSY);
+    assert.strictEqual(resolveRebalanceLoopBusy({ WORKER_REBALANCE_LOOP_BUSY: '0.5' }), 0.5);
+  });
+
+  it('карантин по частоте slow_callback в окне', () => {
+    assert.strictEqual(resolveSlowCallbackQuarantine({}).limit, 0);
+    const rule = resolveSlowCallbackQuarantine({
+      WORKER_QUARANTINE_SLOW_CALLBACKS: '3',
+      WORKER_QUARANTINE_WINDOW_MS: '1000',
+    });
+    const history: number[] = [];
+    assert.strictEqual(recordSlowCallback(history, 0, rule), false);
+    assert.strictEqual(recordSlowCallback(history, 500, rule), false);
+    // Первый вышел из окна — снова два
+    assert.strictEqual(recordSlowCallback(history, 1400, rule), false);
+    assert.strictEqual(recordSlowCallback(history, 1450, rule), true);
+    assert.strictEqual(recordSlowCallback([], 0, { limit: 0, windowMs: 1000 }), false);
+  });
+});
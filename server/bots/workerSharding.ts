@@ -0,0 +1,303 @@
+/**
+ * @fileoverview Шардирование ботов проекта по нескольким Python-воркерам
+ *
+ * По умолчанию 1 проект = 1 воркер. При WORKER_SHARDS > 1 токены проекта
+ * раскладываются по N процессам детерминированно (jump consistent hash по tokenId),
+ * так что при изменении N переезжает минимум ботов.
+ * @module server/bots/workerSharding
+ */
+
+import { cpus } from "node:os";
+
+/** Индекс, с которого начинаются выделенные шарды «горячих» ботов */
+export const DEDICATED_SHARD_BASE = 1_000;
+
+/** Верхний предел числа общих шардов на проект */
+export const MAX_SHARDS_PER_PROJECT = 64;
+
+/**
+ * Доля wall-времени окна metrics, которую loop шарда занят колбэками бота,
+ * после которой бот выносится в свой шард (по умолчанию)
+ */
+export const DEFAULT_HOT_BOT_CPU_SHARE = 0.6;
+
+/** Загрузка loop шарда (доля wall-времени), ниже которой горячих ботов не ищем */
+export const DEFAULT_REBALANCE_LOOP_BUSY = 0.8;
+
+/** Период опроса metrics для переноса горячих ботов по умолчанию (0 — выключено) */
+export const DEFAULT_REBALANCE_INTERVAL_MS = 0;
+
+/** Переменные окружения, влияющие на шардирование */
+export interface ShardingEnv {
+  /** "auto" | число шардов на проект (по умолчанию 1) */
+  WORKER_SHARDS?: string;
+  /** Переопределения per-project: "12:4,15:auto" */
+  WORKER_SHARDS_PROJECTS?: string;
+  /** Порог доли wall-времени loop, занятой ботом, для выноса в выделенный шард (0..1) */
+  WORKER_HOT_BOT_CPU_SHARE?: string;
+  /** Период опроса metrics для переноса горячих ботов (мс, по умолчанию 0 — выключено) */
+  WORKER_REBALANCE_INTERVAL_MS?: string;
+  /** Минимальная загрузка loop шарда для переноса горячих ботов (0..1) */
+  WORKER_REBALANCE_LOOP_BUSY?: string;
+  /** Сколько slow_callback за окно отправляют бота в карантин (0 — выключено) */
+  WORKER_QUARANTINE_SLOW_CALLBACKS?: string;
+  /** Окно подсчёта slow_callback для карантина (мс) */
+  WORKER_QUARANTINE_WINDOW_MS?: string;
+}
+
+/**
+ * Парсит значение числа шардов ("auto" или целое).
+ * @param raw - Строка из env
+ * @param cpuCount - Число ядер для режима auto
+ * @returns Число шардов или null, если значение не распознано
+ */
+function parseShardValue(raw: string | undefined, cpuCount: number): number | null {
+  const value = (raw ?? "").trim().toLowerCase();
+  if (!value) return null;
+  if (value === "auto") return Math.max(1, cpuCount);
+  const n = parseInt(value, 10);
+  return Number.isFinite(n) && n > 0 ? n : null;
+}
+
+/**
+ * Парсит per-project переопределения вида "12:4,15:auto".
+ * @param raw - Строка WORKER_SHARDS_PROJECTS
+ * @param cpuCount - Число ядер для режима auto
+ * @returns Карта projectId → число шардов
+ */
+export function parseShardOverrides(raw: string | undefined, cpuCount: number): Map<number, number> {
+  const result = new Map<number, number>();
+  for (const part of (raw ?? "").split(",")) {
+    const [idRaw, countRaw] = part.split(":");
+    const projectId = parseInt((idRaw ?? "").trim(), 10);
+    const count = parseShardValue(countRaw, cpuCount);
+    if (Number.isFinite(projectId) && count !== null) {
+      result.set(projectId, count);
+    }
+  }
+  return result;
+}
+
+/**
+ * Определяет число общих шардов для проекта.
+ * @param projectId - ID проекта
+ * @param env - Переменные окружения
+ * @param cpuCount - Число ядер (для auto)
+ * @returns Число шардов в диапазоне 1..MAX_SHARDS_PER_PROJECT
+ */
+export function resolveShardCount(
+  projectId: number,
+  env: ShardingEnv = process.env,
+  cpuCount: number = cpus().length,
+): number {
+  const override = parseShardOverrides(env.WORKER_SHARDS_PROJECTS, cpuCount).get(projectId);
+  const count = override ?? parseShardValue(env.WORKER_SHARDS, cpuCount) ?? 1;
+  return Math.min(MAX_SHARDS_PER_PROJECT, Math.max(1, count));
+}
+
+/**
+ * Jump consistent hash (Lamping & Veach): ключ → корзина 0..buckets-1.
+ * При росте числа корзин с N до N+1 переезжает ~1/(N+1) ключей.
+ * @param key - Неотрицательный целочисленный ключ
+ * @param buckets - Число корзин (≥ 1)
+ * @returns Номер корзины
+ */
+export function jumpConsistentHash(key: number, buckets: number): number {
+  if (buckets <= 1) return 0;
+  const mask = (1n << 64n) - 1n;
+  let k = BigInt(Math.max(0, Math.trunc(key))) & mask;
+  let b = -1;
+  let j = 0;
+  while (j < buckets) {
+    b = j;
+    k = (k * 2862933555777941757n + 1n) & mask;
+    j = Math.floor(((b + 1) * 2 ** 31) / (Number(k >> 33n) + 1));
+  }
+  return b;
+}
+
+/**
+ * Шард для токена в проекте с shardCount общими шардами.
+ * @param tokenId - ID токена
+ * @param shardCount - Число общих шардов
+ * @returns Индекс шарда
+ */
+export function pickShard(tokenId: number, shardCount: number): number {
+  return jumpConsistentHash(tokenId, shardCount);
+}
+
+/**
+ * Индекс выделенного шарда для «горячего» бота.
+ * @param tokenId - ID токена
+ * @returns Индекс шарда ≥ DEDICATED_SHARD_BASE
+ */
+export function dedicatedShardFor(tokenId: number): number {
+  return DEDICATED_SHARD_BASE + tokenId;
+}
+
+/**
+ * Порог доли wall-времени loop шарда, занятой ботом, для выноса в выделенный шард.
+ * @param env - Переменные окружения
+ * @returns Значение в (0, 1]
+ */
+export function resolveHotBotCpuShare(env: ShardingEnv = process.env): number {
+  const n = parseFloat(env.WORKER_HOT_BOT_CPU_SHARE ?? "");
+  return Number.isFinite(n) && n > 0 && n <= 1 ? n : DEFAULT_HOT_BOT_CPU_SHARE;
+}
+
+/**
+ * Выбирает ботов, которых стоит вынести в выделенный шард.
+ * Бот-одиночка в шарде не переносится — ему и так никто не мешает.
+ * @param cpuShares - Доля wall-времени loop шарда по tokenId (0..1)
+ * @param threshold - Порог доли
+ * @returns Список tokenId по убыванию доли
+ */
+export function selectHotBots(cpuShares: Map<number, number>, threshold: number): number[] {
+  if (cpuShares.size < 2) return [];
+  return [...cpuShares.entries()]
+    .filter(([, share]) => share > threshold)
+    .sort((a, b) => b[1] - a[1])
+    .map(([tokenId]) => tokenId);
+}
+
+/** Строка бота из ответа воркера на команду metrics */
+export interface BotLoopMetrics {
+  /** ID токена */
+  token_id: number;
+  /** Доля wall-времени окна, занятая колбэками бота (0..1) */
+  loop_share: number;
+}
+
+/** Поля ответа воркера на команду metrics, нужные для переноса ботов */
+export interface ShardLoopMetrics {
+  /** Загрузка loop шарда за окно: доля wall-времени (0..1) */
+  loop_busy?: number;
+  /** Строки ботов шарда */
+  bots?: BotLoopMetrics[];
+}
+
+/**
+ * Доли loop по tokenId из ответа metrics — вход для rebalanceHotBots.
+ * @param bots - Поле data.bots ответа воркера
+ * @returns tokenId → доля loop
+ */
+export function loopSharesFromMetrics(bots: BotLoopMetrics[] | undefined): Map<number, number> {
+  const shares = new Map<number, number>();
+  for (const bot of bots ?? []) {
+    if (Number.isFinite(bot.token_id) && Number.isFinite(bot.loop_share)) {
+      shares.set(bot.token_id, bot.loop_share);
+    }
+  }
+  return shares;
+}
+
+/**
+ * Период опроса metrics шардов для rebalanceHotBots.
+ * @param env - Переменные окружения
+ * @returns Интервал в мс (0 — опрос выключен)
+ */
+export function resolveRebalanceIntervalMs(env: ShardingEnv = process.env): number {
+  const n = parseInt(env.WORKER_REBALANCE_INTERVAL_MS ?? "", 10);
+  return Number.isFinite(n) && n >= 0 ? n : DEFAULT_REBALANCE_INTERVAL_MS;
+}
+
+/**
+ * Минимальная загрузка loop шарда для переноса горячих ботов.
+ * @param env - Переменные окружения
+ * @returns Доля wall-времени (0..1)
+ */
+export function resolveRebalanceLoopBusy(env: ShardingEnv = process.env): number {
+  const n = parseFloat(env.WORKER_REBALANCE_LOOP_BUSY ?? "");
+  return Number.isFinite(n) && n >= 0 && n <= 1 ? n : DEFAULT_REBALANCE_LOOP_BUSY;
+}
+
+/**
+ * Нужно ли опрашивать metrics шарда: готов и либо общий с соседями (поиск горячих),
+ * либо выделенный с ботом (проверка, не остыл ли он).
+ * @param shard - Индекс шарда
+ * @param ready - Шард в состоянии ready
+ * @param botCount - Число запущенных ботов шарда
+ * @returns true — шарду отправляется metrics
+ */
+export function shouldPollShardMetrics(shard: number, ready: boolean, botCount: number): boolean {
+  return ready && botCount >= (shard >= DEDICATED_SHARD_BASE ? 1 : 2);
+}
+
+/**
+ * Горячие боты из кадра metrics шарда: только если loop шарда действительно
+ * загружен (выделенные шарды не перебалансируются).
+ * @param shard - Индекс шарда-источника
+ * @param data - Кадр metrics (loop_busy, bots)
+ * @param threshold - Порог доли loop бота
+ * @param minLoopBusy - Минимальная загрузка loop шарда
+ * @returns tokenId для переноса по убыванию доли
+ */
+export function hotBotsFromMetrics(
+  shard: number,
+  data: ShardLoopMetrics | undefined,
+  threshold: number,
+  minLoopBusy: number,
+): number[] {
+  if (shard >= DEDICATED_SHARD_BASE || !((data?.loop_busy ?? 0) >= minLoopBusy)) return [];
+  return selectHotBots(loopSharesFromMetrics(data?.bots), threshold);
+}
+
+/**
+ * Остывшие боты выделенного шарда: доля loop ниже половины порога
+ * (запас против переноса туда-обратно на границе порога).
+ * @param shard - Индекс шарда-источника
+ * @param data - Кадр metrics (bots)
+ * @param threshold - Порог доли loop бота
+ * @returns tokenId для возврата в общий шард
+ */
+export function cooledBotsFromMetrics(
+  shard: number,
+  data: ShardLoopMetrics | undefined,
+  threshold: number,
+): number[] {
+  if (shard < DEDICATED_SHARD_BASE) return [];
+  return [...loopSharesFromMetrics(data?.bots).entries()]
+    .filter(([, share]) => share < threshold / 2)
+    .map(([tokenId]) => tokenId);
+}
+
+/** Правило карантина ботов, блокирующих loop */
+export interface SlowCallbackQuarantine {
+  /** Сколько slow_callback за окно переводят бота в выделенный шард (0 — выключено) */
+  limit: number;
+  /** Окно подсчёта (мс) */
+  windowMs: number;
+}
+
+/**
+ * Правило карантина из env.
+ * WORKER_QUARANTINE_SLOW_CALLBACKS — порог (по умолчанию 0, выключено),
+ * WORKER_QUARANTINE_WINDOW_MS — окно (по умолчанию 60000).
+ * @param env - Переменные окружения
+ * @returns Правило карантина
+ */
+export function resolveSlowCallbackQuarantine(env: ShardingEnv = process.env): SlowCallbackQuarantine {
+  const limit = parseInt(env.WORKER_QUARANTINE_SLOW_CALLBACKS ?? "", 10);
+  const windowMs = parseInt(env.WORKER_QUARANTINE_WINDOW_MS ?? "", 10);
+  return {
+    limit: Number.isFinite(limit) && limit > 0 ? limit : 0,
+    windowMs: Number.isFinite(windowMs) && windowMs > 0 ? windowMs : 60_000,
+  };
+}
+
+/**
+ * Учитывает slow_callback бота и решает, пора ли в карантин.
+ * @param history - Моменты прошлых slow_callback (мутируется: старше окна удаляются)
+ * @param now - Текущее время (мс)
+ * @param rule - Правило карантина
+ * @returns true — порог за окно достигнут
+ */
+export function recordSlowCallback(
+  history: number[],
+  now: number,
+  rule: SlowCallbackQuarantine,
+): boolean {
+  history.push(now);
+  while (history.length && now - history[0] > rule.windowMs) history.shift();
+  return rule.limit > 0 && history.length >= rule.limit;
+}
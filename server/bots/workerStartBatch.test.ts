@@ -0,0 +1,79 @@
+/**
+ * @fileoverview Тесты пакетного старта ботов в воркере
+ * @module server/bots/workerStartBatch.test
+ */
+
+import { describe, it } from 'node:test';
+import assert from 'node:assert';
+import {
+  DEFAULT_START_BATCH_WINDOW_MS,
+  WorkerStartBatcher,
+  buildStartCommand,
+  formatStartupTimeline,
+  resolveStartBatchWindowMs,
+  type WorkerStartCommand,
+} from './workerStartBatch';
+
+function entry(tokenId: number) {
+  return { token: `t${tokenId}`, token_id: tokenId, bot_file: `/bots/${tokenId}/bot.py` };
+}
+
+describe('workerStartBatch', () => {
+  it('окно из env, мусор — значение по умолчанию', () => {
+    assert.strictEqual(resolveStartBatchWindowMs({}), DEFAULT_START_BATCH_WINDOW_MS);
+    assert.strictEqual(resolveStartBatchWindowMs({ WORKER_START_BATCH_MS: '0' }), 0);
+    assert.strictEqual(resolveStartBatchWindowMs({ WORKER_START_BATCH_MS: 'x' }), DEFAULT_START_BATCH_WINDOW_MS);
+  });
+
+  it('один бот — start_bot, несколько — start_bots', () => {
+    assert.deepStrictEqual(buildStartCommand([entry(1)]), { cmd: 'start_bot', ...entry(1) });
+    assert.deepStrictEqual(buildStartCommand([entry(1), entry(2)]), {
+      cmd: 'start_bots',
+      bots: [entry(1), entry(2)],
+    });
+  });
+
+  it('старты одного шарда за окно уходят одной командой', async () => {
+    const sent: Array<[string, WorkerStartCommand]> = [];
+    const batcher = new WorkerStartBatcher(0, (key, command) => {
+      sent.push([key, command]);
+      return true;
+    });
+    const results = await Promise.all([
+      batcher.enqueue('1:0', entry(1)),
+      batcher.enqueue('1:0', entry(2)),
+      batcher.enqueue('1:1', entry(3)),
+    ]);
+    assert.deepStrictEqual(results, [true, true, true]);
+    assert.strictEqual(sent.length, 2);
+    assert.deepStrictEqual(sent[0], ['1:0', { cmd: 'start_bots', bots: [entry(1), entry(2)] }]);
+    assert.deepStrictEqual(sent[1], ['1:1', { cmd: 'start_bot', ...entry(3) }]);
+  });
+
+  it('повтор токена в окне заменяет прежний старт, неудача отправки — false всем', async () => {
+    const sent: WorkerStartCommand[] = [];
+    const batcher = new WorkerStartBatcher(0, (_key, command) => {
+      sent.push(command);
+      return false;
+    });
+    const newer = { ...entry(1), bot_file: '/bots/1/new.py' };
+    const results = await Promise.all([batcher.enqueue('1:0', entry(1)), batcher.enqueue('1:0', newer)]);
+    assert.deepStrictEqual(results, [false, false]);
+    assert.deepStrictEqual(sent, [{ cmd: 'start_bot', ...newer }]);
+  });
+
+  it('строка лога по таймлайну', () => {
+    const line = formatStartupTimeline({
+      status: 'ready',
+      total_ms: 812.4,
+      phases: [
+        { phase: 'import', start_ms: 0, ms: 40.2 },
+        { phase: 'ddl', start_ms: 40.2, ms: 600 },
+        { phase: 'get_updates', start_ms: 640.2, ms: 172.2 },
+      ],
+      slowest: 'ddl',
+      batch: 3,
+    });
+    assert.strictEqual(line, 'ready за 812 мс [пакет 3]: import 40 · ddl 600 · get_updates 172, дольше всего ddl');
+  });
+});
@@ -0,0 +1,148 @@
+/**
+ * @fileoverview Пакетный старт ботов в воркере (start_bots) и таймлайн старта
+ *
+ * Старты, пришедшие в один шард за короткое окно (restore после рестарта сервера),
+ * уходят одной командой start_bots: воркер прогревает код всех ботов разом и пускает
+ * их сетевую инициализацию с ограниченным fan-out. Одиночный старт — прежний start_bot.
+ * @module server/bots/workerStartBatch
+ */
+
+/** Окно сбора стартов в пакет по умолчанию (мс) */
+export const DEFAULT_START_BATCH_WINDOW_MS = 50;
+
+/** Параметры одного бота в start_bot / start_bots */
+export interface WorkerStartEntry {
+  /** Токен бота */
+  token: string;
+  /** ID токена */
+  token_id: number;
+  /** Путь к файлу бота */
+  bot_file: string;
+  /** Публичный базовый URL webhook */
+  webhook_url?: string;
+  /** Порт собственного aiohttp бота */
+  webhook_port?: number;
+  /** Секрет X-Telegram-Bot-Api-Secret-Token */
+  webhook_secret?: string;
+}
+
+/** Команда старта: одиночная или пакетная */
+export type WorkerStartCommand =
+  | ({ cmd: "start_bot" } & WorkerStartEntry)
+  | { cmd: "start_bots"; bots: WorkerStartEntry[] };
+
+/** Этап таймлайна старта из кадра type=startup */
+export interface StartupPhase {
+  /** Имя этапа: import, exec, queue, redis, db, ddl, caches, commands, get_updates, webhook, standby */
+  phase: string;
+  /** Смещение начала этапа от команды (мс) */
+  start_ms: number;
+  /** Длительность этапа (мс) */
+  ms: number;
+}
+
+/** Таймлайн старта бота (data кадра type=startup) */
+export interface StartupTimeline {
+  /** ready | standby | error | stopped | timeout | replaced */
+  status: string;
+  /** От команды до финальной отметки или выхода (мс) */
+  total_ms: number;
+  /** Этапы по порядку */
+  phases: StartupPhase[];
+  /** Самый долгий этап */
+  slowest: string | null;
+  /** Номер пакета start_bots в воркере */
+  batch?: number;
+}
+
+/**
+ * Окно сбора стартов из WORKER_START_BATCH_MS (0 — без пакетов).
+ * @param env - Переменные окружения
+ */
+export function resolveStartBatchWindowMs(
+  env: { WORKER_START_BATCH_MS?: string } = process.env,
+): number {
+  const n = parseInt(env.WORKER_START_BATCH_MS ?? "", 10);
+  return Number.isFinite(n) && n >= 0 ? n : DEFAULT_START_BATCH_WINDOW_MS;
+}
+
+/**
+ * Команда для набора стартов: один бот — start_bot, несколько — start_bots.
+ * @param entries - Старты одного шарда
+ */
+export function buildStartCommand(entries: WorkerStartEntry[]): WorkerStartCommand {
+  if (entries.length === 1) {
+    return { cmd: "start_bot", ...entries[0] };
+  }
+  return { cmd: "start_bots", bots: entries };
+}
+
+/**
+ * Строка лога по таймлайну старта: этапы и самый долгий.
+ * @param timeline - data кадра startup
+ */
+export function formatStartupTimeline(timeline: StartupTimeline): string {
+  const phases = timeline.phases.map((p) => `${p.phase} ${Math.round(p.ms)}`).join(" · ");
+  const slowest = timeline.slowest ? `, дольше всего ${timeline.slowest}` : "";
+  const batch = timeline.batch !== undefined ? ` [пакет ${timeline.batch}]` : "";
+  return `${timeline.status} за ${Math.round(timeline.total_ms)} мс${batch}: ${phases || "—"}${slowest}`;
+}
+
+/** Открытый пакет шарда */
+interface PendingBatch {
+  entries: WorkerStartEntry[];
+  waiters: Array<(sent: boolean) => void>;
+}
+
+/**
+ * Собирает старты по ключу шарда за окно windowMs и отправляет их одной командой.
+ * Повторный старт того же token_id в окне заменяет предыдущий.
+ */
+export class WorkerStartBatcher {
+  private pending = new Map<string, PendingBatch>();
+
+  /**
+   * @param windowMs - Окно сбора (мс); 0 — отправка на следующем тике
+   * @param send - Отправка команды в шард; false — не отправлено
+   */
+  constructor(
+    private readonly windowMs: number,
+    private readonly send: (key: string, command: WorkerStartCommand) => boolean,
+  ) {}
+
+  /**
+   * Ставит старт в пакет шарда.
+   * @param key - Ключ шарда
+   * @param entry - Параметры бота
+   * @returns true — команда записана в stdin воркера
+   */
+  enqueue(key: string, entry: WorkerStartEntry): Promise<boolean> {
+    return new Promise((resolve) => {
+      let batch = this.pending.get(key);
+      if (!batch) {
+        batch = { entries: [], waiters: [] };
+        this.pending.set(key, batch);
+        setTimeout(() => this.flush(key), this.windowMs);
+      }
+      batch.entries = batch.entries.filter((e) => e.token_id !== entry.token_id);
+      batch.entries.push(entry);
+      batch.waiters.push(resolve);
+    });
+  }
+
+  /**
+   * Отправляет накопленный пакет шарда.
+   * @param key - Ключ шарда
+   */
+  private flush(key: string): void {
+    const batch = this.pending.get(key);
+    if (!batch) return;
+    this.pending.delete(key);
+    let sent = false;
+    try {
+      sent = this.send(key, buildStartCommand(batch.entries));
+    } finally {
+      for (const resolve of batch.waiters) resolve(sent);
+    }
+  }
+}
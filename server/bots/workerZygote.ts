@@ -0,0 +1,334 @@
+/**
+ * @fileoverview Клиент Python zygote — быстрый запуск воркеров через fork()
+ *
+ * Zygote (`server/python/zygote.py`) один раз импортирует aiogram/asyncpg/redis/…,
+ * а по команде fork отдаёт готовый worker.py за десятки миллисекунд. Воркер общается
+ * с Node через unix-сокет, который здесь оборачивается в интерфейс, совместимый
+ * с ChildProcess (stdin/stdout/stderr/pid/kill/exit), чтобы botWorkerManager
+ * не различал способы запуска.
+ * @module server/bots/workerZygote
+ */
+
+import { spawn, ChildProcess } from "node:child_process";
+import { EventEmitter } from "node:events";
+import { createServer, Server, Socket } from "node:net";
+import { tmpdir } from "node:os";
+import { join } from "node:path";
+import { unlink } from "node:fs";
+import { PassThrough, Readable, Writable } from "node:stream";
+
+/** Таймаут подключения форкнутого воркера к сокету (мс) */
+const ZYGOTE_FORK_TIMEOUT_MS = 10_000;
+
+/** Соединений от каждого ребёнка: stdin, stdout, stderr */
+const ZYGOTE_CHILD_STREAMS = 3;
+
+/** Минимальный интерфейс процесса воркера, общий для spawn и zygote */
+export interface WorkerProcess {
+  /** PID процесса (у zygote-воркера появляется после fork) */
+  readonly pid?: number;
+  /** Канал команд */
+  readonly stdin: Writable | null;
+  /** Канал JSON-ответов */
+  readonly stdout: Readable | null;
+  /** Канал системных ошибок */
+  readonly stderr: Readable | null;
+  /** Посылает сигнал процессу */
+  kill(signal?: NodeJS.Signals | number): boolean;
+  /** exit(code, signal) / error(err) */
+  on(event: "exit", listener: (code: number | null, signal: NodeJS.Signals | null) => void): this;
+  on(event: "error", listener: (err: Error) => void): this;
+}
+
+/** Сообщение zygote (stdout JSON) */
+interface ZygoteMessage {
+  /** zygote_ready | forked | fork_error | exited | import_times */
+  type: string;
+  /** Путь сокета, к которому относится fork */
+  socket?: string;
+  /** PID ребёнка */
+  pid?: number;
+  /** Код выхода ребёнка */
+  code?: number | null;
+  /** Номер сигнала, убившего ребёнка */
+  signal?: number | null;
+  /** Время импорта по модулям (мс, null — не установлен) */
+  imports?: Record<string, number | null>;
+  /** Суммарное время предзагрузки (мс) */
+  total_ms?: number;
+  /** Текст ошибки */
+  error?: string;
+}
+
+/**
+ * Воркер, порождённый zygote: stdin/stdout/stderr — три соединения к unix-сокету.
+ * Потоки создаются сразу, соединения подключаются позже — запись до подключения буферизуется.
+ */
+class ZygoteWorkerHandle extends EventEmitter implements WorkerProcess {
+  /** PID после fork */
+  pid?: number;
+  readonly stdin = new PassThrough();
+  readonly stdout = new PassThrough();
+  readonly stderr = new PassThrough();
+  /** Подключённые соединения (i — stdin, o — stdout, e — stderr) */
+  readonly attached = new Set<string>();
+  private exited = false;
+
+  /**
+   * Подключает соединение воркера к потоку по его роли.
+   * @param role - Первый байт соединения: i | o | e
+   * @param socket - Принятое соединение от ребёнка
+   * @param rest - Данные, пришедшие вместе с байтом роли
+   * @returns false — неизвестная или повторная роль
+   */
+  attach(role: string, socket: Socket, rest: Buffer): boolean {
+    if (this.attached.has(role)) return false;
+    socket.on("error", () => undefined);
+    if (role === "i") {
+      this.stdin.pipe(socket);
+    } else if (role === "o" || role === "e") {
+      const target = role === "o" ? this.stdout : this.stderr;
+      if (rest.length) target.write(rest);
+      socket.pipe(target, { end: false });
+    } else {
+      return false;
+    }
+    this.attached.add(role);
+    return true;
+  }
+
+  /**
+   * Отмечает завершение процесса (однократно).
+   * @param code - Код выхода
+   * @param signal - Сигнал
+   */
+  markExited(code: number | null, signal: NodeJS.Signals | null): void {
+    if (this.exited) return;
+    this.exited = true;
+    this.stdout.end();
+    this.stderr.end();
+    this.emit("exit", code, signal);
+  }
+
+  /**
+   * Сообщает об ошибке запуска.
+   * @param err - Ошибка
+   */
+  fail(err: Error): void {
+    if (this.exited) return;
+    this.exited = true;
+    this.emit("error", err);
+  }
+
+  kill(signal: NodeJS.Signals | number = "SIGTERM"): boolean {
+    if (!this.pid || this.exited) return false;
+    try {
+      process.kill(this.pid, signal);
+      return true;
+    } catch {
+      return false;
+    }
+  }
+}
+
+/** Ожидающий подключения fork */
+interface PendingFork {
+  /** Хендл воркера */
+  handle: ZygoteWorkerHandle;
+  /** Сервер сокета */
+  server: Server;
+  /** Таймер подключения */
+  timer: ReturnType<typeof setTimeout>;
+}
+
+/**
+ * Долгоживущий zygote-процесс и учёт порождённых им воркеров.
+ */
+export class WorkerZygote {
+  private proc: ChildProcess | null = null;
+  private ready: Promise<void> | null = null;
+  private pending = new Map<string, PendingFork>();
+  private byPid = new Map<number, ZygoteWorkerHandle>();
+  private seq = 0;
+  /** Последний замер импорта (мс по модулям) */
+  importTimes: Record<string, number | null> = {};
+
+  /**
+   * @param pythonPath - Python интерпретатор
+   * @param zygoteScript - Путь к zygote.py
+   */
+  constructor(
+    private readonly pythonPath: string,
+    private readonly zygoteScript: string,
+  ) {}
+
+  /** Поддерживается ли zygote на этой платформе */
+  static isSupported(): boolean {
+    return process.platform !== "win32";
+  }
+
+  /** Запускает zygote (если ещё не запущен) и ждёт предзагрузки модулей */
+  private ensureStarted(): Promise<void> {
+    if (this.ready) return this.ready;
+
+    this.ready = new Promise<void>((resolve, reject) => {
+      const proc = spawn(this.pythonPath, ["-u", this.zygoteScript], {
+        stdio: ["pipe", "pipe", "pipe"],
+        env: process.env,
+      });
+      this.proc = proc;
+      let buffer = "";
+
+      proc.stdout?.on("data", (chunk: Buffer) => {
+        buffer += chunk.toString("utf-8");
+        const lines = buffer.split("\n");
+        buffer = lines.pop() || "";
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          let msg: ZygoteMessage;
+          try {
+            msg = JSON.parse(line);
+          } catch {
+            continue;
+          }
+          if (msg.type === "zygote_ready") {
+            this.importTimes = msg.imports ?? {};
+            console.log(
+              `🧬 [Zygote] готов за ${msg.total_ms} мс, импорт: ${JSON.stringify(this.importTimes)}`,
+            );
+            resolve();
+          } else if (msg.type === "zygote_unsupported") {
+            reject(new Error(msg.error || "zygote не поддерживается"));
+          } else {
+            this.handleMessage(msg);
+          }
+        }
+      });
+
+      proc.stderr?.on("data", (chunk: Buffer) => {
+        const content = chunk.toString("utf-8").trim();
+        if (content) console.error(`🧬 [Zygote] stderr: ${content.substring(0, 300)}`);
+      });
+
+      proc.on("exit", (code) => {
+        console.warn(`🧬 [Zygote] завершился: code=${code}`);
+        this.proc = null;
+        this.ready = null;
+        for (const [path, p] of this.pending) {
+          clearTimeout(p.timer);
+          p.server.close();
+          p.handle.fail(new Error("zygote завершился до fork"));
+          this.pending.delete(path);
+        }
+        reject(new Error(`zygote завершился с кодом ${code}`));
+      });
+
+      proc.on("error", (err) => {
+        this.proc = null;
+        this.ready = null;
+        reject(err);
+      });
+    });
+    return this.ready;
+  }
+
+  /**
+   * Обрабатывает forked / fork_error / exited.
+   * @param msg - Сообщение zygote
+   */
+  private handleMessage(msg: ZygoteMessage): void {
+    if (msg.type === "forked" && msg.socket && msg.pid) {
+      const p = this.pending.get(msg.socket);
+      if (p) {
+        p.handle.pid = msg.pid;
+        this.byPid.set(msg.pid, p.handle);
+      }
+      return;
+    }
+    if (msg.type === "fork_error" && msg.socket) {
+      const p = this.pending.get(msg.socket);
+      if (p) {
+        this.finishPending(msg.socket);
+        p.handle.fail(new Error(msg.error || "fork не удался"));
+      }
+      return;
+    }
+    if (msg.type === "exited" && msg.pid) {
+      const handle = this.byPid.get(msg.pid);
+      this.byPid.delete(msg.pid);
+      const signal = msg.signal ? (`SIG${msg.signal}` as NodeJS.Signals) : null;
+      handle?.markExited(msg.code ?? null, signal);
+    }
+  }
+
+  /**
+   * Закрывает сокет-сервер ожидающего fork.
+   * @param path - Путь сокета
+   */
+  private finishPending(path: string): void {
+    const p = this.pending.get(path);
+    if (!p) return;
+    clearTimeout(p.timer);
+    p.server.close();
+    this.pending.delete(path);
+    unlink(path, () => undefined);
+  }
+
+  /**
+   * Форкает готовый воркер с указанным env.
+   * Хендл возвращается сразу: команды, записанные до подключения, уйдут после него.
+   * @param env - Переменные окружения воркера (PROJECT_ID, WORKER_SHARD, …)
+   * @returns Процесс воркера
+   */
+  fork(env: Record<string, string>): WorkerProcess {
+    const handle = new ZygoteWorkerHandle();
+    const path = join(tmpdir(), `tbb-worker-${process.pid}-${++this.seq}.sock`);
+    const server = createServer((socket) => {
+      socket.once("data", (chunk: Buffer) => {
+        const role = String.fromCharCode(chunk[0]);
+        if (!handle.attach(role, socket, chunk.subarray(1))) {
+          socket.destroy();
+          return;
+        }
+        if (role === "o") {
+          // Страховка: если zygote не прислал exited (умер сам), закрытие stdout = выход
+          socket.on("close", () => setTimeout(() => handle.markExited(null, null), 1_000));
+        }
+        if (handle.attached.size === ZYGOTE_CHILD_STREAMS) this.finishPending(path);
+      });
+    });
+    const timer = setTimeout(() => {
+      this.finishPending(path);
+      handle.fail(new Error(`zygote-воркер не подключился за ${ZYGOTE_FORK_TIMEOUT_MS} мс`));
+    }, ZYGOTE_FORK_TIMEOUT_MS);
+    this.pending.set(path, { handle, server, timer });
+
+    server.on("error", (err) => {
+      this.finishPending(path);
+      handle.fail(err);
+    });
+    server.listen(path, () => {
+      this.ensureStarted()
+        .then(() => {
+          this.proc?.stdin?.write(JSON.stringify({ cmd: "fork", socket: path, env }) + "\n", "utf-8");
+        })
+        .catch((err: Error) => {
+          this.finishPending(path);
+          handle.fail(err);
+        });
+    });
+    return handle;
+  }
+
+  /** Предзапуск zygote (импорт модулей до первого проекта) */
+  warmUp(): Promise<void> {
+    return this.ensureStarted();
+  }
+
+  /** Гасит zygote (воркеры-дети живут, пока открыт их сокет) */
+  stop(): void {
+    this.proc?.stdin?.end();
+    this.proc = null;
+    this.ready = null;
+  }
+}
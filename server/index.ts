@@ -243,6 +243,13 @@ app.use((req, res, next) => {
           );
         }
 
+        // Zygote (WORKER_ZYGOTE=true) импортирует модули ботов до первого воркера
+        if (process.env.USE_WORKER_POOL !== 'false') {
+          await workerManager.warmUp().catch((err: unknown) => {
+            log(`Zygote не запустился, воркеры стартуют обычным spawn: ${err instanceof Error ? err.message : String(err)}`);
+          });
+        }
+
         const restoreResult = await restoreRunningBots();
         const closed = await reconcileOrphanLaunchHistories(async (tokenId) => {
           const token = await storage.getBotToken(tokenId);
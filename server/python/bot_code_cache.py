@@ -1,89 +1,321 @@
 """
-Кэш разобранного кода бота рядом с файлом (.botcode/*.bin).
-Ускоряет повторный запуск, когда исходный .py не менялся.
+Кэш разобранного кода бота и его локальных модулей (config, utils, …).
+
+Ключ — хэш содержимого (blake2b), поэтому побайтно одинаковый код разных ботов
+проекта компилируется один раз: в памяти воркера и в общем каталоге .botcode рядом
+с папками ботов (BOT_CODE_CACHE_DIR). Для файла, чей (size, mtime) уже известен,
+хэш берётся из индекса (.botcode/<stem>.<size>.<mtime>.ref) — исходник не читается.
+
+Блоб общего каталога удаляется, когда заменённый .ref был последней ссылкой на него.
+Один раз на воркер общий каталог подметается: блобы другой версии Python, блобы без
+.ref старше BOT_CODE_CACHE_GRACE_S (1 ч) и не использованные дольше
+BOT_CODE_CACHE_MAX_AGE_DAYS (30 дней).
 """
 
 from __future__ import annotations
 
+import hashlib
 import importlib.util
 import marshal
 import os
+import threading
 import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Callable
+from types import CodeType
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
 
 LogFn = Callable[[str], None]
 
+# Сколько разных версий кода держать в памяти воркера
+_MEMORY_ENTRIES = 64
+
+_lock = threading.Lock()
+# (path, size, mtime_ns) → хэш содержимого
+_stat_index: Dict[Tuple[str, int, int], str] = {}
+# хэш → code (co_filename первого загрузившего)
+_code_by_hash: "OrderedDict[str, CodeType]" = OrderedDict()
+# хэш → lock компиляции: одинаковый код, пришедший в нескольких потоках сразу
+# (start_bots), компилирует один поток, остальные берут готовое
+_compile_locks: Dict[str, threading.Lock] = {}
+_stats: Dict[str, float] = {
+    "hits_memory": 0,
+    "hits_disk": 0,
+    "misses": 0,
+    "source_reads_skipped": 0,
+    "compile_ms": 0.0,
+    "blobs_removed": 0,
+}
+# Общие каталоги, уже подметённые этим воркером
+_swept_dirs: Set[Path] = set()
+
 
 def _cache_enabled() -> bool:
     return os.environ.get("BOT_CODE_CACHE", "true").lower() != "false"
 
 
-def _cache_file_path(bot_path: Path) -> Path:
-    stat = bot_path.stat()
+def _shared_dir(path: Path) -> Path:
+    """Общий каталог кэша: BOT_CODE_CACHE_DIR или bots/.botcode."""
+    custom = os.environ.get("BOT_CODE_CACHE_DIR")
+    if custom:
+        return Path(custom)
+    return path.parent.parent / ".botcode"
+
+
+def _blob_path(path: Path, digest: str) -> Path:
     magic = importlib.util.MAGIC_NUMBER.hex()
-    return (
-        bot_path.parent
-        / ".botcode"
-        / f"{bot_path.stem}.{magic}.{stat.st_size}.{int(stat.st_mtime_ns)}.bin"
-    )
+    return _shared_dir(path) / f"{digest}.{magic}.bin"
+
+
+def _ref_path(path: Path, size: int, mtime_ns: int) -> Path:
+    return path.parent / ".botcode" / f"{path.stem}.{size}.{mtime_ns}.ref"
+
+
+def _grace_s() -> float:
+    return float(os.environ.get("BOT_CODE_CACHE_GRACE_S", "3600"))
+
+
+def _max_age_s() -> float:
+    return float(os.environ.get("BOT_CODE_CACHE_MAX_AGE_DAYS", "30")) * 86400
+
+
+def _referenced_digests(shared: Path) -> Optional[Set[str]]:
+    """
+    Хэши из всех .ref ботов (bots/*/.botcode/*.ref); None — общий каталог задан
+    через BOT_CODE_CACHE_DIR и ссылки на него могут лежать где угодно.
+    """
+    if os.environ.get("BOT_CODE_CACHE_DIR"):
+        return None
+    digests: Set[str] = set()
+    for ref in shared.parent.glob("*/.botcode/*.ref"):
+        try:
+            digests.add(ref.read_text(encoding="ascii").strip())
+        except OSError:
+            pass
+    return digests
+
+
+def _release_blobs(path: Path, digests: Iterable[str]) -> None:
+    """Удаляет блобы заменённых версий, если на них больше не ссылается ни один .ref."""
+    digests = set(digests)
+    if not digests:
+        return
+    referenced = _referenced_digests(_shared_dir(path))
+    if referenced is None:
+        return
+    for digest in digests - referenced:
+        try:
+            _blob_path(path, digest).unlink()
+            _bump("blobs_removed")
+        except OSError:
+            pass
 
 
-def _purge_stale_cache(cache_dir: Path, stem: str, keep: Path) -> None:
-    prefix = f"{stem}."
-    for old in cache_dir.glob(f"{prefix}*"):
+def _purge_stale(cache_dir: Path, stem: str, keep: Path) -> Set[str]:
+    """
+    Удаляет старые .ref/.bin этого файла (включая формат до хэш-кэша).
+    @returns хэши из удалённых .ref — их блобы могли остаться без ссылок
+    """
+    released: Set[str] = set()
+    for old in cache_dir.glob(f"{stem}.*"):
         if old != keep:
             try:
+                if old.suffix == ".ref":
+                    released.add(old.read_text(encoding="ascii").strip())
                 old.unlink()
             except OSError:
                 pass
+    return released
+
+
+def _sweep_shared(shared: Path) -> None:
+    """Подметает общий каталог (один раз на воркер): чужой magic, блобы без .ref, давно не использованные."""
+    with _lock:
+        if shared in _swept_dirs:
+            return
+        _swept_dirs.add(shared)
+    magic = importlib.util.MAGIC_NUMBER.hex()
+    referenced = _referenced_digests(shared)
+    now = time.time()
+    grace, max_age = _grace_s(), _max_age_s()
+    try:
+        entries = list(shared.iterdir())
+    except OSError:
+        return
+    for entry in entries:
+        name = entry.name
+        if not name.endswith((".bin", ".tmp")):
+            continue
+        try:
+            age = now - entry.stat().st_mtime
+        except OSError:
+            continue
+        parts = name.split(".")
+        if name.endswith(".tmp"):
+            stale = age > grace
+        elif len(parts) != 3 or parts[1] != magic:
+            stale = True
+        else:
+            stale = age > max_age or (referenced is not None and parts[0] not in referenced and age > grace)
+        if stale:
+            try:
+                entry.unlink()
+                _bump("blobs_removed")
+            except OSError:
+                pass
+
+
+def _retarget(code: CodeType, filename: str) -> CodeType:
+    """Копия code с co_filename бота (трейсбеки и атрибуция по файлу)."""
+    if code.co_filename == filename:
+        return code
+    consts = tuple(
+        _retarget(c, filename) if isinstance(c, CodeType) else c for c in code.co_consts
+    )
+    return code.replace(co_filename=filename, co_consts=consts)
+
+
+def _remember(digest: str, code: CodeType) -> None:
+    with _lock:
+        _code_by_hash[digest] = code
+        _code_by_hash.move_to_end(digest)
+        while len(_code_by_hash) > _MEMORY_ENTRIES:
+            _code_by_hash.popitem(last=False)
+
+
+def _bump(key: str, value: float = 1) -> None:
+    with _lock:
+        _stats[key] += value
+
+
+def _from_cache(path: Path, digest: str) -> Optional[Tuple[CodeType, str]]:
+    """code по хэшу из памяти или с диска; None — промах."""
+    with _lock:
+        code = _code_by_hash.get(digest)
+        if code is not None:
+            _code_by_hash.move_to_end(digest)
+    if code is not None:
+        return _retarget(code, str(path)), "память"
+    blob = _blob_path(path, digest)
+    if blob.is_file():
+        try:
+            with open(blob, "rb") as fh:
+                code = marshal.load(fh)
+        except Exception:
+            try:
+                blob.unlink(missing_ok=True)
+            except OSError:
+                pass
+            return None
+        _remember(digest, code)
+        try:
+            # Время использования для подметания давно не нужных блобов
+            os.utime(blob)
+        except OSError:
+            pass
+        return _retarget(code, str(path)), "диск"
+    return None
 
 
-def load_bot_code(bot_path: Path, log: LogFn) -> Any:
+def load_code(path: Path, log: LogFn) -> CodeType:
     """
-    Возвращает объект code (результат compile) для exec().
-    При наличии актуального .bin читает его через marshal.
+    Возвращает объект code файла для exec().
+    Порядок: индекс stat → хэш → память/диск; иначе чтение, хэш, compile.
     """
-    t0 = time.perf_counter()
-    source_code = bot_path.read_text(encoding="utf-8")
-    read_ms = (time.perf_counter() - t0) * 1000
-    log(f"Код прочитан: {len(source_code)} символов за {read_ms:.0f} мс")
-
     if not _cache_enabled():
-        t1 = time.perf_counter()
-        compiled = compile(source_code, str(bot_path), "exec")
-        compile_ms = (time.perf_counter() - t1) * 1000
+        t0 = time.perf_counter()
+        source_code = path.read_text(encoding="utf-8")
+        compiled = compile(source_code, str(path), "exec")
+        compile_ms = (time.perf_counter() - t0) * 1000
+        _bump("misses")
+        _bump("compile_ms", compile_ms)
         log(f"Разбор кода: {compile_ms:.0f} мс (заново)")
         return compiled
 
-    cache_file = _cache_file_path(bot_path)
-    if cache_file.is_file():
+    _sweep_shared(_shared_dir(path))
+    stat = path.stat()
+    stat_key = (str(path), stat.st_size, stat.st_mtime_ns)
+    ref = _ref_path(path, stat.st_size, stat.st_mtime_ns)
+
+    # 1) (size, mtime) уже видели — хэш без чтения исходника
+    with _lock:
+        digest = _stat_index.get(stat_key)
+    if digest is None and ref.is_file():
         try:
+            digest = ref.read_text(encoding="ascii").strip() or None
+        except OSError:
+            digest = None
+    if digest is not None:
+        t0 = time.perf_counter()
+        hit = _from_cache(path, digest)
+        if hit is not None:
+            code, where = hit
+            _bump("hits_memory" if where == "память" else "hits_disk")
+            _bump("source_reads_skipped")
+            with _lock:
+                _stat_index[stat_key] = digest
+            load_ms = (time.perf_counter() - t0) * 1000
+            log(f"Разбор кода: {load_ms:.0f} мс (из готового, {where}, без чтения исходника)")
+            return code
+
+    # 2) Читаем исходник: побайтно одинаковый код другого бота тоже попадёт в кэш
+    t0 = time.perf_counter()
+    source = path.read_bytes()
+    read_ms = (time.perf_counter() - t0) * 1000
+    log(f"Код прочитан: {len(source)} байт за {read_ms:.0f} мс")
+    digest = hashlib.blake2b(source, digest_size=16).hexdigest()
+
+    with _lock:
+        compile_lock = _compile_locks.setdefault(digest, threading.Lock())
+    with compile_lock:
+        hit = _from_cache(path, digest)
+        if hit is not None:
+            code, where = hit
+            _bump("hits_memory" if where == "память" else "hits_disk")
+            log(f"Разбор кода: 0 мс (из готового, {where}, тот же код)")
+        else:
             t1 = time.perf_counter()
-            with open(cache_file, "rb") as fh:
-                compiled = marshal.load(fh)
+            code = compile(source, str(path), "exec")
             compile_ms = (time.perf_counter() - t1) * 1000
-            log(f"Разбор кода: {compile_ms:.0f} мс (из готового)")
-            return compiled
-        except Exception:
+            _bump("misses")
+            _bump("compile_ms", compile_ms)
+            log(f"Разбор кода: {compile_ms:.0f} мс (заново)")
+            _remember(digest, code)
             try:
-                cache_file.unlink(missing_ok=True)
-            except OSError:
+                blob = _blob_path(path, digest)
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                tmp = blob.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                with open(tmp, "wb") as fh:
+                    marshal.dump(code, fh)
+                os.replace(tmp, blob)
+            except Exception:
                 pass
+    with _lock:
+        if _compile_locks.get(digest) is compile_lock and not compile_lock.locked():
+            del _compile_locks[digest]
 
-    t1 = time.perf_counter()
-    compiled = compile(source_code, str(bot_path), "exec")
-    compile_ms = (time.perf_counter() - t1) * 1000
-    log(f"Разбор кода: {compile_ms:.0f} мс (заново)")
-
+    with _lock:
+        _stat_index[stat_key] = digest
     try:
-        cache_file.parent.mkdir(parents=True, exist_ok=True)
-        tmp = cache_file.with_suffix(".tmp")
-        with open(tmp, "wb") as fh:
-            marshal.dump(compiled, fh)
-        os.replace(tmp, cache_file)
-        _purge_stale_cache(cache_file.parent, bot_path.stem, cache_file)
+        ref.parent.mkdir(parents=True, exist_ok=True)
+        ref.write_text(digest, encoding="ascii")
+        released = _purge_stale(ref.parent, path.stem, ref)
+        released.discard(digest)
+        _release_blobs(path, released)
     except Exception:
         pass
+    return code
+
+
+def load_bot_code(bot_path: Path, log: LogFn) -> CodeType:
+    """Объект code главного файла бота (bot.py) для exec()."""
+    return load_code(bot_path, log)
+
 
-    return compiled
+def cache_stats() -> Dict[str, float]:
+    """Счётчики кэша для команды status."""
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_entries"] = len(_code_by_hash)
+    stats["compile_ms"] = round(stats["compile_ms"], 1)
+    return stats
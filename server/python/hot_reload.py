@@ -0,0 +1,67 @@
+"""
+Горячая перезагрузка кода бота (команда reload_bot).
+
+main() первой версии бота продолжает polling/webhook со своим Dispatcher (корневым).
+UpdateRouter подменяет у него feed_update: апдейты уходят в dp актуальной версии кода,
+переключение — одно присваивание в потоке loop (атомарно для апдейтов). Апдейты,
+начатые на прежней версии, считаются по поколениям — reload ждёт, пока они доработают.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+FeedUpdate = Callable[..., Awaitable[Any]]
+
+
+class UpdateRouter:
+    """Маршрутизация апдейтов корневого Dispatcher в текущую версию кода."""
+
+    def __init__(self, root_dp: Any):
+        self.root_dp = root_dp
+        self.generation = 0
+        self._feed: FeedUpdate = root_dp.feed_update
+        self._inflight: Dict[int, int] = {}
+        self._idle: Dict[int, asyncio.Event] = {}
+        # Атрибут экземпляра перекрывает метод: и polling, и webhook зовут self.feed_update
+        root_dp.feed_update = self._route
+
+    async def _route(self, bot: Any, update: Any, **kwargs: Any) -> Any:
+        gen = self.generation
+        feed = self._feed
+        self._inflight[gen] = self._inflight.get(gen, 0) + 1
+        try:
+            return await feed(bot, update, **kwargs)
+        finally:
+            left = self._inflight[gen] - 1
+            self._inflight[gen] = left
+            if left == 0:
+                idle = self._idle.pop(gen, None)
+                if idle is not None:
+                    idle.set()
+                if gen != self.generation:
+                    del self._inflight[gen]
+
+    def switch(self, dp: Any) -> int:
+        """Новые апдейты → dp. Возвращает прежнее поколение (для drain)."""
+        previous = self.generation
+        self._feed = dp.feed_update
+        self.generation += 1
+        if not self._inflight.get(previous):
+            self._inflight.pop(previous, None)
+        return previous
+
+    def inflight(self, generation: int) -> int:
+        return self._inflight.get(generation, 0)
+
+    async def drain(self, generation: int, timeout: float) -> bool:
+        """Ждёт завершения апдейтов поколения. False — не успели за timeout."""
+        if not self._inflight.get(generation):
+            return True
+        idle = self._idle.setdefault(generation, asyncio.Event())
+        try:
+            await asyncio.wait_for(idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
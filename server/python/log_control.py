@@ -0,0 +1,192 @@
+"""
+Уровни логов ботов воркера: по token_id и по логгеру, с выборкой частых сообщений.
+
+Root-логгер воркера один на все боты, поэтому basicConfig(level=LOG_LEVEL) бота в
+воркере ничего не меняет. Вместо этого правила задаются командой set_log_level:
+
+  {"cmd": "set_log_level", "token_id": 42, "level": "DEBUG"}
+  {"cmd": "set_log_level", "token_id": 42, "logger": "aiogram.event", "level": "WARNING"}
+  {"cmd": "set_log_level", "token_id": 42, "sample": 20}      (DEBUG/INFO: 1 из 20 с места вызова)
+  {"cmd": "set_log_level", "level": "WARNING"}                (все боты воркера, token_id 0)
+  {"cmd": "set_log_level", "token_id": 42, "level": null}      (сброс правил бота)
+
+Уровень записи бота ищется так: логгер бота (самый длинный префикс имени) → уровень
+бота → логгер воркера → уровень воркера (WORKER_LOG_LEVEL, по умолчанию DEBUG).
+Проверка идёт до format(): отброшенная запись не форматируется. Root-логгер получает
+минимальный из заданных уровней, так что logging.debug(...) при уровне WARNING у всех
+ботов отсекается ещё до создания LogRecord.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from typing import Any, Dict, Optional, Tuple
+
+# Выборка не трогает WARNING и выше — ошибки не теряются
+_SAMPLE_MAX_LEVEL = logging.INFO
+
+
+class _Rule:
+    """Правила одного token_id (0 — все боты воркера)."""
+
+    __slots__ = ("level", "loggers", "sample")
+
+    def __init__(self) -> None:
+        self.level: Optional[int] = None
+        # имя логгера → уровень (действует на логгер и его потомков)
+        self.loggers: Dict[str, int] = {}
+        self.sample = 1
+
+    def empty(self) -> bool:
+        return self.level is None and not self.loggers and self.sample <= 1
+
+    def level_for(self, name: str) -> Optional[int]:
+        if self.loggers:
+            best = -1
+            found = None
+            for prefix, level in self.loggers.items():
+                if len(prefix) > best and (name == prefix or name.startswith(prefix + ".")):
+                    best = len(prefix)
+                    found = level
+            if found is not None:
+                return found
+        return self.level
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        if self.level is not None:
+            out["level"] = logging.getLevelName(self.level)
+        if self.loggers:
+            out["loggers"] = {k: logging.getLevelName(v) for k, v in self.loggers.items()}
+        if self.sample > 1:
+            out["sample"] = self.sample
+        return out
+
+
+_rules: Dict[int, _Rule] = {}
+# (token_id, имя логгера) → уровень; сбрасывается при любой смене правил
+_resolved: Dict[Tuple[int, str], int] = {}
+# (token_id, файл, строка) → число записей с этого места вызова
+_sample_counts: Dict[Tuple[int, str, int], int] = {}
+_default_level = logging.DEBUG
+
+
+def parse_level(value: Any) -> int:
+    """'warning' / 'WARNING' / 30 → 30; неизвестное имя — ValueError."""
+    if isinstance(value, bool):
+        raise ValueError(f"неизвестный уровень лога: {value!r}")
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(str(value).strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"неизвестный уровень лога: {value!r}")
+    return level
+
+
+def configure() -> None:
+    """Уровень по умолчанию из WORKER_LOG_LEVEL (читается при старте воркера, не при импорте)."""
+    global _default_level
+    _default_level = parse_level(os.environ.get("WORKER_LOG_LEVEL", "DEBUG"))
+    _changed()
+
+
+def set_level(
+    token_id: int,
+    level: Any = None,
+    logger: Optional[str] = None,
+    sample: Optional[int] = None,
+) -> None:
+    """
+    Правило для token_id (0 — все боты воркера). level=None с logger — снять правило
+    логгера; level=None без logger и без sample — сбросить все правила token_id.
+    """
+    if sample is not None and (not isinstance(sample, int) or isinstance(sample, bool) or sample < 1):
+        raise ValueError(f"sample должен быть целым >= 1: {sample!r}")
+    rule = _rules.get(token_id) or _Rule()
+    if logger:
+        if level is None:
+            rule.loggers.pop(logger, None)
+        else:
+            rule.loggers[logger] = parse_level(level)
+    elif level is not None:
+        rule.level = parse_level(level)
+    elif sample is None:
+        rule = _Rule()
+    if sample is not None:
+        rule.sample = sample
+    if rule.empty():
+        _rules.pop(token_id, None)
+    else:
+        _rules[token_id] = rule
+    _changed()
+
+
+def _changed() -> None:
+    _resolved.clear()
+    _sample_counts.clear()
+    # Уровень всех ботов (token_id 0) заменяет WORKER_LOG_LEVEL
+    worker_rule = _rules.get(0)
+    levels = [worker_rule.level if worker_rule and worker_rule.level is not None else _default_level]
+    for tid, rule in _rules.items():
+        if rule.level is not None and tid != 0:
+            levels.append(rule.level)
+        levels.extend(rule.loggers.values())
+    root = logging.getLogger()
+    if root.level != min(levels):
+        root.setLevel(min(levels))
+
+
+def _level(token_id: int, name: str) -> int:
+    key = (token_id, name)
+    level = _resolved.get(key)
+    if level is None:
+        rule = _rules.get(token_id)
+        level = rule.level_for(name) if rule is not None else None
+        if level is None:
+            default = _rules.get(0)
+            level = default.level_for(name) if default is not None else None
+        if level is None:
+            level = _default_level
+        _resolved[key] = level
+    return level
+
+
+def check(token_id: int, record: logging.LogRecord) -> Optional[str]:
+    """
+    Решение до форматирования: None — запись отброшена, иначе суффикс к строке
+    ('' или пометка выборки).
+    """
+    if record.levelno < _level(token_id, record.name):
+        return None
+    if record.levelno > _SAMPLE_MAX_LEVEL or (not _rules):
+        return ""
+    sample = 1
+    for rule in (_rules.get(token_id), _rules.get(0)):
+        if rule is not None and rule.sample > 1:
+            sample = rule.sample
+            break
+    if sample <= 1:
+        return ""
+    key = (token_id, record.pathname, record.lineno)
+    n = _sample_counts.get(key, 0) + 1
+    _sample_counts[key] = n
+    if n % sample != 1:
+        return None
+    return "" if n == 1 else f" [выборка 1/{sample}, всего {n}]"
+
+
+def forget(token_id: int) -> None:
+    """Бот вышел: счётчики выборки и кэш уровней бота (правила остаются до сброса)."""
+    for key in [k for k in _resolved if k[0] == token_id]:
+        del _resolved[key]
+    for key in [k for k in _sample_counts if k[0] == token_id]:
+        del _sample_counts[key]
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "default": logging.getLevelName(_default_level),
+        "root": logging.getLevelName(logging.getLogger().level),
+        "rules": {str(tid): rule.to_dict() for tid, rule in _rules.items()},
+    }
@@ -0,0 +1,165 @@
+"""
+Лимит строк лога на бота: token bucket по token_id.
+
+Бот в цикле (loop-узел до _HARD_LIMIT итераций, и каждая пишет в лог) забивал pipe
+stdout воркера и канал Redis bot:logs:*, а соседи по воркеру ждали. Теперь у каждого
+token_id своё ведро: rate строк в секунду, запас burst. Лишние строки отбрасываются
+до форматирования; первая отброшенная даёт строку «лимит превышен», дальше раз в
+WORKER_LOG_SUMMARY_S — «пропущено N строк».
+
+Лимиты по умолчанию — WORKER_LOG_RATE / WORKER_LOG_BURST (rate 0 — без лимита), без
+рестарта — команда set_log_limit:
+
+  {"cmd": "set_log_limit", "token_id": 42, "rate": 20, "burst": 100}
+  {"cmd": "set_log_limit", "rate": 500}                 (все боты воркера, token_id 0)
+  {"cmd": "set_log_limit", "token_id": 42, "rate": null} (сброс лимита бота)
+
+Те же лимиты видит _RedisLogHandler бота: воркер кладёт limits_for в namespace как WORKER_LOG_LIMITS.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_RATE = 100.0
+DEFAULT_BURST = 500.0
+DEFAULT_SUMMARY_S = 5.0
+
+
+class _Bucket:
+    """Ведро одного бота и счётчики отброшенного."""
+
+    __slots__ = ("tokens", "stamp", "dropped", "dropped_since", "limited")
+
+    def __init__(self, burst: float):
+        self.tokens = burst
+        self.stamp = time.monotonic()
+        # Отброшено с прошлой сводки и с какого момента
+        self.dropped = 0
+        self.dropped_since = 0.0
+        # Лимит срабатывал и сводка о восстановлении ещё не выдана
+        self.limited = False
+
+
+_default: Tuple[float, float] = (DEFAULT_RATE, DEFAULT_BURST)
+# token_id → (rate, burst); 0 — все боты воркера
+_overrides: Dict[int, Tuple[float, float]] = {}
+_buckets: Dict[int, _Bucket] = {}
+# token_id → всего отброшено за жизнь бота в воркере
+_dropped_total: Dict[int, int] = {}
+summary_interval_s = DEFAULT_SUMMARY_S
+
+# Колбэк строки-сводки: (token_id, текст) — воркер пишет её в лог бота мимо лимита
+on_summary: Optional[Callable[[int, str], None]] = None
+
+
+def _number(value: Any, name: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"{name} должен быть числом >= 0: {value!r}")
+    return float(value)
+
+
+def configure() -> None:
+    """Лимиты из WORKER_LOG_RATE / WORKER_LOG_BURST / WORKER_LOG_SUMMARY_S (при старте воркера)."""
+    global _default, summary_interval_s
+    rate = float(os.environ.get("WORKER_LOG_RATE", DEFAULT_RATE))
+    burst = float(os.environ.get("WORKER_LOG_BURST", DEFAULT_BURST))
+    _default = (max(0.0, rate), max(1.0, burst))
+    summary_interval_s = max(1.0, float(os.environ.get("WORKER_LOG_SUMMARY_S", DEFAULT_SUMMARY_S)))
+
+
+def set_limit(token_id: int, rate: Any = None, burst: Any = None) -> None:
+    """Лимит для token_id (0 — все боты); rate=None — сброс к лимиту воркера/по умолчанию."""
+    global _default
+    if rate is None:
+        _overrides.pop(token_id, None)
+        if token_id == 0:
+            configure()
+    else:
+        rate_v = _number(rate, "rate")
+        burst_v = _number(burst, "burst") if burst is not None else max(rate_v, 1.0)
+        if token_id == 0:
+            _default = (rate_v, max(1.0, burst_v))
+        else:
+            _overrides[token_id] = (rate_v, max(1.0, burst_v))
+    # Новые лимиты — с полным ведром
+    if token_id == 0:
+        _buckets.clear()
+    else:
+        _buckets.pop(token_id, None)
+
+
+def limits_for(token_id: int) -> Tuple[float, float]:
+    """(rate, burst) бота; rate 0 — без лимита."""
+    return _overrides.get(token_id, _default)
+
+
+def allow(token_id: int) -> bool:
+    """Забирает одну строку из ведра бота; False — строку надо отбросить."""
+    rate, burst = _overrides.get(token_id, _default)
+    if rate <= 0:
+        return True
+    bucket = _buckets.get(token_id)
+    if bucket is None:
+        bucket = _buckets[token_id] = _Bucket(burst)
+    now = time.monotonic()
+    bucket.tokens = min(burst, bucket.tokens + (now - bucket.stamp) * rate)
+    bucket.stamp = now
+    if bucket.tokens >= 1.0:
+        bucket.tokens -= 1.0
+        return True
+    if bucket.dropped == 0:
+        bucket.dropped_since = now
+        if not bucket.limited:
+            bucket.limited = True
+            _notify(
+                token_id,
+                f"⚠️ Лимит логов: больше {rate:g} строк/с (запас {burst:g}) — лишние строки "
+                f"пропускаются, сводка раз в {summary_interval_s:g} с",
+            )
+    bucket.dropped += 1
+    _dropped_total[token_id] = _dropped_total.get(token_id, 0) + 1
+    return False
+
+
+def flush() -> None:
+    """Сводки по ботам, у которых с прошлого раза что-то отброшено (зовёт воркер по таймеру)."""
+    now = time.monotonic()
+    for token_id, bucket in list(_buckets.items()):
+        if bucket.dropped:
+            dropped, bucket.dropped = bucket.dropped, 0
+            _notify(
+                token_id,
+                f"⚠️ Лимит логов: пропущено {dropped} строк за {now - bucket.dropped_since:.0f} с",
+            )
+        elif bucket.limited:
+            bucket.limited = False
+        elif bucket.tokens + (now - bucket.stamp) * limits_for(token_id)[0] >= limits_for(token_id)[1]:
+            # Ведро полное и тихо — не держим
+            del _buckets[token_id]
+
+
+def _notify(token_id: int, text: str) -> None:
+    if on_summary is not None:
+        try:
+            on_summary(token_id, text)
+        except Exception:
+            pass
+
+
+def forget(token_id: int) -> None:
+    """Бот вышел: последняя сводка и ведро (лимит бота остаётся до сброса)."""
+    _dropped_total.pop(token_id, None)
+    bucket = _buckets.pop(token_id, None)
+    if bucket is not None and bucket.dropped:
+        _notify(token_id, f"⚠️ Лимит логов: пропущено {bucket.dropped} строк")
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "default": {"rate": _default[0], "burst": _default[1]},
+        "overrides": {str(tid): {"rate": r, "burst": b} for tid, (r, b) in _overrides.items()},
+        "dropped": {str(tid): n for tid, n in _dropped_total.items()},
+    }
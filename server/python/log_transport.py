@@ -0,0 +1,216 @@
+"""
+Транспорт stdout воркера: построчный (legacy) или батчевый.
+
+Батчевый режим (WORKER_LOG_TRANSPORT=batch):
+  - строки копятся в кольцевом буфере (WORKER_LOG_BUFFER строк);
+  - раз в тик loop (WORKER_LOG_FLUSH_MS=0) или раз в N мс буфер уходит одним
+    ndjson-кадром (строки через \\n) — один write+flush вместо одного на строку;
+  - запись в pipe идёт в отдельном потоке: если Node не успевает читать и pipe
+    полон, loop не блокируется, буфер растёт, при переполнении старые строки
+    логов вытесняются и считаются в dropped по token_id (system/status не теряются).
+Формат строк не меняется — Node парсит их так же, как в построчном режиме.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import heapq
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Deque, Dict, Optional, Tuple
+
+_ts_cache: Tuple[int, str] = (-1, "")
+
+
+def log_timestamp() -> str:
+    """HH:MM:SS для префикса логов; strftime не чаще раза в секунду."""
+    global _ts_cache
+    sec = int(time.time())
+    if _ts_cache[0] != sec:
+        _ts_cache = (sec, datetime.now().strftime("%H:%M:%S"))
+    return _ts_cache[1]
+
+
+def _write_now(text: str) -> None:
+    try:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    except Exception:
+        pass
+
+
+class LineTransport:
+    """Legacy: одна строка = один write+flush."""
+
+    mode = "line"
+
+    def write_log(self, token_id: int, line: str) -> None:
+        _write_now(line + "\n")
+
+    def write_frame(self, line: str) -> None:
+        _write_now(line + "\n")
+
+    def stats(self) -> Dict[str, object]:
+        return {"mode": self.mode}
+
+    def dropped_for(self, token_id: int) -> int:
+        return 0
+
+    def close(self) -> None:
+        pass
+
+
+class BatchTransport:
+    """Кольцевой буфер + сброс раз в тик/интервал + поток-писатель."""
+
+    mode = "batch"
+
+    def __init__(self, capacity: int, flush_ms: int):
+        self._capacity = max(100, capacity)
+        self._flush_s = max(0, flush_ms) / 1000
+        # (seq, token_id, line): логи ботов отдельно от system/status (token_id=0) —
+        # вытеснение старейшей строки лога — popleft за O(1); порядок восстанавливается по seq
+        self._logs: Deque[Tuple[int, int, str]] = collections.deque()
+        self._system: Deque[Tuple[int, int, str]] = collections.deque()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pipe: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=1)
+        self._writer = threading.Thread(target=self._writer_main, name="worker-log-writer", daemon=True)
+        self._writer.start()
+        self.dropped: Dict[int, int] = {}
+        self.frames = 0
+        self.lines = 0
+        self.backpressure_hits = 0
+
+    # ── приём ──────────────────────────────────────────────────────────────
+
+    def write_log(self, token_id: int, line: str) -> None:
+        self._push(token_id, line)
+
+    def write_frame(self, line: str) -> None:
+        self._push(0, line)
+
+    def _push(self, token_id: int, line: str) -> None:
+        with self._lock:
+            self._seq += 1
+            if token_id:
+                if len(self._logs) + len(self._system) >= self._capacity and self._logs:
+                    self._evict_one()
+                self._logs.append((self._seq, token_id, line))
+            else:
+                self._system.append((self._seq, token_id, line))
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._schedule()
+
+    def _evict_one(self) -> None:
+        """Выкидывает самую старую строку лога (не system)."""
+        _seq, tid, _line = self._logs.popleft()
+        self.dropped[tid] = self.dropped.get(tid, 0) + 1
+
+    # ── сброс ──────────────────────────────────────────────────────────────
+
+    def _schedule(self, delay: Optional[float] = None) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None:
+            self._loop = running
+            wait = self._flush_s if delay is None else delay
+            if wait > 0:
+                running.call_later(wait, self._flush)
+            else:
+                running.call_soon(self._flush)
+            return
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            # Вызов из чужого потока (executor): будим loop владельца
+            loop.call_soon_threadsafe(self._flush)
+            return
+        # Loop ещё/уже не запущен — пишем синхронно
+        self._flush(block=True)
+
+    def _flush(self, block: bool = False) -> None:
+        with self._lock:
+            if not self._logs and not self._system:
+                self._scheduled = False
+                return
+            if not block and self._pipe.full():
+                # Писатель ещё пишет прошлый кадр (pipe полон) — ждём, копим
+                self.backpressure_hits += 1
+                retry = True
+            else:
+                retry = False
+                if not self._system:
+                    items = list(self._logs)
+                elif not self._logs:
+                    items = list(self._system)
+                else:
+                    items = list(heapq.merge(self._logs, self._system))
+                self._logs.clear()
+                self._system.clear()
+                self._scheduled = False
+        if retry:
+            self._schedule(max(self._flush_s, 0.005))
+            return
+        chunk = "\n".join(line for _seq, _tid, line in items) + "\n"
+        self.frames += 1
+        self.lines += len(items)
+        if block:
+            self._pipe.join()
+            _write_now(chunk)
+        else:
+            self._pipe.put_nowait(chunk)
+
+    def _writer_main(self) -> None:
+        while True:
+            chunk = self._pipe.get()
+            try:
+                if chunk is None:
+                    return
+                _write_now(chunk)
+            finally:
+                self._pipe.task_done()
+
+    # ── статистика ─────────────────────────────────────────────────────────
+
+    def dropped_for(self, token_id: int) -> int:
+        return self.dropped.get(token_id, 0)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            buffered = len(self._logs) + len(self._system)
+        return {
+            "mode": self.mode,
+            "buffered": buffered,
+            "frames": self.frames,
+            "lines": self.lines,
+            "backpressure_hits": self.backpressure_hits,
+            "dropped_total": sum(self.dropped.values()),
+        }
+
+    def close(self) -> None:
+        """Синхронно дописывает буфер и останавливает поток-писатель."""
+        self._flush(block=True)
+        self._pipe.put(None)
+        self._writer.join(timeout=5.0)
+
+
+def create_transport() -> "LineTransport | BatchTransport":
+    """Транспорт по env WORKER_LOG_TRANSPORT (line|batch)."""
+    mode = os.environ.get("WORKER_LOG_TRANSPORT", "line").strip().lower()
+    if mode == "batch":
+        return BatchTransport(
+            capacity=int(os.environ.get("WORKER_LOG_BUFFER", "10000")),
+            flush_ms=int(os.environ.get("WORKER_LOG_FLUSH_MS", "0")),
+        )
+    return LineTransport()
@@ -0,0 +1,259 @@
+"""
+Кэши проекта, общие для ботов воркера.
+
+Боты одного проекта держали каждый свою копию одних и тех же данных и перечитывали
+их из БД по своему таймеру: Bot Tables (_bot_tables_cache), контент _content
+(_content_cache), file_id медиа (_media_file_id_cache). Воркер кладёт в namespace бота
+WORKER_PROJECT_CACHE; сгенерированный код вместо своей загрузки зовёт
+`await WORKER_PROJECT_CACHE.get(name, loader, ttl=..., table_derived=...)`:
+
+- набор грузится один раз на воркер (single-flight: остальные боты ждут ту же загрузку),
+  loader — функция первого запросившего бота (его пул БД, его логи);
+- значение одно на всех; dict при перезагрузке обновляется на месте, поэтому ссылка,
+  взятая ботом раньше (get_content читает _content_cache синхронно), видит новые данные;
+- наборы из bot_tables (table_derived) сбрасываются и перечитываются один раз по
+  сообщению Redis bot:table_updated:{PROJECT_ID} — подписка одна на воркер, не на бота;
+- набор живёт, пока им пользуется хотя бы один бот воркера.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import worker_isolation as iso
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # воркер без Redis-зависимостей
+    redis_asyncio = None  # type: ignore[assignment]
+
+Loader = Callable[[], Awaitable[Any]]
+
+_MISSING = object()
+# Пауза перед переподпиской на bot:table_updated после ошибки Redis
+_WATCH_RETRY_S = 5.0
+
+
+class _Dataset:
+    """Один набор данных проекта: значение, загрузчик и счётчики."""
+
+    __slots__ = (
+        "name", "value", "loaded_at", "task", "loader", "loader_owner", "context",
+        "ttl", "table_derived", "users", "loads", "hits", "errors", "load_ms",
+    )
+
+    def __init__(self, name: str):
+        self.name = name
+        self.value: Any = _MISSING
+        self.loaded_at = 0.0
+        self.task: Optional[asyncio.Task] = None
+        self.loader: Optional[Loader] = None
+        self.loader_owner = 0
+        self.context: Optional[contextvars.Context] = None
+        self.ttl: Optional[float] = None
+        self.table_derived = False
+        self.users: Set[int] = set()
+        self.loads = 0
+        self.hits = 0
+        self.errors = 0
+        self.load_ms = 0.0
+
+    def fresh(self) -> bool:
+        if self.value is _MISSING:
+            return False
+        return self.ttl is None or time.monotonic() - self.loaded_at < self.ttl
+
+
+class ProjectCache:
+    """Наборы данных проекта, общие для всех ботов воркера."""
+
+    def __init__(self, project_id: int):
+        self.project_id = project_id
+        self._datasets: Dict[str, _Dataset] = {}
+        self._watcher: Optional[asyncio.Task] = None
+        self.invalidations = 0
+
+    async def get(
+        self,
+        name: str,
+        loader: Loader,
+        *,
+        ttl: Optional[float] = None,
+        table_derived: bool = False,
+    ) -> Any:
+        """
+        Значение набора name; при отсутствии или старше ttl секунд — loader().
+        Ошибка загрузки пробрасывается всем ждущим, прежнее значение остаётся.
+        """
+        token_id = iso.current_token_id.get()
+        ds = self._datasets.get(name)
+        if ds is None:
+            ds = _Dataset(name)
+            self._datasets[name] = ds
+        ds.users.add(token_id)
+        ds.loader = loader
+        ds.loader_owner = token_id
+        ds.context = contextvars.copy_context()
+        ds.ttl = ttl
+        if table_derived and not ds.table_derived:
+            ds.table_derived = True
+            self._ensure_watcher()
+        if ds.task is None and ds.fresh():
+            ds.hits += 1
+            return ds.value
+        if ds.task is None:
+            self._start_load(ds)
+        # shield: отмена одного бота не отменяет загрузку, которую ждут соседи
+        return await asyncio.shield(ds.task)  # type: ignore[arg-type]
+
+    def _start_load(self, ds: _Dataset) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        ds.task = loop.create_task(self._load(ds, ds.loader), context=ds.context)  # type: ignore[arg-type]
+        # Ошибку получают ждущие get(); если все они отменены — не шумим в лог loop
+        ds.task.add_done_callback(_retrieve_exception)
+        return ds.task
+
+    async def _load(self, ds: _Dataset, loader: Loader) -> Any:
+        t0 = time.perf_counter()
+        try:
+            new = await loader()
+        except Exception:
+            ds.errors += 1
+            raise
+        finally:
+            ds.task = None
+            ds.load_ms = (time.perf_counter() - t0) * 1000
+        if isinstance(ds.value, dict) and isinstance(new, dict) and ds.value is not new:
+            # На месте: ссылки, уже взятые ботами, видят новые данные
+            ds.value.clear()
+            ds.value.update(new)
+        else:
+            ds.value = new
+        ds.loaded_at = time.monotonic()
+        ds.loads += 1
+        return ds.value
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Сбрасывает набор (или все): следующий get() перечитает его."""
+        for ds in self._datasets.values():
+            if name is None or ds.name == name:
+                ds.loaded_at = float("-inf")
+
+    def _on_tables_updated(self) -> None:
+        """bot:table_updated: наборы из bot_tables перечитываются один раз на воркер."""
+        self.invalidations += 1
+        for ds in self._datasets.values():
+            if not ds.table_derived:
+                continue
+            ds.loaded_at = float("-inf")
+            if ds.task is None and ds.loader is not None and ds.value is not _MISSING:
+                task = self._start_load(ds)
+                task.add_done_callback(_log_reload_error)
+
+    def _ensure_watcher(self) -> None:
+        url = os.environ.get("REDIS_URL")
+        if self._watcher is not None or not url or redis_asyncio is None or not self.project_id:
+            return
+        # Контекст воркера: клиент — собственный (не фасад бота), логи — на token 0
+        self._watcher = asyncio.get_running_loop().create_task(
+            self._watch(url), context=contextvars.Context()
+        )
+
+    async def _watch(self, url: str) -> None:
+        channel = f"bot:table_updated:{self.project_id}"
+        while True:
+            client = None
+            try:
+                client = redis_asyncio.from_url(url)
+                pubsub = client.pubsub()
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._on_tables_updated()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Кэш проекта: подписка {channel} прервана: {e}")
+            finally:
+                if client is not None:
+                    try:
+                        await client.aclose()
+                    except Exception:
+                        pass
+            await asyncio.sleep(_WATCH_RETRY_S)
+
+    def forget(self, token_id: int) -> None:
+        """Бот вышел: набор без пользователей удаляется, загрузчик бота не удерживается."""
+        for name in list(self._datasets):
+            ds = self._datasets[name]
+            ds.users.discard(token_id)
+            if not ds.users:
+                del self._datasets[name]
+            elif ds.loader_owner == token_id:
+                ds.loader = None
+                ds.context = None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        datasets = []
+        for ds in self._datasets.values():
+            loaded = ds.value is not _MISSING
+            datasets.append({
+                "name": ds.name,
+                "bots": len(ds.users),
+                "items": len(ds.value) if loaded and hasattr(ds.value, "__len__") else None,
+                "loads": ds.loads,
+                "hits": ds.hits,
+                "errors": ds.errors,
+                "load_ms": round(ds.load_ms, 1),
+                "age_s": round(now - ds.loaded_at, 1) if loaded and ds.loaded_at > 0 else None,
+            })
+        return {"datasets": datasets, "invalidations": self.invalidations}
+
+    async def close(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+def _log_reload_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logging.warning(f"Кэш проекта: перезагрузка не удалась: {task.exception()}")
+
+
+_cache: Optional[ProjectCache] = None
+
+
+def get_cache() -> Optional[ProjectCache]:
+    """Кэш проекта воркера; None — выключен (WORKER_SHARED_CACHE=false), бот грузит сам."""
+    global _cache
+    if os.environ.get("WORKER_SHARED_CACHE", "true").lower() == "false":
+        return None
+    if _cache is None:
+        _cache = ProjectCache(int(os.environ.get("PROJECT_ID", "0")))
+    return _cache
+
+
+def forget(token_id: int) -> None:
+    if _cache is not None:
+        _cache.forget(token_id)
+
+
+def stats() -> Optional[Dict[str, Any]]:
+    return _cache.stats() if _cache is not None else None
+
+
+async def close_all() -> None:
+    if _cache is not None:
+        await _cache.close()
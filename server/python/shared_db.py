@@ -0,0 +1,327 @@
+"""
+Общий asyncpg-пул воркера: один пул на DSN вместо пула на каждого бота.
+
+install() подменяет asyncpg.create_pool: вызов из кода бота (current_token_id != 0)
+возвращает лёгкий фасад поверх общего пула. Фасад совместим с тем, как пулом
+пользуются шаблоны: `async with db_pool.acquire() as conn`, `await db_pool.acquire()`
++ `release()`, `db_pool.fetch/fetchrow/fetchval/execute`, `close()` (no-op).
+
+На каждого бота — квота одновременных соединений (WORKER_DB_BOT_QUOTA, но не больше
+его max_size) и счётчики: захваты, запросы, время запросов и ожидания соединения.
+Пулы с init/setup/connection_class (поведение соединения отличается) не делятся.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import worker_isolation as iso
+
+try:
+    import asyncpg
+except ImportError:  # воркер без БД-зависимостей
+    asyncpg = None  # type: ignore[assignment]
+
+# Параметры, при которых соединения пула нельзя делить между ботами
+_PRIVATE_KWARGS = frozenset({"init", "setup", "reset", "connection_class", "record_class", "loop"})
+# Размер пула — решает воркер, а не бот
+_SIZE_KWARGS = frozenset({"min_size", "max_size", "max_queries", "max_inactive_connection_lifetime"})
+
+_orig_create_pool = asyncpg.create_pool if asyncpg is not None else None
+_installed = False
+
+# ключ (dsn + kwargs) → общий пул
+_pools: Dict[str, Any] = {}
+_pool_labels: Dict[str, str] = {}
+_pool_locks: Dict[str, asyncio.Lock] = {}
+# (token_id, ключ пула) → семафор квоты (общий для всех фасадов бота на этот DSN)
+_quotas: Dict[Tuple[int, str], asyncio.Semaphore] = {}
+# token_id → счётчики
+_stats: Dict[int, Dict[str, float]] = {}
+
+
+def enabled() -> bool:
+    return asyncpg is not None and os.environ.get("WORKER_SHARED_DB_POOL", "true").lower() != "false"
+
+
+def _bot_stats(token_id: int) -> Dict[str, float]:
+    stats = _stats.get(token_id)
+    if stats is None:
+        stats = {
+            "acquires": 0, "in_use": 0, "wait_ms": 0.0, "wait_max_ms": 0.0,
+            "queries": 0, "query_ms": 0.0, "errors": 0,
+        }
+        _stats[token_id] = stats
+    return stats
+
+
+def _label(dsn: str) -> str:
+    """host:port/db без логина и пароля — для status."""
+    try:
+        parts = urlsplit(dsn)
+        return f"{parts.hostname or ''}:{parts.port or 5432}{parts.path or ''}"
+    except ValueError:
+        return "postgres"
+
+
+async def _shared_pool(dsn: str, key: str, kwargs: Dict[str, Any]) -> Any:
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+    lock = _pool_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = await _orig_create_pool(
+                dsn,
+                min_size=int(os.environ.get("WORKER_DB_POOL_MIN", "1")),
+                max_size=int(os.environ.get("WORKER_DB_POOL_MAX", "20")),
+                **kwargs,
+            )
+            _pools[key] = pool
+            _pool_labels[key] = _label(dsn)
+    return pool
+
+
+class _ConnProxy:
+    """Соединение бота: запросы считаются в его статистику, остальное — как есть."""
+
+    __slots__ = ("_conn", "_stats")
+
+    def __init__(self, conn: Any, stats: Dict[str, float]):
+        self._conn = conn
+        self._stats = stats
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+    async def _timed(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        t0 = time.perf_counter()
+        self._stats["queries"] += 1
+        try:
+            return await getattr(self._conn, method)(*args, **kwargs)
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        finally:
+            self._stats["query_ms"] += (time.perf_counter() - t0) * 1000
+
+    async def fetch(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._timed("fetch", *args, **kwargs)
+
+    async def fetchrow(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._timed("fetchrow", *args, **kwargs)
+
+    async def fetchval(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._timed("fetchval", *args, **kwargs)
+
+    async def execute(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._timed("execute", *args, **kwargs)
+
+    async def executemany(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._timed("executemany", *args, **kwargs)
+
+
+class _Acquire:
+    """Результат facade.acquire(): и `async with`, и `await`."""
+
+    __slots__ = ("_facade", "_timeout", "_conn")
+
+    def __init__(self, facade: "BotPoolFacade", timeout: Optional[float]):
+        self._facade = facade
+        self._timeout = timeout
+        self._conn: Optional[_ConnProxy] = None
+
+    def __await__(self):
+        return self._facade._acquire(self._timeout).__await__()
+
+    async def __aenter__(self) -> _ConnProxy:
+        self._conn = await self._facade._acquire(self._timeout)
+        return self._conn
+
+    async def __aexit__(self, *exc: Any) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            await self._facade.release(conn)
+
+
+class BotPoolFacade:
+    """Пул бота поверх общего пула воркера (квота + метрики)."""
+
+    def __init__(self, pool: Any, token_id: int, quota: asyncio.Semaphore):
+        self._pool = pool
+        self._token_id = token_id
+        self._quota = quota
+        self._stats = _bot_stats(token_id)
+        self._closed = False
+
+    async def _acquire(self, timeout: Optional[float]) -> _ConnProxy:
+        t0 = time.perf_counter()
+        await self._quota.acquire()
+        try:
+            conn = await self._pool.acquire(timeout=timeout)
+        except BaseException:
+            self._quota.release()
+            raise
+        wait_ms = (time.perf_counter() - t0) * 1000
+        stats = self._stats
+        stats["acquires"] += 1
+        stats["in_use"] += 1
+        stats["wait_ms"] += wait_ms
+        if wait_ms > stats["wait_max_ms"]:
+            stats["wait_max_ms"] = wait_ms
+        return _ConnProxy(conn, stats)
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _Acquire:
+        return _Acquire(self, timeout)
+
+    async def release(self, conn: Any, *, timeout: Optional[float] = None) -> None:
+        raw = conn._conn if isinstance(conn, _ConnProxy) else conn
+        try:
+            await self._pool.release(raw, timeout=timeout)
+        finally:
+            self._stats["in_use"] -= 1
+            self._quota.release()
+
+    async def _run(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        timeout = kwargs.get("timeout")
+        async with self.acquire(timeout=timeout) as conn:
+            return await getattr(conn, method)(*args, **kwargs)
+
+    async def fetch(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._run("fetch", *args, **kwargs)
+
+    async def fetchrow(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._run("fetchrow", *args, **kwargs)
+
+    async def fetchval(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._run("fetchval", *args, **kwargs)
+
+    async def execute(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._run("execute", *args, **kwargs)
+
+    async def executemany(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._run("executemany", *args, **kwargs)
+
+    async def close(self) -> None:
+        """Общий пул живёт, пока жив воркер: закрываем только фасад."""
+        self._closed = True
+
+    def terminate(self) -> None:
+        self._closed = True
+
+    def is_closing(self) -> bool:
+        return self._closed
+
+    def get_size(self) -> int:
+        return self._pool.get_size()
+
+    def get_max_size(self) -> int:
+        return self._pool.get_max_size()
+
+    def get_idle_size(self) -> int:
+        return self._pool.get_idle_size()
+
+
+class _FacadeFactory:
+    """Замена результата asyncpg.create_pool(): `await` и `async with`."""
+
+    __slots__ = ("_dsn", "_kwargs", "_token_id", "_facade")
+
+    def __init__(self, dsn: str, kwargs: Dict[str, Any], token_id: int):
+        self._dsn = dsn
+        self._kwargs = kwargs
+        self._token_id = token_id
+        self._facade: Optional[BotPoolFacade] = None
+
+    async def _make(self) -> BotPoolFacade:
+        shared_kwargs = {k: v for k, v in self._kwargs.items() if k not in _SIZE_KWARGS}
+        key = self._dsn + "|" + repr(sorted(shared_kwargs.items()))
+        pool = await _shared_pool(self._dsn, key, shared_kwargs)
+        quota_key = (self._token_id, key)
+        quota = _quotas.get(quota_key)
+        if quota is None:
+            limit = int(os.environ.get("WORKER_DB_BOT_QUOTA", "5"))
+            requested = self._kwargs.get("max_size")
+            if isinstance(requested, int) and requested > 0:
+                limit = min(limit, requested)
+            quota = asyncio.Semaphore(max(1, limit))
+            _quotas[quota_key] = quota
+        self._facade = BotPoolFacade(pool, self._token_id, quota)
+        return self._facade
+
+    def __await__(self):
+        return self._make().__await__()
+
+    async def __aenter__(self) -> BotPoolFacade:
+        return await self._make()
+
+    async def __aexit__(self, *exc: Any) -> None:
+        if self._facade is not None:
+            await self._facade.close()
+
+
+def _create_pool(dsn: Optional[str] = None, **kwargs: Any) -> Any:
+    """asyncpg.create_pool в воркере: код бота получает фасад общего пула."""
+    token_id = iso.current_token_id.get()
+    if token_id == 0 or not dsn or _PRIVATE_KWARGS.intersection(kwargs):
+        return _orig_create_pool(dsn, **kwargs)
+    return _FacadeFactory(dsn, kwargs, token_id)
+
+
+def install() -> None:
+    """Подменяет asyncpg.create_pool (один раз на процесс воркера)."""
+    global _installed
+    if _installed or not enabled():
+        return
+    _installed = True
+    asyncpg.create_pool = _create_pool  # type: ignore[assignment]
+    if hasattr(asyncpg, "pool"):
+        asyncpg.pool.create_pool = _create_pool  # type: ignore[attr-defined]
+
+
+def forget(token_id: int) -> None:
+    """Квоты и счётчики бота после его выхода (соединения уже возвращены)."""
+    for key in [k for k in _quotas if k[0] == token_id]:
+        del _quotas[key]
+    _stats.pop(token_id, None)
+
+
+def bot_stats(token_id: int) -> Optional[Dict[str, float]]:
+    """Счётчики БД бота для status/metrics (None — бот пулом не пользовался)."""
+    stats = _stats.get(token_id)
+    if stats is None:
+        return None
+    out = dict(stats)
+    out["wait_ms"] = round(out["wait_ms"], 1)
+    out["wait_max_ms"] = round(out["wait_max_ms"], 1)
+    out["query_ms"] = round(out["query_ms"], 1)
+    return out
+
+
+def pools_stats() -> list:
+    """Общие пулы воркера: адрес, размер, свободные соединения."""
+    out = []
+    for key, pool in _pools.items():
+        out.append({
+            "target": _pool_labels.get(key, "postgres"),
+            "size": pool.get_size(),
+            "idle": pool.get_idle_size(),
+            "max": pool.get_max_size(),
+        })
+    return out
+
+
+async def close_all() -> None:
+    """Закрывает общие пулы при остановке воркера."""
+    pools = list(_pools.values())
+    _pools.clear()
+    for pool in pools:
+        try:
+            await asyncio.wait_for(pool.close(), timeout=10.0)
+        except Exception:
+            pool.terminate()
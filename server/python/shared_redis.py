@@ -0,0 +1,405 @@
+"""
+Общий Redis воркера: один пул соединений и одно pub/sub-соединение на URL.
+
+install() подменяет redis.asyncio.from_url: вызов из кода бота (current_token_id != 0)
+возвращает фасад над общим клиентом. Команды (get/set/expire/…) идут через общий
+ConnectionPool, publish() копятся в пределах тика loop и уходят одним pipeline,
+pubsub() отдаёт виртуальную подписку: на канал подписывается одно общее соединение,
+входящие сообщения раскладываются подписчикам по каналу (шаблону).
+
+Фасад не закрывает общий клиент (close/aclose — no-op): RedisStorage.close() бота
+не рвёт соединения соседей. Закрытие — close_all() при выходе воркера.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import worker_isolation as iso
+
+try:
+    import redis.asyncio as redis_asyncio
+    import redis.asyncio.utils as redis_utils
+except ImportError:  # воркер без Redis-зависимостей
+    redis_asyncio = None  # type: ignore[assignment]
+    redis_utils = None  # type: ignore[assignment]
+
+_orig_from_url = redis_asyncio.from_url if redis_asyncio is not None else None
+_installed = False
+
+# ключ (url + kwargs) → общий клиент / хаб pub/sub
+_clients: Dict[str, Any] = {}
+_hubs: Dict[str, "_PubSubHub"] = {}
+_batchers: Dict[str, "_PublishBatcher"] = {}
+# token_id → виртуальные подписки бота (снимаются при выходе бота)
+_bot_pubsubs: Dict[int, Set["VirtualPubSub"]] = {}
+# token_id → число publish
+_bot_publishes: Dict[int, int] = {}
+
+
+def enabled() -> bool:
+    return redis_asyncio is not None and os.environ.get("WORKER_SHARED_REDIS", "true").lower() != "false"
+
+
+def _spawn(coro: Any) -> asyncio.Task:
+    """Задача общего Redis — в контексте воркера (не бота): логи и учёт loop на token 0."""
+    return asyncio.get_running_loop().create_task(coro, context=contextvars.Context())
+
+
+def _channel_key(channel: Any) -> bytes:
+    return channel.encode() if isinstance(channel, str) else bytes(channel)
+
+
+class _PublishBatcher:
+    """publish() одного тика loop → один pipeline (без транзакции)."""
+
+    def __init__(self, client: Any):
+        self._client = client
+        self._pending: List[Tuple[Any, Any, asyncio.Future]] = []
+        self._scheduled = False
+        self.publishes = 0
+        self.pipelines = 0
+
+    def publish(self, channel: Any, message: Any) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((channel, message, fut))
+        self.publishes += 1
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._flush_soon)
+        return fut
+
+    def _flush_soon(self) -> None:
+        self._scheduled = False
+        batch, self._pending = self._pending, []
+        if batch:
+            _spawn(self._flush(batch))
+
+    async def _flush(self, batch: List[Tuple[Any, Any, asyncio.Future]]) -> None:
+        self.pipelines += 1
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for channel, message, _fut in batch:
+                pipe.publish(channel, message)
+            results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            for _channel, _message, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_channel, _message, fut), result in zip(batch, results):
+            if fut.done():
+                continue
+            if isinstance(result, Exception):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+
+class _PubSubHub:
+    """Одно pub/sub-соединение на URL; сообщения → виртуальные подписки по каналу."""
+
+    def __init__(self, client: Any):
+        self._client = client
+        self._pubsub: Any = None
+        self._reader: Optional[asyncio.Task] = None
+        self._channels: Dict[bytes, Set["VirtualPubSub"]] = {}
+        self._patterns: Dict[bytes, Set["VirtualPubSub"]] = {}
+        self.routed = 0
+        self.dropped = 0
+
+    async def subscribe(self, sub: "VirtualPubSub", keys: List[bytes], pattern: bool) -> None:
+        table = self._patterns if pattern else self._channels
+        fresh = []
+        for key in keys:
+            subs = table.setdefault(key, set())
+            if not subs:
+                fresh.append(key)
+            subs.add(sub)
+        if fresh:
+            if self._pubsub is None:
+                self._pubsub = self._client.pubsub()
+            if pattern:
+                await self._pubsub.psubscribe(*fresh)
+            else:
+                await self._pubsub.subscribe(*fresh)
+        if self._reader is None or self._reader.done():
+            self._reader = _spawn(self._read_loop())
+
+    def unsubscribe(self, sub: "VirtualPubSub", keys: List[bytes], pattern: bool) -> None:
+        table = self._patterns if pattern else self._channels
+        unused = []
+        for key in keys:
+            subs = table.get(key)
+            if subs is None:
+                continue
+            subs.discard(sub)
+            if not subs:
+                del table[key]
+                unused.append(key)
+        if unused and self._pubsub is not None:
+            _spawn(self._real_unsubscribe(unused, pattern))
+
+    async def _real_unsubscribe(self, keys: List[bytes], pattern: bool) -> None:
+        table = self._patterns if pattern else self._channels
+        # Пока шла задача, на канал могли подписаться заново
+        keys = [k for k in keys if k not in table]
+        if not keys:
+            return
+        try:
+            if pattern:
+                await self._pubsub.punsubscribe(*keys)
+            else:
+                await self._pubsub.unsubscribe(*keys)
+        except Exception as e:
+            logging.debug(f"[shared_redis] unsubscribe: {e}")
+
+    async def _read_loop(self) -> None:
+        while self._channels or self._patterns:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # redis-py переподключается и переподписывается сам при следующем чтении
+                logging.warning(f"[shared_redis] pub/sub: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is None:
+                continue
+            if message.get("type") == "pmessage":
+                subs = self._patterns.get(_channel_key(message["pattern"]), ())
+            else:
+                subs = self._channels.get(_channel_key(message["channel"]), ())
+            for sub in list(subs):
+                self.routed += 1
+                if not sub._deliver(message):
+                    self.dropped += 1
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+
+
+class VirtualPubSub:
+    """Подписка бота поверх общего pub/sub: API как у redis.asyncio.client.PubSub."""
+
+    def __init__(self, hub: _PubSubHub, token_id: int, ignore_subscribe_messages: bool = False):
+        self._hub = hub
+        self._token_id = token_id
+        self._ignore_subscribe = ignore_subscribe_messages
+        self._queue: asyncio.Queue = asyncio.Queue(
+            maxsize=int(os.environ.get("WORKER_REDIS_PUBSUB_QUEUE", "1000"))
+        )
+        self.channels: Set[bytes] = set()
+        self.patterns: Set[bytes] = set()
+        _bot_pubsubs.setdefault(token_id, set()).add(self)
+
+    @property
+    def subscribed(self) -> bool:
+        return bool(self.channels or self.patterns)
+
+    def _deliver(self, message: Dict[str, Any]) -> bool:
+        """Кладёт сообщение в очередь бота; при переполнении вытесняет самое старое."""
+        dropped = False
+        if self._queue.full():
+            self._queue.get_nowait()
+            dropped = True
+        self._queue.put_nowait(message)
+        return not dropped
+
+    def _confirm(self, kind: str, key: bytes) -> None:
+        if not self._ignore_subscribe:
+            count = len(self.channels) + len(self.patterns)
+            self._deliver({"type": kind, "pattern": None, "channel": key, "data": count})
+
+    async def subscribe(self, *channels: Any) -> None:
+        keys = [_channel_key(c) for c in channels]
+        await self._hub.subscribe(self, keys, pattern=False)
+        for key in keys:
+            self.channels.add(key)
+            self._confirm("subscribe", key)
+
+    async def psubscribe(self, *patterns: Any) -> None:
+        keys = [_channel_key(p) for p in patterns]
+        await self._hub.subscribe(self, keys, pattern=True)
+        for key in keys:
+            self.patterns.add(key)
+            self._confirm("psubscribe", key)
+
+    async def unsubscribe(self, *channels: Any) -> None:
+        keys = [_channel_key(c) for c in channels] or list(self.channels)
+        self._hub.unsubscribe(self, keys, pattern=False)
+        self.channels.difference_update(keys)
+
+    async def punsubscribe(self, *patterns: Any) -> None:
+        keys = [_channel_key(p) for p in patterns] or list(self.patterns)
+        self._hub.unsubscribe(self, keys, pattern=True)
+        self.patterns.difference_update(keys)
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: Optional[float] = 0.0):
+        while True:
+            try:
+                if timeout is None:
+                    message = await self._queue.get()
+                elif timeout > 0:
+                    message = await asyncio.wait_for(self._queue.get(), timeout)
+                else:
+                    message = self._queue.get_nowait()
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                return None
+            if ignore_subscribe_messages and message["type"] not in ("message", "pmessage"):
+                continue
+            return message
+
+    async def listen(self):
+        try:
+            while self.subscribed:
+                yield await self._queue.get()
+        finally:
+            if not self.subscribed:
+                self.detach()
+
+    def detach(self) -> None:
+        """Снимает все подписки (синхронно — годится для finally и выхода бота)."""
+        if self.channels:
+            self._hub.unsubscribe(self, list(self.channels), pattern=False)
+            self.channels.clear()
+        if self.patterns:
+            self._hub.unsubscribe(self, list(self.patterns), pattern=True)
+            self.patterns.clear()
+        subs = _bot_pubsubs.get(self._token_id)
+        if subs is not None:
+            subs.discard(self)
+
+    async def reset(self) -> None:
+        self.detach()
+
+    async def aclose(self) -> None:
+        self.detach()
+
+    async def close(self) -> None:
+        self.detach()
+
+    async def __aenter__(self) -> "VirtualPubSub":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.detach()
+
+
+class BotRedisFacade:
+    """Клиент бота над общим клиентом воркера."""
+
+    def __init__(self, client: Any, hub: _PubSubHub, batcher: _PublishBatcher, token_id: int):
+        self._client = client
+        self._hub = hub
+        self._batcher = batcher
+        self._token_id = token_id
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    async def publish(self, channel: Any, message: Any, **kwargs: Any) -> int:
+        _bot_publishes[self._token_id] = _bot_publishes.get(self._token_id, 0) + 1
+        return await self._batcher.publish(channel, message)
+
+    def pubsub(self, **kwargs: Any) -> VirtualPubSub:
+        return VirtualPubSub(self._hub, self._token_id, kwargs.get("ignore_subscribe_messages", False))
+
+    async def aclose(self, *args: Any, **kwargs: Any) -> None:
+        """Общий клиент живёт, пока жив воркер."""
+
+    async def close(self, *args: Any, **kwargs: Any) -> None:
+        """Общий клиент живёт, пока жив воркер."""
+
+
+def _from_url(url: str, **kwargs: Any) -> Any:
+    """redis.asyncio.from_url в воркере: код бота получает фасад общего клиента."""
+    token_id = iso.current_token_id.get()
+    if token_id == 0 or kwargs.get("single_connection_client"):
+        return _orig_from_url(url, **kwargs)
+    key = url + "|" + repr(sorted(kwargs.items()))
+    client = _clients.get(key)
+    if client is None:
+        pool_kwargs = dict(kwargs)
+        pool_kwargs["max_connections"] = int(os.environ.get("WORKER_REDIS_MAX_CONNECTIONS", "50"))
+        client = _orig_from_url(url, **pool_kwargs)
+        _clients[key] = client
+        _hubs[key] = _PubSubHub(client)
+        _batchers[key] = _PublishBatcher(client)
+    return BotRedisFacade(client, _hubs[key], _batchers[key], token_id)
+
+
+def install() -> None:
+    """Подменяет redis.asyncio.from_url (один раз на процесс воркера)."""
+    global _installed
+    if _installed or not enabled():
+        return
+    _installed = True
+    redis_asyncio.from_url = _from_url  # type: ignore[assignment]
+    redis_utils.from_url = _from_url  # type: ignore[assignment]
+
+
+def forget(token_id: int) -> None:
+    """Снимает подписки вышедшего бота и его счётчики."""
+    for sub in list(_bot_pubsubs.pop(token_id, ())):
+        sub.detach()
+    _bot_publishes.pop(token_id, None)
+
+
+def bot_stats(token_id: int) -> Optional[Dict[str, int]]:
+    """Publish и подписки бота для status (None — бот Redis не пользовался)."""
+    subs = _bot_pubsubs.get(token_id, ())
+    publishes = _bot_publishes.get(token_id)
+    if publishes is None and not subs:
+        return None
+    return {
+        "publishes": publishes or 0,
+        "subscriptions": sum(len(s.channels) + len(s.patterns) for s in subs),
+    }
+
+
+def stats() -> Dict[str, Any]:
+    """Общие клиенты: соединения пула, каналы pub/sub, публикации на pipeline."""
+    clients = []
+    for key, client in _clients.items():
+        pool = client.connection_pool
+        hub = _hubs[key]
+        batcher = _batchers[key]
+        clients.append({
+            "connections": len(getattr(pool, "_in_use_connections", ()))
+            + len(getattr(pool, "_available_connections", ())),
+            "pubsub_channels": len(hub._channels) + len(hub._patterns),
+            "routed": hub.routed,
+            "dropped": hub.dropped,
+            "publishes": batcher.publishes,
+            "pipelines": batcher.pipelines,
+        })
+    return {"enabled": _installed, "clients": clients}
+
+
+async def close_all() -> None:
+    """Закрывает общие клиенты при остановке воркера."""
+    hubs = list(_hubs.values())
+    clients = list(_clients.values())
+    _hubs.clear()
+    _clients.clear()
+    _batchers.clear()
+    for hub in hubs:
+        await hub.close()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception:
+            pass
@@ -0,0 +1,243 @@
+"""
+Общий HTTP-пул Telegram для ботов воркера.
+
+Каждый бот раньше держал свой AiohttpSession со своим TCPConnector: long polling,
+отправки и скачивание файлов 30 ботов — сотни отдельных TLS-соединений к api.telegram.org.
+Воркер кладёт в namespace бота WORKER_BOT_SESSION (до exec), сгенерированный код
+создаёт Bot(token=..., session=WORKER_BOT_SESSION). Сессия бота — своя ClientSession
+(заголовки, закрытие при остановке), но поверх общего TCPConnector воркера: keep-alive
+соединения, кэш DNS и TLS-сессии общие, session.close() бота соединения не рвёт.
+
+Long polling getUpdates идёт через отдельный connector без лимита (на бота — одно
+соединение): висящие до timeout опросы не занимают WORKER_TG_MAX_CONNECTIONS отправок.
+
+На токен — лимит одновременных запросов (WORKER_TG_TOKEN_CONCURRENCY, getUpdates не в счёт)
+и счётчики: запросы, ошибки, новые/переиспользованные соединения, задержка по методам API.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import time
+from typing import Any, Dict, Optional
+
+import startup_timeline
+
+try:
+    import aiohttp
+    from aiogram.client.session.aiohttp import AiohttpSession
+except ImportError:  # воркер без aiogram
+    aiohttp = None  # type: ignore[assignment]
+    AiohttpSession = None  # type: ignore[assignment,misc]
+
+# Long polling держит запрос до timeout — в квоту токена не входит
+_UNLIMITED_METHODS = frozenset({"getUpdates"})
+
+_connector: Any = None
+# Connector long polling: getUpdates держит соединение до timeout — отдельно от отправок
+_poll_connector: Any = None
+# Запрос getUpdates в текущей задаче — create_session отдаёт сессию polling
+_polling: contextvars.ContextVar[bool] = contextvars.ContextVar("worker_tg_polling", default=False)
+_session_class: Any = None
+# token_id → счётчики
+_stats: Dict[int, Dict[str, Any]] = {}
+
+
+def enabled() -> bool:
+    return AiohttpSession is not None and os.environ.get("WORKER_SHARED_TG_SESSION", "true").lower() != "false"
+
+
+def _shared_connector() -> Any:
+    """TCPConnector воркера (создаётся в работающем loop при первом запросе)."""
+    global _connector
+    if _connector is None or _connector.closed:
+        _connector = aiohttp.TCPConnector(
+            limit=int(os.environ.get("WORKER_TG_MAX_CONNECTIONS", "100")),
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+    return _connector
+
+
+def _shared_poll_connector() -> Any:
+    """Connector getUpdates: без общего лимита, по одному keep-alive соединению на polling-бота."""
+    global _poll_connector
+    if _poll_connector is None or _poll_connector.closed:
+        _poll_connector = aiohttp.TCPConnector(limit=0, ttl_dns_cache=300, keepalive_timeout=60)
+    return _poll_connector
+
+
+def _open_connections(connector: Any) -> int:
+    if connector is None or connector.closed:
+        return 0
+    return sum(len(v) for v in getattr(connector, "_conns", {}).values()) + len(
+        getattr(connector, "_acquired", ())
+    )
+
+
+def _bot_stats(token_id: int) -> Dict[str, Any]:
+    stats = _stats.get(token_id)
+    if stats is None:
+        stats = {
+            "requests": 0, "errors": 0, "in_flight": 0,
+            "connections_new": 0, "connections_reused": 0,
+            "quota_wait_ms": 0.0,
+            # метод API → [запросов, суммарно мс, максимум мс]
+            "methods": {},
+        }
+        _stats[token_id] = stats
+    return stats
+
+
+def _trace_config(stats: Dict[str, Any]) -> Any:
+    """Считает, взял ли запрос новое соединение или keep-alive из пула."""
+    trace = aiohttp.TraceConfig()
+
+    async def _on_create(_session: Any, _ctx: Any, _params: Any) -> None:
+        stats["connections_new"] += 1
+
+    async def _on_reuse(_session: Any, _ctx: Any, _params: Any) -> None:
+        stats["connections_reused"] += 1
+
+    trace.on_connection_create_end.append(_on_create)
+    trace.on_connection_reuseconn.append(_on_reuse)
+    return trace
+
+
+def _build_session_class() -> Any:
+    class WorkerTelegramSession(AiohttpSession):  # type: ignore[misc,valid-type]
+        """AiohttpSession бота поверх общего TCPConnector воркера."""
+
+        def __init__(self, token_id: int, **kwargs: Any):
+            super().__init__(**kwargs)
+            self._worker_token_id = token_id
+            self._worker_stats = _bot_stats(token_id)
+            self._worker_quota = asyncio.Semaphore(
+                max(1, int(os.environ.get("WORKER_TG_TOKEN_CONCURRENCY", "20")))
+            )
+            self._worker_poll_session: Any = None
+
+        async def create_session(self) -> Any:
+            if _polling.get():
+                if self._worker_poll_session is None or self._worker_poll_session.closed:
+                    self._worker_poll_session = aiohttp.ClientSession(
+                        connector=_shared_poll_connector(),
+                        connector_owner=False,
+                        headers=self._session_headers(),
+                        trace_configs=[_trace_config(self._worker_stats)],
+                    )
+                return self._worker_poll_session
+            if self._session is None or self._session.closed:
+                self._session = aiohttp.ClientSession(
+                    connector=_shared_connector(),
+                    connector_owner=False,
+                    headers=self._session_headers(),
+                    trace_configs=[_trace_config(self._worker_stats)],
+                )
+                self._should_reset_connector = False
+            return self._session
+
+        async def close(self) -> None:
+            if self._worker_poll_session is not None and not self._worker_poll_session.closed:
+                await self._worker_poll_session.close()
+            await super().close()
+
+        def _session_headers(self) -> Dict[str, str]:
+            from aiogram.__meta__ import __version__
+            from aiohttp.http import SERVER_SOFTWARE
+            return {"User-Agent": f"{SERVER_SOFTWARE} aiogram/{__version__}"}
+
+        async def make_request(self, bot: Any, method: Any, timeout: Optional[int] = None) -> Any:
+            name = getattr(method, "__api_method__", type(method).__name__)
+            stats = self._worker_stats
+            if name == "getUpdates":
+                # Первый getUpdates — конец критического пути старта (таймлайн закрывается)
+                startup_timeline.mark("get_updates", self._worker_token_id)
+            limited = name not in _UNLIMITED_METHODS
+            if limited:
+                t_wait = time.perf_counter()
+                await self._worker_quota.acquire()
+                stats["quota_wait_ms"] += (time.perf_counter() - t_wait) * 1000
+            stats["requests"] += 1
+            stats["in_flight"] += 1
+            t0 = time.perf_counter()
+            polling = _polling.set(not limited)
+            try:
+                return await super().make_request(bot, method, timeout=timeout)
+            except Exception:
+                stats["errors"] += 1
+                raise
+            finally:
+                _polling.reset(polling)
+                ms = (time.perf_counter() - t0) * 1000
+                stats["in_flight"] -= 1
+                acc = stats["methods"].get(name)
+                if acc is None:
+                    stats["methods"][name] = [1, ms, ms]
+                else:
+                    acc[0] += 1
+                    acc[1] += ms
+                    if ms > acc[2]:
+                        acc[2] = ms
+                if limited:
+                    self._worker_quota.release()
+
+    return WorkerTelegramSession
+
+
+def session_for(token_id: int) -> Any:
+    """Сессия для Bot(session=...) бота; None — общий пул выключен (Bot создаст свою)."""
+    global _session_class
+    if not enabled():
+        return None
+    if _session_class is None:
+        _session_class = _build_session_class()
+    return _session_class(token_id)
+
+
+def forget(token_id: int) -> None:
+    _stats.pop(token_id, None)
+
+
+def bot_stats(token_id: int) -> Optional[Dict[str, Any]]:
+    """Счётчики Telegram API бота для status (методы — count/avg_ms/max_ms)."""
+    stats = _stats.get(token_id)
+    if stats is None:
+        return None
+    out = {k: v for k, v in stats.items() if k != "methods"}
+    out["quota_wait_ms"] = round(out["quota_wait_ms"], 1)
+    out["methods"] = {
+        name: {"count": acc[0], "avg_ms": round(acc[1] / acc[0], 1), "max_ms": round(acc[2], 1)}
+        for name, acc in stats["methods"].items()
+    }
+    return out
+
+
+def stats() -> Dict[str, Any]:
+    """Общий connector: открытые соединения и переиспользование по всем ботам."""
+    new = sum(s["connections_new"] for s in _stats.values())
+    reused = sum(s["connections_reused"] for s in _stats.values())
+    connections = None
+    if _connector is not None and not _connector.closed:
+        connections = _open_connections(_connector)
+    return {
+        "enabled": enabled(),
+        "connections": connections,
+        "poll_connections": _open_connections(_poll_connector),
+        "connections_new": new,
+        "connections_reused": reused,
+        "reuse_ratio": round(reused / (new + reused), 3) if new + reused else None,
+    }
+
+
+async def close_all() -> None:
+    """Закрывает общие connector'ы при остановке воркера."""
+    global _connector, _poll_connector
+    if _connector is not None:
+        await _connector.close()
+        _connector = None
+    if _poll_connector is not None:
+        await _poll_connector.close()
+        _poll_connector = None
@@ -0,0 +1,200 @@
+"""
+Один webhook-сервер на воркер вместо aiohttp-сайта на каждого бота.
+
+Сгенерированный main() в webhook-режиме, если воркер положил WORKER_WEBHOOK_ROUTER,
+не поднимает свой TCPSite на 9000+token_id, а регистрирует dp/bot в роутере:
+POST /webhook/{token_id} → Update → dp.feed_update бота (в его контексте: логи, env,
+учёт loop). Заголовок X-Telegram-Bot-Api-Secret-Token сверяется с секретом бота.
+
+Сервер поднимается при первой регистрации на WORKER_WEBHOOK_HOST:WORKER_WEBHOOK_PORT
+(по умолчанию 127.0.0.1 и свободный порт) и сообщает порт system-событием
+webhook_server:PORT — Node проксирует апдейты на него. На маршрут — очередь
+(принятые и ещё не обработанные апдейты) и задержка обработки.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextvars
+import hmac
+import logging
+import os
+import time
+from typing import Any, Callable, Deque, Dict, Optional
+
+import startup_timeline
+
+try:
+    from aiohttp import web
+except ImportError:  # воркер без aiohttp
+    web = None  # type: ignore[assignment]
+
+_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Замеров задержки на маршрут (для p50/p99)
+_LATENCY_WINDOW = 512
+
+
+class _Route:
+    """Бот за /webhook/{token_id}: dp, bot, секрет, контекст бота и счётчики."""
+
+    def __init__(self, dp: Any, bot: Any, secret_token: Optional[str], context: contextvars.Context):
+        self.dp = dp
+        self.bot = bot
+        self.secret_token = secret_token or None
+        self.context = context
+        self.tasks: set = set()
+        self.received = 0
+        self.rejected = 0
+        self.errors = 0
+        self.latency_ms: Deque[float] = collections.deque(maxlen=_LATENCY_WINDOW)
+        self.queue_max = 0
+
+
+def _percentile(values: list, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 1)
+
+
+class WebhookRouter:
+    """aiohttp-сервер воркера: маршруты /webhook/{token_id} → dispatcher бота."""
+
+    def __init__(self) -> None:
+        self._routes: Dict[int, _Route] = {}
+        self._runner: Any = None
+        self._start_lock = asyncio.Lock()
+        self.port: Optional[int] = None
+        # Сообщить Node порт (воркер ставит emit_system)
+        self.on_started: Optional[Callable[[int], None]] = None
+
+    async def _ensure_started(self) -> None:
+        if self._runner is not None:
+            return
+        async with self._start_lock:
+            if self._runner is not None:
+                return
+            app = web.Application(client_max_size=int(os.environ.get("WORKER_WEBHOOK_MAX_BODY", str(1024 ** 2))))
+            app.router.add_post("/webhook/{token_id}", self._handle)
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(
+                runner,
+                host=os.environ.get("WORKER_WEBHOOK_HOST", "127.0.0.1"),
+                port=int(os.environ.get("WORKER_WEBHOOK_PORT", "0")),
+            )
+            await site.start()
+            self._runner = runner
+            self.port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+            if self.on_started is not None:
+                self.on_started(self.port)
+
+    async def register(self, token_id: int, dp: Any, bot: Any, secret_token: Optional[str] = None) -> int:
+        """Подключает бота к серверу воркера (вызывается из main() бота). Возвращает порт."""
+        await self._ensure_started()
+        # Контекст бота: обработка апдейта идёт с его token_id и env, как при polling
+        self._routes[token_id] = _Route(dp, bot, secret_token, contextvars.copy_context())
+        startup_timeline.mark("webhook", token_id)
+        return self.port  # type: ignore[return-value]
+
+    def unregister(self, token_id: int) -> None:
+        """Снимает маршрут; начатые апдейты дорабатывают."""
+        self._routes.pop(token_id, None)
+
+    async def _handle(self, request: Any) -> Any:
+        try:
+            token_id = int(request.match_info["token_id"])
+        except ValueError:
+            return web.Response(status=404)
+        route = self._routes.get(token_id)
+        if route is None:
+            return web.Response(status=404)
+        if route.secret_token is not None:
+            got = request.headers.get(_SECRET_HEADER, "")
+            if not hmac.compare_digest(got, route.secret_token):
+                route.rejected += 1
+                return web.Response(status=401)
+        try:
+            payload = await request.json()
+        except ValueError:
+            route.rejected += 1
+            return web.Response(status=400)
+        route.received += 1
+        # Ответ Telegram — сразу, обработка в фоне (как SimpleRequestHandler по умолчанию)
+        task = asyncio.get_running_loop().create_task(
+            self._process(route, payload), context=route.context.copy()
+        )
+        route.tasks.add(task)
+        task.add_done_callback(route.tasks.discard)
+        if len(route.tasks) > route.queue_max:
+            route.queue_max = len(route.tasks)
+        return web.Response(status=200)
+
+    async def _process(self, route: _Route, payload: Dict[str, Any]) -> None:
+        from aiogram.types import Update
+
+        t0 = time.perf_counter()
+        try:
+            update = Update.model_validate(payload, context={"bot": route.bot})
+            await route.dp.feed_update(route.bot, update)
+        except Exception as e:
+            route.errors += 1
+            logging.error(f"Webhook: ошибка обработки апдейта: {e}")
+        finally:
+            route.latency_ms.append((time.perf_counter() - t0) * 1000)
+
+    def route_stats(self, token_id: int) -> Optional[Dict[str, Any]]:
+        """Очередь и задержка маршрута бота для status (None — бот не на общем сервере)."""
+        route = self._routes.get(token_id)
+        if route is None:
+            return None
+        samples = list(route.latency_ms)
+        return {
+            "received": route.received,
+            "rejected": route.rejected,
+            "errors": route.errors,
+            "queue": len(route.tasks),
+            "queue_max": route.queue_max,
+            "latency_p50_ms": _percentile(samples, 0.50),
+            "latency_p99_ms": _percentile(samples, 0.99),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"port": self.port, "routes": len(self._routes)}
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+_router: Optional[WebhookRouter] = None
+
+
+def get_router() -> Optional[WebhookRouter]:
+    """Роутер воркера; None — общий сервер выключен (бот поднимет свой на WEBHOOK_PORT)."""
+    global _router
+    if web is None or os.environ.get("WORKER_SHARED_WEBHOOK", "true").lower() == "false":
+        return None
+    if _router is None:
+        _router = WebhookRouter()
+    return _router
+
+
+def forget(token_id: int) -> None:
+    if _router is not None:
+        _router.unregister(token_id)
+
+
+def route_stats(token_id: int) -> Optional[Dict[str, Any]]:
+    return _router.route_stats(token_id) if _router is not None else None
+
+
+def stats() -> Optional[Dict[str, Any]]:
+    return _router.stats() if _router is not None else None
+
+
+async def close_all() -> None:
+    if _router is not None:
+        await _router.close()
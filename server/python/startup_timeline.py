@@ -0,0 +1,158 @@
+"""
+Таймлайн старта бота: сколько занял каждый этап от команды до первого getUpdates.
+
+Этапы (в порядке критического пути, отсутствующие просто пропускаются):
+  import      — чтение/компиляция bot.py и локальных модулей (в пакете — общий прогрев кэша кода)
+  exec        — top-level код бота
+  queue       — ожидание слота ограниченного fan-out сетевой инициализации
+  redis       — подключение к Redis, lock, bot:started (отметка из main())
+  db          — пул asyncpg (отметка из init_database())
+  ddl         — CREATE TABLE IF NOT EXISTS … (отметка из init_database())
+  caches      — кэш file_id и контент _content (отметка из main())
+  commands    — set_bot_commands (отметка из main())
+  polling     — main() запускает polling (сетевая инициализация позади, слот fan-out свободен)
+  set_webhook — main() зарегистрировал webhook в Telegram (то же для webhook-ботов)
+  get_updates — первый getUpdates ушёл в Telegram (общая Telegram-сессия воркера)
+  webhook     — бот зарегистрирован в общем webhook-сервере воркера
+  standby     — lease лидерства у другого инстанса, бот загружен и ждёт (BOT_STANDBY)
+
+Длительность этапа — время от предыдущей отметки. Таймлайн закрывается финальной
+отметкой (get_updates/webhook/standby), выходом бота или по таймауту WORKER_START_TIMEOUT_S;
+тогда вызываются колбэки завершения (кадр startup в stdout). Слот fan-out освобождается
+раньше — на polling/set_webhook (колбэки on_release), без ожидания первого getUpdates:
+он может не прийти, если у бота своя Telegram-сессия.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import worker_isolation as iso
+
+# Отметки, после которых бот считается запущенным (→ статус таймлайна)
+_FINAL_PHASES = {"get_updates": "ready", "webhook": "ready", "standby": "standby"}
+# Отметки конца сетевой инициализации main(): таймлайн продолжается, слот fan-out свободен
+_RELEASE_PHASES = frozenset({"polling", "set_webhook"})
+
+# token_id → активный таймлайн
+_active: Dict[int, "Timeline"] = {}
+
+
+class Timeline:
+    """Отметки этапов старта одного бота."""
+
+    def __init__(self, token_id: int, t0: float, batch: Optional[int] = None):
+        self.token_id = token_id
+        self.t0 = t0
+        self.batch = batch
+        # (этап, мс от t0)
+        self.marks: List[Tuple[str, float]] = []
+        self.status: Optional[str] = None
+        self.total_ms: Optional[float] = None
+        self._on_done: List[Callable[["Timeline"], None]] = []
+        self._on_release: List[Callable[["Timeline"], None]] = []
+        self.released = False
+
+    @property
+    def done(self) -> bool:
+        return self.status is not None
+
+    def mark(self, phase: str) -> None:
+        if self.done or any(name == phase for name, _ in self.marks):
+            return
+        self.marks.append((phase, (time.perf_counter() - self.t0) * 1000))
+        if phase in _FINAL_PHASES:
+            self.finish(_FINAL_PHASES[phase])
+        elif phase in _RELEASE_PHASES:
+            self._release()
+
+    def on_done(self, callback: Callable[["Timeline"], None]) -> None:
+        """Колбэк на закрытие таймлайна (сразу, если уже закрыт)."""
+        if self.done:
+            callback(self)
+        else:
+            self._on_done.append(callback)
+
+    def on_release(self, callback: Callable[["Timeline"], None]) -> None:
+        """Колбэк на конец сетевой инициализации (polling/set_webhook или закрытие таймлайна)."""
+        if self.released:
+            callback(self)
+        else:
+            self._on_release.append(callback)
+
+    def _release(self) -> None:
+        if self.released:
+            return
+        self.released = True
+        callbacks, self._on_release = self._on_release, []
+        _run_callbacks(self, callbacks)
+
+    def finish(self, status: str) -> None:
+        if self.done:
+            return
+        self.status = status
+        self.total_ms = (time.perf_counter() - self.t0) * 1000
+        self._release()
+        callbacks, self._on_done = self._on_done, []
+        _run_callbacks(self, callbacks)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Кадр для Node: этапы со смещением и длительностью, самый долгий этап."""
+        phases = []
+        prev = 0.0
+        for name, at in self.marks:
+            phases.append({"phase": name, "start_ms": round(prev, 1), "ms": round(at - prev, 1)})
+            prev = at
+        slowest = max(phases, key=lambda p: p["ms"])["phase"] if phases else None
+        total = self.total_ms if self.total_ms is not None else (time.perf_counter() - self.t0) * 1000
+        out: Dict[str, Any] = {
+            "status": self.status,
+            "total_ms": round(total, 1),
+            "phases": phases,
+            "slowest": slowest,
+        }
+        if self.batch is not None:
+            out["batch"] = self.batch
+        return out
+
+
+def _run_callbacks(timeline: Timeline, callbacks: List[Callable[[Timeline], None]]) -> None:
+    for callback in callbacks:
+        try:
+            callback(timeline)
+        except Exception:
+            pass
+
+
+def begin(token_id: int, t0: Optional[float] = None, batch: Optional[int] = None) -> Timeline:
+    """Новый таймлайн бота (прежний, если был, закрывается как replaced)."""
+    prev = _active.get(token_id)
+    if prev is not None:
+        prev.finish("replaced")
+    timeline = Timeline(token_id, t0 if t0 is not None else time.perf_counter(), batch)
+    _active[token_id] = timeline
+    return timeline
+
+
+def mark(phase: str, token_id: Optional[int] = None) -> None:
+    """
+    Отметка конца этапа. Без token_id — бот из контекста (так зовёт сгенерированный
+    код через WORKER_STARTUP_MARK). После закрытия таймлайна — no-op.
+    """
+    tid = iso.current_token_id.get() if token_id is None else token_id
+    timeline = _active.get(tid)
+    if timeline is not None:
+        timeline.mark(phase)
+
+
+def finish(token_id: int, status: str) -> None:
+    timeline = _active.get(token_id)
+    if timeline is not None:
+        timeline.finish(status)
+
+
+def forget(token_id: int, timeline: Optional[Timeline] = None) -> None:
+    """Убирает таймлайн бота после выхода (только свой, если передан timeline)."""
+    if timeline is None or _active.get(token_id) is timeline:
+        _active.pop(token_id, None)
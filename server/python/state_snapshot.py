@@ -0,0 +1,202 @@
+"""
+Снимок user_data бота для тёплого рестарта.
+
+user_data сгенерированного бота (FSM __fsm_state__, waiting_for_input,
+button_response_config, multi_select_node, вычисленные переменные) живёт в памяти
+процесса и после рестарта пуст: пользователь посреди ввода теряет место, остальные
+платят запросами в БД. Воркер при штатной остановке бота пишет снимок на локальный
+диск, а при старте читает и разбирает его в пуле потоков параллельно с компиляцией
+и top-level кодом бота — в user_data снимок попадает до вызова main().
+
+Формат файла (версия 1), <WORKER_STATE_DIR>/user_data_{token_id}.snap:
+
+  magic b"TBSNAP" | версия формата u8 | marshal.version u8 | Python major u8, minor u8
+  | saved_at f64 (unix time) | zlib(marshal({"users": {uid: {...}}, "age": {uid: сек}}))
+
+marshal быстрее pickle и не исполняет код при чтении, но его формат зависит от версии
+Python — при несовпадении заголовка снимок пропускается. Значения, которые marshal не
+умеет (datetime, объекты aiogram), в снимок не попадают. Снимок одноразовый: после
+чтения файл удаляется, чтобы падение бота не вернуло старое состояние при следующем старте.
+
+Переменные окружения: WORKER_STATE_SNAPSHOT (true), WORKER_STATE_DIR (по умолчанию
+.state рядом с bot.py), WORKER_STATE_MAX_AGE_S (900 — более старый снимок не читается).
+"""
+
+from __future__ import annotations
+
+import marshal
+import os
+import struct
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+MAGIC = b"TBSNAP"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<6sBBBBd")
+DEFAULT_MAX_AGE_S = 900.0
+
+# token_id → счётчики последнего сохранения/восстановления (остаются после выхода бота)
+_stats: Dict[int, Dict[str, Any]] = {}
+
+
+def enabled() -> bool:
+    return os.environ.get("WORKER_STATE_SNAPSHOT", "true").lower() != "false"
+
+
+def max_age_s() -> float:
+    return float(os.environ.get("WORKER_STATE_MAX_AGE_S", DEFAULT_MAX_AGE_S))
+
+
+def snapshot_path(token_id: int, bot_dir: Path) -> Path:
+    base = os.environ.get("WORKER_STATE_DIR")
+    directory = Path(base) if base else Path(bot_dir) / ".state"
+    return directory / f"user_data_{token_id}.snap"
+
+
+def _marshalable(value: Any) -> bool:
+    try:
+        marshal.dumps(value)
+        return True
+    except ValueError:
+        return False
+
+
+def encode(user_data: Dict[Any, Any], ages: Dict[Any, float]) -> Tuple[bytes, int, int]:
+    """
+    Снимок user_data → (байты файла, пользователей, пропущенных значений).
+    Зовётся в loop: состояние бота читается целиком, без гонки с хендлерами.
+    """
+    users: Dict[Any, Any] = {}
+    skipped = 0
+    for uid, data in list(user_data.items()):
+        if not isinstance(data, dict) or not data:
+            continue
+        # _UserState (UserStateStore бота) — подкласс dict, marshal берёт только dict
+        if type(data) is not dict:
+            data = dict(data)
+        if not _marshalable(data):
+            clean = {k: v for k, v in data.items() if _marshalable(v)}
+            skipped += len(data) - len(clean)
+            data = clean
+        users[uid] = data
+    payload = {"users": users, "age": {uid: ages[uid] for uid in users if uid in ages}}
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, marshal.version, sys.version_info[0], sys.version_info[1], time.time()
+    )
+    return header + zlib.compress(marshal.dumps(payload), 1), len(users), skipped
+
+
+def decode(blob: bytes) -> Tuple[Dict[Any, Any], Dict[Any, float], float]:
+    """Байты файла → (users, возраст активности на момент записи, saved_at); ValueError — чужой формат."""
+    if len(blob) < _HEADER.size:
+        raise ValueError("файл короче заголовка")
+    magic, version, marshal_version, py_major, py_minor, saved_at = _HEADER.unpack_from(blob)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"неизвестный формат снимка (версия {version})")
+    if (marshal_version, py_major, py_minor) != (marshal.version, *sys.version_info[:2]):
+        raise ValueError(f"снимок записан Python {py_major}.{py_minor}")
+    payload = marshal.loads(zlib.decompress(blob[_HEADER.size:]))
+    return payload.get("users", {}), payload.get("age", {}), saved_at
+
+
+def write(path: Path, blob: bytes) -> None:
+    """Атомарная запись (tmp + replace) — для пула потоков."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(blob)
+    os.replace(tmp, path)
+
+
+def read(path: Path) -> Optional[Tuple[Dict[Any, Any], Dict[Any, float], float, int]]:
+    """
+    Чтение и разбор снимка в пуле потоков: (users, ages, saved_at, байт) или None, если
+    снимка нет. Файл удаляется и при ошибке разбора — битый снимок не читается повторно.
+    """
+    try:
+        blob = path.read_bytes()
+    except FileNotFoundError:
+        return None
+    try:
+        path.unlink()
+    except OSError:
+        pass
+    users, ages, saved_at = decode(blob)
+    return users, ages, saved_at, len(blob)
+
+
+def save(token_id: int, module: Any) -> Optional[Tuple[bytes, int, int]]:
+    """
+    Снимок user_data остановленного бота (байты, пользователей, пропущено) или None,
+    если у бота нет user_data. Возраст активности — из слота seen записи
+    (UserStateStore) или из _user_last_seen (боты, сгенерированные раньше).
+    """
+    user_data = getattr(module, "user_data", None)
+    if not isinstance(user_data, dict) or not user_data:
+        return None
+    last_seen = getattr(module, "_user_last_seen", None) or {}
+    now = time.monotonic()
+    ages = {}
+    for uid, data in user_data.items():
+        seen = getattr(data, "seen", None)
+        if seen is None:
+            seen = last_seen.get(uid)
+        if seen is not None:
+            ages[uid] = max(0.0, now - seen)
+    return encode(user_data, ages)
+
+
+def restore(
+    token_id: int,
+    module: Any,
+    snapshot: Tuple[Dict[Any, Any], Dict[Any, float], float, int],
+    read_ms: float,
+) -> int:
+    """
+    Переносит прочитанный снимок в user_data бота (до main()): пользователи, неактивные
+    дольше USER_DATA_TTL с учётом простоя, пропускаются; уже заданные ключи не трогаются.
+    """
+    users, ages, saved_at, size = snapshot
+    user_data = getattr(module, "user_data", None)
+    if not isinstance(user_data, dict):
+        return 0
+    last_seen = getattr(module, "_user_last_seen", None)
+    ttl = float(getattr(module, "USER_DATA_TTL", 0) or 0)
+    downtime = max(0.0, time.time() - saved_at)
+    now = time.monotonic()
+    restored = 0
+    for uid, data in users.items():
+        age = ages.get(uid, 0.0) + downtime
+        if ttl and age > ttl:
+            continue
+        current = user_data.setdefault(uid, {})
+        for key, value in data.items():
+            current.setdefault(key, value)
+        if hasattr(current, "seen"):
+            current.seen = now - age
+        elif isinstance(last_seen, dict):
+            last_seen.setdefault(uid, now - age)
+        restored += 1
+    _stats[token_id] = {
+        "restored_users": restored,
+        "snapshot_users": len(users),
+        "snapshot_bytes": size,
+        "downtime_s": round(downtime, 1),
+        "read_ms": round(read_ms, 1),
+    }
+    return restored
+
+
+def record_save(token_id: int, users: int, skipped: int, size: int, ms: float) -> None:
+    _stats[token_id] = {
+        "saved_users": users,
+        "skipped_values": skipped,
+        "snapshot_bytes": size,
+        "save_ms": round(ms, 1),
+    }
+
+
+def stats() -> Dict[str, Any]:
+    return {str(tid): dict(s) for tid, s in _stats.items()}
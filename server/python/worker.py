@@ -3,10 +3,26 @@ Bot Worker — asyncio мастер-процесс для запуска нес
 
 Протокол:
   stdin  → {"cmd": "start_bot", "token": "...", "token_id": 42, "bot_file": "/path/to/bot.py"}
+           (+ "webhook_url", "webhook_port", "webhook_secret" для webhook-режима)
+  stdin  → {"cmd": "start_bots", "bots": [{"token": "...", "token_id": 42, "bot_file": "..."}, ...]}
+           (пакетный старт: общий прогрев кода, сетевая инициализация с ограниченным fan-out)
   stdin  → {"cmd": "stop_bot", "token_id": 42}
-  stdin  → {"cmd": "status"} | {"cmd": "shutdown"}
+  stdin  → {"cmd": "reload_bot", "token_id": 42, "bot_file": "/path/to/bot.py"}
+  stdin  → {"cmd": "set_log_level", "token_id"?: 42, "logger"?: "aiogram", "level": "WARNING"|null, "sample"?: 20}
+  stdin  → {"cmd": "set_log_limit", "token_id"?: 42, "rate": 20|null, "burst"?: 100}
+  stdin  → {"cmd": "status"} | {"cmd": "metrics"} | {"cmd": "shutdown"}
   stdout ← {"token_id": 42, "type": "stdout"|"stderr", "content": "..."}
   stdout ← {"type": "system", "content": "worker_ready|bot_started:ID|bot_exited:ID:status|..."}
+  stdout ← {"type": "system", "content": "bot_reloaded:ID|bot_reload_failed:ID"}
+  stdout ← {"type": "system", "content": "slow_callback:ID:ms"}  (колбэк бота заблокировал loop)
+  stdout ← {"type": "system", "content": "webhook_server:PORT"}  (общий webhook-сервер воркера)
+  stdout ← {"type": "system", "content": "bot_role:ID:leader|standby:FENCE"}  (lease polling-бота)
+  stdout ← {"type": "metrics", "data": {"loop": {...}, "bots": [{"token_id": 42, "loop_share": ...}]}}
+  stdout ← {"type": "startup", "token_id": 42, "data": {"status": "ready", "total_ms": ..., "phases": [...]}}
+
+Команды выполняются конкурентно, последовательно только в пределах одного token_id.
+Необязательный "req_id" в команде возвращается в ответе:
+  stdout ← {"type": "reply", "req_id": ..., "cmd": "...", "ok": true|false, "error"?: "..."}
 """
 
 from __future__ import annotations
@@ -22,12 +38,44 @@ import traceback
 import types
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 
 import bot_code_cache
+import hot_reload
+import log_control
+import log_limit
+import log_transport
+import shared_cache
+import shared_db
+import shared_redis
+import shared_telegram
+import shared_webhook
+import startup_timeline
+import state_snapshot
 import worker_isolation as iso
+import worker_metrics
 
 PROJECT_ID = int(os.environ.get("PROJECT_ID", "0"))
+# Индекс шарда проекта (supervisor раскладывает token_id по N воркерам)
+WORKER_SHARD = int(os.environ.get("WORKER_SHARD", "0"))
+# Реализация event loop: asyncio | uvloop (WORKER_EVENT_LOOP, выбирается в main)
+EVENT_LOOP = "asyncio"
+
+# Пул для чтения/компиляции/marshal кода ботов (параллельный холодный старт)
+_LOAD_POOL = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("WORKER_LOAD_THREADS", "4")),
+    thread_name_prefix="bot-load",
+)
+
+# Команды, которые сериализуются по token_id (остальные — без очереди)
+_TOKEN_SCOPED_CMDS = frozenset({"start_bot", "stop_bot", "reload_bot"})
+
+# Сколько ждать апдейты, начатые старой версией кода, после reload_bot
+_RELOAD_DRAIN_TIMEOUT_S = 15.0
+
+# Не чаще раза в N секунд пишем стек медленного колбэка в лог бота
+_SLOW_STACK_LOG_INTERVAL_S = 30.0
 
 # Локальные модули бота, которые часто конфликтуют по короткому имени
 _SIBLING_PRIORITY = ("config", "utils", "redis_storage", "database", "middlewares", "handlers")
@@ -83,10 +131,14 @@ class WorkerLogHandler(logging.Handler):
 
     def emit(self, record: logging.LogRecord) -> None:
         try:
-            msg = self.format(record)
             tid = iso.current_token_id.get()
             if tid == 0:
                 return
+            # Уровень бота/логгера и выборка — до format(): отброшенное не форматируем
+            suffix = log_control.check(tid, record)
+            if suffix is None or not log_limit.allow(tid):
+                return
+            msg = self.format(record) + suffix
             emit_log(tid, msg, "stderr" if record.levelno >= logging.WARNING else "stdout")
         except Exception:
             pass
@@ -104,28 +156,32 @@ def ensure_root_log_handler() -> None:
     # Убираем только дефолтные StreamHandler'ы, не трогая чужие при повторном вызове
     root.handlers.clear()
     root.addHandler(WorkerLogHandler())
-    root.setLevel(logging.DEBUG)
+    # Уровень root — минимум из WORKER_LOG_LEVEL и правил set_log_level
+    log_control.configure()
     _root_handler_installed = True
 
 
+# Построчный или батчевый вывод в stdout (WORKER_LOG_TRANSPORT); выбирается в main():
+# zygote импортирует модуль до fork, а поток-писатель fork не переживает
+_transport: "log_transport.LineTransport | log_transport.BatchTransport" = log_transport.LineTransport()
+
+
 def emit_log(token_id: int, content: str, stream: str = "stdout") -> None:
     """Отправляет строку лога в stdout как JSON с timestamp."""
     try:
-        ts = datetime.now().strftime("%H:%M:%S")
+        ts = log_transport.log_timestamp()
         line = json.dumps(
             {"token_id": token_id, "type": stream, "content": f"[{ts}] {content}"},
             ensure_ascii=False,
         )
-        sys.stdout.write(line + "\n")
-        sys.stdout.flush()
+        _transport.write_log(token_id, line)
     except Exception:
         try:
             line = json.dumps(
                 {"token_id": token_id, "type": stream, "content": content},
                 ensure_ascii=True,
             )
-            sys.stdout.write(line + "\n")
-            sys.stdout.flush()
+            _transport.write_log(token_id, line)
         except Exception:
             pass
 
@@ -133,8 +189,84 @@ def emit_log(token_id: int, content: str, stream: str = "stdout") -> None:
 def emit_system(content: str) -> None:
     """Системное сообщение воркера (без token_id)."""
     line = json.dumps({"type": "system", "content": content}, ensure_ascii=False)
-    sys.stdout.write(line + "\n")
-    sys.stdout.flush()
+    _transport.write_frame(line)
+
+
+def emit_reply(req_id: Any, cmd: Optional[str], ok: bool, error: Optional[str] = None) -> None:
+    """Ответ на команду с req_id (корреляция на стороне supervisor)."""
+    payload: Dict[str, Any] = {"type": "reply", "req_id": req_id, "cmd": cmd, "ok": ok}
+    if error:
+        payload["error"] = error
+    _transport.write_frame(json.dumps(payload, ensure_ascii=False))
+
+
+class _StdinLines:
+    """
+    Построчное чтение stdin без опроса: asyncio pipe reader на POSIX,
+    поток-читатель на Windows (Proactor не умеет connect_read_pipe для stdin).
+    """
+
+    def __init__(self) -> None:
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._queue: Optional[asyncio.Queue] = None
+
+    async def open(self) -> None:
+        loop = asyncio.get_running_loop()
+        if sys.platform != "win32":
+            try:
+                reader = asyncio.StreamReader(limit=16 * 1024 * 1024)
+                await loop.connect_read_pipe(
+                    lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+                )
+                self._reader = reader
+                return
+            except (OSError, ValueError, NotImplementedError):
+                # stdin — файл/tty: откатываемся на поток
+                pass
+
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def _thread_reader():
+            try:
+                for line in sys.stdin:
+                    loop.call_soon_threadsafe(queue.put_nowait, line)
+            except (EOFError, OSError):
+                pass
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        import threading
+
+        threading.Thread(target=_thread_reader, daemon=True).start()
+        self._queue = queue
+
+    async def readline(self) -> Optional[str]:
+        """Следующая строка без \n или None при EOF."""
+        if self._reader is not None:
+            raw = await self._reader.readline()
+            if not raw:
+                return None
+            return raw.decode("utf-8", errors="replace").strip()
+        assert self._queue is not None
+        line = await self._queue.get()
+        return None if line is None else line.strip()
+
+
+def _sibling_names(bot_path: Path) -> List[str]:
+    """Локальные модули бота для загрузки рядом с bot.py (приоритетные — первыми)."""
+    siblings = list(_SIBLING_PRIORITY)
+    for stem in iso.list_local_py_stems(bot_path.parent, exclude={bot_path.stem, *siblings}):
+        siblings.append(stem)
+    return siblings
+
+
+def _compile_bot_files(bot_path: Path) -> None:
+    """Прогрев кэша кода бота в потоке (start_bots); ошибки покажет обычная загрузка."""
+    try:
+        iso.compile_sibling_modules(bot_path.parent, _sibling_names(bot_path))
+        bot_code_cache.load_bot_code(bot_path, lambda _msg: None)
+    except Exception:
+        pass
 
 
 class BotContext:
@@ -149,9 +281,19 @@ class BotContext:
         self.status: str = "starting"
         self.webhook_url: Optional[str] = None
         self.webhook_port: Optional[int] = None
+        # Секрет X-Telegram-Bot-Api-Secret-Token (настройки токена)
+        self.webhook_secret: Optional[str] = None
         self.bot_dir: Optional[Path] = None
         # Загруженный module bot.py — для request_bot_stop()
         self.module: Optional[types.ModuleType] = None
+        # Маршрутизация апдейтов корневого dp в актуальную версию кода (reload_bot)
+        self.update_router: Optional[hot_reload.UpdateRouter] = None
+        # Начало старта (perf_counter) и номер пакета start_bots — для таймлайна
+        self.startup_t0: Optional[float] = None
+        self.startup_batch: Optional[int] = None
+        # Роль по Redis lease (leader/standby) и fencing-номер лидерства
+        self.role: Optional[str] = None
+        self.fence: int = 0
 
     def to_dict(self) -> Dict[str, Any]:
         """Сериализация для команды status."""
@@ -160,8 +302,40 @@ class BotContext:
             "status": self.status,
             "bot_file": self.bot_file,
             "started_at": self.started_at.isoformat() if self.started_at else None,
+            "role": self.role,
+            "fence": self.fence,
+            "log_dropped": _transport.dropped_for(self.token_id),
+            **worker_metrics.bot_summary(self.token_id),
+            "db": shared_db.bot_stats(self.token_id),
+            "redis": shared_redis.bot_stats(self.token_id),
+            "telegram": shared_telegram.bot_stats(self.token_id),
+            "webhook": shared_webhook.route_stats(self.token_id),
+            "user_state": self._module_stats("user_data"),
+            "user_var_writer": self._module_stats("_user_var_writer"),
+            "update_vars": self._module_stats("_update_vars_counters", counters=True),
+            "text_templates": self._module_stats("_compile_text_template"),
         }
 
+    def _module_stats(self, name: str, counters: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Счётчики объекта бота со stats(): UserStateStore (user_data), буфер записи
+        переменных (_user_var_writer), dict счётчиков (counters=True, _update_vars_counters) или
+        lru_cache-функция (_compile_text_template — hits/misses/currsize).
+        У старых bot.py и ботов без БД их нет — None; обычный dict user_data старых bot.py
+        (данные пользователей, не счётчики) тоже None.
+        """
+        obj = getattr(self.module, name, None)
+        stats = getattr(obj, "stats", None)
+        if not callable(stats) and isinstance(obj, dict):
+            return dict(obj) if counters else None
+        cache_info = getattr(obj, "cache_info", None)
+        if not callable(stats) and callable(cache_info):
+            return cache_info()._asdict()
+        try:
+            return stats() if callable(stats) else None
+        except Exception:
+            return None
+
 
 class BotWorker:
     """Мастер-процесс: N ботов в одном asyncio loop."""
@@ -169,21 +343,113 @@ class BotWorker:
     def __init__(self):
         self.bots: Dict[int, BotContext] = {}
         self._shutdown_event = asyncio.Event()
+        # Очередь команд per token_id: lock + число ожидающих (для уборки)
+        self._token_locks: Dict[int, asyncio.Lock] = {}
+        self._token_lock_users: Dict[int, int] = {}
+        self._command_tasks: set[asyncio.Task] = set()
+        self._slow_stack_logged: Dict[int, float] = {}
+        # Слоты сетевой инициализации: main() бота до первого getUpdates (WORKER_START_CONCURRENCY)
+        self._start_slots = asyncio.Semaphore(max(1, int(os.environ.get("WORKER_START_CONCURRENCY", "8"))))
+        # Незавершённый старт закрывается по таймауту (таймлайн status=timeout, слот свободен)
+        self._start_timeout_s = float(os.environ.get("WORKER_START_TIMEOUT_S", "60"))
+        # Дольше слот не держится, даже если main() не отметил polling/set_webhook (старый bot.py)
+        self._start_slot_hold_s = float(os.environ.get("WORKER_START_SLOT_HOLD_S", "15"))
+        self._start_batches = 0
+        iso.install_env_view()
         ensure_root_log_handler()
-
-    async def handle_command(self, data: Dict[str, Any]) -> None:
-        """Обрабатывает одну JSON-команду из stdin."""
+        worker_metrics.on_slow_callback = self._on_slow_callback
+        # Лимит строк лога на бота; сводки «пропущено N строк» идут в лог бота мимо лимита
+        log_limit.configure()
+        log_limit.on_summary = lambda tid, text: emit_log(tid, text, "stderr")
+        # asyncpg.create_pool из кода ботов → фасад общего пула на DSN
+        shared_db.install()
+        # redis.asyncio.from_url из кода ботов → общий клиент и pub/sub на URL
+        shared_redis.install()
+        webhook_router = shared_webhook.get_router()
+        if webhook_router is not None:
+            webhook_router.on_started = lambda port: emit_system(f"webhook_server:{port}")
+
+    async def handle_command(self, data: Dict[str, Any]) -> bool:
+        """Обрабатывает одну JSON-команду из stdin. False — команда неизвестна."""
         cmd = data.get("cmd")
         if cmd == "start_bot":
             await self._start_bot(data)
+        elif cmd == "start_bots":
+            await self._start_bots(data)
         elif cmd == "stop_bot":
             await self._stop_bot(data)
+        elif cmd == "reload_bot":
+            await self._reload_bot(data)
+        elif cmd == "set_log_level":
+            self._set_log_level(data)
+        elif cmd == "set_log_limit":
+            self._set_log_limit(data)
         elif cmd == "status":
-            self._emit_status()
+            self._emit_status(data.get("req_id"))
+        elif cmd == "metrics":
+            await self._emit_metrics(data.get("req_id"))
         elif cmd == "shutdown":
             await self._shutdown()
         else:
             emit_system(f"unknown_command: {cmd}")
+            return False
+        return True
+
+    async def _serialized(self, token_id: int, data: Dict[str, Any]) -> bool:
+        """Выполняет команду после предыдущих команд того же token_id."""
+        lock = self._token_locks.setdefault(token_id, asyncio.Lock())
+        self._token_lock_users[token_id] = self._token_lock_users.get(token_id, 0) + 1
+        try:
+            async with lock:
+                return await self.handle_command(data)
+        finally:
+            left = self._token_lock_users[token_id] - 1
+            if left:
+                self._token_lock_users[token_id] = left
+            else:
+                del self._token_lock_users[token_id]
+                del self._token_locks[token_id]
+
+    def _on_slow_callback(self, token_id: int, elapsed_ms: float, stack: str) -> None:
+        """Watchdog: колбэк бота держал loop дольше бюджета — событие и сэмпл стека."""
+        emit_system(f"slow_callback:{token_id}:{elapsed_ms:.0f}")
+        if token_id == 0:
+            sys.stderr.write(f"[worker] медленный колбэк {elapsed_ms:.0f} мс\n{stack}\n")
+            return
+        now = time.monotonic()
+        if now - self._slow_stack_logged.get(token_id, 0.0) < _SLOW_STACK_LOG_INTERVAL_S:
+            return
+        self._slow_stack_logged[token_id] = now
+        emit_log(
+            token_id,
+            f"Блокирующий код: колбэк занял loop на {elapsed_ms:.0f} мс "
+            f"(другие боты воркера ждали). Стек:\n{stack}",
+            "stderr",
+        )
+
+    async def _dispatch(self, data: Dict[str, Any]) -> None:
+        """Задача одной команды: очередь по token_id, ответ с req_id."""
+        cmd = data.get("cmd")
+        req_id = data.get("req_id")
+        token_id = data.get("token_id")
+        try:
+            if token_id and cmd in _TOKEN_SCOPED_CMDS:
+                known = await self._serialized(token_id, data)
+            else:
+                known = await self.handle_command(data)
+        except Exception as e:
+            emit_system(f"command_error: {cmd}: {e}")
+            if req_id is not None:
+                emit_reply(req_id, cmd, False, str(e))
+            return
+        if req_id is not None:
+            emit_reply(req_id, cmd, known, None if known else "unknown_command")
+
+    def _spawn_command(self, data: Dict[str, Any]) -> None:
+        """Запускает команду конкурентно с остальными."""
+        task = asyncio.create_task(self._dispatch(data))
+        self._command_tasks.add(task)
+        task.add_done_callback(self._command_tasks.discard)
 
     async def _start_bot(self, data: Dict[str, Any]) -> None:
         """Регистрирует и запускает задачу бота."""
@@ -205,15 +471,85 @@ class BotWorker:
         ctx = BotContext(token_id=token_id, token=token, bot_file=bot_file)
         ctx.webhook_url = webhook_url
         ctx.webhook_port = webhook_port
+        ctx.webhook_secret = data.get("webhook_secret")
+        ctx.startup_t0 = data.get("_startup_t0")
+        ctx.startup_batch = data.get("_startup_batch")
         self.bots[token_id] = ctx
         ctx.task = asyncio.create_task(self._run_bot(ctx))
-        emit_log(token_id, f"Бот добавлен в воркер (project={PROJECT_ID})", "stdout")
+        emit_log(token_id, f"Бот добавлен в воркер (project={PROJECT_ID}, shard={WORKER_SHARD})", "stdout")
+
+    async def _start_bots(self, data: Dict[str, Any]) -> None:
+        """
+        Пакетный старт (restore): код всех ботов прогревается разом в пуле потоков
+        (одинаковые файлы компилируются один раз), затем каждый идёт обычным start_bot
+        в своей очереди token_id. Сетевую инициализацию ограничивают слоты _start_slots.
+        """
+        entries = [e for e in data.get("bots") or [] if isinstance(e, dict)]
+        if not entries:
+            return
+        self._start_batches += 1
+        batch = self._start_batches
+        t0 = time.perf_counter()
+        await self._prewarm_bot_code([e.get("bot_file") or "" for e in entries])
+
+        async def _start_one(entry: Dict[str, Any]) -> None:
+            cmd = {**entry, "cmd": "start_bot", "_startup_t0": t0, "_startup_batch": batch}
+            token_id = entry.get("token_id")
+            if token_id:
+                await self._serialized(token_id, cmd)
+            else:
+                await self._start_bot(cmd)
+
+        await asyncio.gather(*(_start_one(e) for e in entries), return_exceptions=True)
+
+    async def _prewarm_bot_code(self, bot_files: List[str]) -> None:
+        """Читает и компилирует bot.py и локальные модули пакета параллельно (в кэш кода)."""
+        loop = asyncio.get_running_loop()
+        paths = {Path(f) for f in bot_files if f}
+        jobs = [
+            loop.run_in_executor(_LOAD_POOL, _compile_bot_files, path)
+            for path in paths
+            if path.is_file()
+        ]
+        if jobs:
+            await asyncio.gather(*jobs, return_exceptions=True)
+
+    def _on_startup_done(self, timeline: startup_timeline.Timeline) -> None:
+        """Таймлайн старта закрыт: кадр startup для Node и сводка в лог бота."""
+        data = timeline.to_dict()
+        frame = {"type": "startup", "token_id": timeline.token_id, "data": data}
+        _transport.write_frame(json.dumps(frame, ensure_ascii=False))
+        if data["phases"]:
+            parts = " · ".join(f"{p['phase']} {p['ms']:.0f}" for p in data["phases"])
+            emit_log(
+                timeline.token_id,
+                f"Старт: {data['total_ms']:.0f} мс ({data['status']}) — {parts} мс; "
+                f"дольше всего: {data['slowest']}",
+                "stdout",
+            )
+
+    def _start_slot_releaser(self) -> Callable[..., None]:
+        """Однократное освобождение слота _start_slots (отметка, таймер или выход — что раньше)."""
+        released = False
+
+        def _release(*_args: Any) -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._start_slots.release()
+
+        return _release
 
     async def _run_bot(self, ctx: BotContext) -> None:
         """Загружает bot.py в изолированном namespace и вызывает main()."""
         token_id = ctx.token_id
         token_token = iso.current_token_id.set(token_id)
-        alias_prev: Dict[str, Any] = {}
+        env_token = None
+        timeline = startup_timeline.begin(token_id, ctx.startup_t0, ctx.startup_batch)
+        timeline.on_done(self._on_startup_done)
+        timeout_handle = asyncio.get_running_loop().call_later(
+            self._start_timeout_s, timeline.finish, "timeout"
+        )
 
         try:
             emit_log(token_id, "─── Начало загрузки бота ───", "stdout")
@@ -228,67 +564,43 @@ class BotWorker:
             ctx.bot_dir = bot_dir
             iso.install_bot_package(token_id, bot_dir)
 
-            main_stem = bot_path.stem
-            siblings = list(_SIBLING_PRIORITY)
-            for stem in iso.list_local_py_stems(bot_dir, exclude={main_stem, *siblings}):
-                siblings.append(stem)
-
-            async with iso.get_env_lock():
-                env_prev = iso.apply_bot_env(
-                    ctx.token, token_id, ctx.webhook_url, ctx.webhook_port
-                )
-                emit_log(token_id, f"Env: PROJECT_ID={PROJECT_ID}, TOKEN_ID={token_id}", "stdout")
-
-                loaded = iso.load_sibling_modules(token_id, bot_dir, siblings)
-                iso.apply_short_aliases(loaded, alias_prev)
-
-                def _bot_log(msg: str) -> None:
-                    emit_log(token_id, msg, "stdout")
-
-                compiled = bot_code_cache.load_bot_code(bot_path, _bot_log)
-
-                module = types.ModuleType(f"bot_{token_id}")
-                module.__file__ = str(bot_path)
-                module.__package__ = f"bot_{token_id}_pkg"
-
-                def patched_print(*args, **kwargs):
-                    content = " ".join(str(a) for a in args)
-                    emit_log(token_id, content, "stdout")
-
-                module.__builtins__ = {
-                    **(__builtins__ if isinstance(__builtins__, dict) else vars(__builtins__))
-                }
-                module.__builtins__["print"] = patched_print
-
-                emit_log(token_id, "Выполнение top-level кода бота...", "stdout")
-                t_exec = time.perf_counter()
-                exec(compiled, module.__dict__)
-                exec_ms = (time.perf_counter() - t_exec) * 1000
-                iso.inject_bot_constants(
-                    module, ctx.token, token_id, ctx.webhook_url, ctx.webhook_port
-                )
-                # Проставляем константы и в загруженные sibling-модули
-                for _name, smod in loaded.items():
-                    smod.__dict__["BOT_TOKEN"] = ctx.token
-                    smod.__dict__["TOKEN_ID"] = token_id
-                emit_log(token_id, f"Top-level код выполнен за {exec_ms:.0f} мс", "stdout")
-                ctx.module = module
-
-                iso.restore_short_aliases(alias_prev)
-                alias_prev = {}
-                iso.restore_env(env_prev)
+            # Per-bot env живёт в контексте задачи бота (и его дочерних задач)
+            env_token = iso.bind_bot_env(
+                ctx.token, token_id, ctx.webhook_url, ctx.webhook_port, ctx.webhook_secret
+            )
+            emit_log(token_id, f"Env: PROJECT_ID={PROJECT_ID}, TOKEN_ID={token_id}", "stdout")
+
+            # Снимок user_data прошлой остановки читается параллельно с загрузкой кода
+            snapshot_read = self._read_state_snapshot(token_id, bot_dir)
+            module = await self._load_bot_module(ctx, bot_path)
+            ctx.module = module
+            if snapshot_read is not None:
+                await self._restore_state_snapshot(token_id, module, snapshot_read)
+            # Апдейты через роутер с первого дня: reload_bot дождётся и тех, что начаты до него
+            if hasattr(getattr(module, "dp", None), "feed_update"):
+                ctx.update_router = hot_reload.UpdateRouter(module.dp)
 
             ctx.status = "running"
             ctx.started_at = datetime.now()
             emit_system(f"bot_started:{token_id}")
 
             if hasattr(module, "main"):
+                # Redis/БД/DDL/кэши/команды — не больше WORKER_START_CONCURRENCY ботов сразу;
+                # слот освобождается, когда main() дошёл до polling/set_webhook (или выход бота),
+                # но не позже WORKER_START_SLOT_HOLD_S. Бот без отметок старта — без слота.
+                if hasattr(module, "_startup_mark"):
+                    await self._start_slots.acquire()
+                    timeline.mark("queue")
+                    release_slot = self._start_slot_releaser()
+                    timeline.on_release(release_slot)
+                    asyncio.get_running_loop().call_later(self._start_slot_hold_s, release_slot)
                 emit_log(token_id, "Вызов main()...", "stdout")
                 await module.main()
                 emit_log(token_id, "main() завершился", "stdout")
                 # Старые bot.py глотали CancelledError → статус оставался running
                 if ctx.status == "running":
                     ctx.status = "stopped"
+                await self._save_state_snapshot(ctx)
             else:
                 emit_log(token_id, "Функция main() не найдена в bot.py", "stderr")
                 ctx.status = "error"
@@ -296,6 +608,7 @@ class BotWorker:
         except asyncio.CancelledError:
             emit_log(token_id, "Бот остановлен (CancelledError)", "stdout")
             ctx.status = "stopped"
+            await self._save_state_snapshot(ctx)
         except Exception as e:
             user_msg = format_bot_error(e)
             tb = traceback.format_exc()
@@ -304,14 +617,239 @@ class BotWorker:
             sys.stderr.flush()
             ctx.status = "error"
         finally:
-            if alias_prev:
-                iso.restore_short_aliases(alias_prev)
+            timeout_handle.cancel()
+            timeline.finish(ctx.status)
+            startup_timeline.forget(token_id, timeline)
             iso.cleanup_bot_modules(token_id, ctx.bot_dir)
+            worker_metrics.forget(token_id)
+            shared_db.forget(token_id)
+            shared_redis.forget(token_id)
+            shared_telegram.forget(token_id)
+            shared_webhook.forget(token_id)
+            shared_cache.forget(token_id)
+            log_control.forget(token_id)
+            log_limit.forget(token_id)
+            self._slow_stack_logged.pop(token_id, None)
             if token_id in self.bots and self.bots[token_id] is ctx:
                 del self.bots[token_id]
             emit_system(f"bot_exited:{token_id}:{ctx.status}")
+            if env_token is not None:
+                iso.reset_bot_env(env_token)
             iso.current_token_id.reset(token_token)
 
+    def _read_state_snapshot(self, token_id: int, bot_dir: Path) -> Optional[asyncio.Future]:
+        """Запускает чтение снимка user_data в пуле потоков (None — снимки выключены)."""
+        if not state_snapshot.enabled():
+            return None
+        path = state_snapshot.snapshot_path(token_id, bot_dir)
+        t0 = time.perf_counter()
+
+        def read() -> Any:
+            # Ошибка — значением: future может остаться без await, если загрузка кода упала
+            try:
+                return state_snapshot.read(path), (time.perf_counter() - t0) * 1000, None
+            except Exception as e:
+                return None, 0.0, e
+
+        return asyncio.get_running_loop().run_in_executor(_LOAD_POOL, read)
+
+    async def _restore_state_snapshot(
+        self, token_id: int, module: types.ModuleType, snapshot_read: asyncio.Future
+    ) -> None:
+        """Переносит прочитанный снимок в user_data до main(); ошибка снимка не мешает старту."""
+        snapshot, read_ms, error = await snapshot_read
+        if error is not None:
+            emit_log(token_id, f"⚠️ Снимок состояния пропущен: {error}", "stderr")
+            return
+        if snapshot is None:
+            return
+        age = time.time() - snapshot[2]
+        if age > state_snapshot.max_age_s():
+            emit_log(token_id, f"Снимок состояния пропущен: записан {age:.0f} с назад", "stdout")
+            return
+        restored = state_snapshot.restore(token_id, module, snapshot, read_ms)
+        emit_log(
+            token_id,
+            f"♻️ Состояние восстановлено: {restored} из {len(snapshot[0])} пользователей "
+            f"({snapshot[3]} байт, {read_ms:.0f} мс, простой {age:.0f} с)",
+            "stdout",
+        )
+
+    async def _save_state_snapshot(self, ctx: BotContext) -> None:
+        """Снимок user_data после штатной остановки бота (запись файла — в пуле потоков)."""
+        if ctx.module is None or ctx.bot_dir is None or not state_snapshot.enabled():
+            return
+        token_id = ctx.token_id
+        try:
+            t0 = time.perf_counter()
+            encoded = state_snapshot.save(token_id, ctx.module)
+            if encoded is None:
+                return
+            blob, users, skipped = encoded
+            path = state_snapshot.snapshot_path(token_id, ctx.bot_dir)
+            await asyncio.get_running_loop().run_in_executor(_LOAD_POOL, state_snapshot.write, path, blob)
+            save_ms = (time.perf_counter() - t0) * 1000
+            state_snapshot.record_save(token_id, users, skipped, len(blob), save_ms)
+            skipped_note = f", пропущено значений: {skipped}" if skipped else ""
+            emit_log(
+                token_id,
+                f"💾 Снимок состояния: {users} пользователей, {len(blob)} байт, {save_ms:.0f} мс{skipped_note}",
+                "stdout",
+            )
+        except Exception as e:
+            emit_log(token_id, f"⚠️ Снимок состояния не записан: {e}", "stderr")
+
+    async def _load_bot_module(self, ctx: BotContext, bot_path: Path) -> types.ModuleType:
+        """
+        Читает, компилирует и исполняет bot.py (и его локальные модули) в новом module.
+        Вызывается в контексте бота: current_token_id и per-bot env уже выставлены.
+        """
+        token_id = ctx.token_id
+        bot_dir = bot_path.parent
+        siblings = _sibling_names(bot_path)
+
+        # Чтение/разбор/marshal — в пуле потоков, loop свободен для соседей
+        load_log: List[str] = []
+        loop = asyncio.get_running_loop()
+        sibling_code = await loop.run_in_executor(
+            _LOAD_POOL, iso.compile_sibling_modules, bot_dir, siblings
+        )
+        compiled = await loop.run_in_executor(
+            _LOAD_POOL, bot_code_cache.load_bot_code, bot_path, load_log.append
+        )
+        for msg in load_log:
+            emit_log(token_id, msg, "stdout")
+        startup_timeline.mark("import", token_id)
+
+        # exec без await: короткие алиасы sys.modules видны только этому боту
+        alias_prev: Dict[str, Any] = {}
+        try:
+            loaded = iso.exec_sibling_modules(token_id, sibling_code)
+            iso.apply_short_aliases(loaded, alias_prev)
+
+            module = types.ModuleType(f"bot_{token_id}")
+            module.__file__ = str(bot_path)
+            module.__package__ = f"bot_{token_id}_pkg"
+
+            def patched_print(*args, **kwargs):
+                if not log_limit.allow(token_id):
+                    return
+                content = " ".join(str(a) for a in args)
+                emit_log(token_id, content, "stdout")
+
+            module.__builtins__ = {
+                **(__builtins__ if isinstance(__builtins__, dict) else vars(__builtins__))
+            }
+            module.__builtins__["print"] = patched_print
+            # Bot(session=WORKER_BOT_SESSION) в сгенерированном коде — общий HTTP-пул Telegram
+            tg_session = shared_telegram.session_for(token_id)
+            if tg_session is not None:
+                module.__dict__["WORKER_BOT_SESSION"] = tg_session
+            # Webhook-бот регистрируется в общем сервере воркера вместо своего порта
+            webhook_router = shared_webhook.get_router() if ctx.webhook_url else None
+            if webhook_router is not None:
+                module.__dict__["WORKER_WEBHOOK_ROUTER"] = webhook_router
+            # Bot Tables, контент и file_id — общие наборы проекта вместо копии на бота
+            project_cache = shared_cache.get_cache()
+            if project_cache is not None:
+                module.__dict__["WORKER_PROJECT_CACHE"] = project_cache
+            # _startup_mark("redis"/"db"/…) в main() бота — этапы таймлайна старта
+            module.__dict__["WORKER_STARTUP_MARK"] = startup_timeline.mark
+            # (rate, burst) лимита логов бота — им же ограничен _RedisLogHandler
+            module.__dict__["WORKER_LOG_LIMITS"] = log_limit.limits_for
+
+            def report_role(role: str, fence: int = 0) -> None:
+                ctx.role = role
+                ctx.fence = int(fence or 0)
+                emit_system(f"bot_role:{token_id}:{role}:{ctx.fence}")
+
+            # _bot_role("leader", fence) / _bot_role("standby") из main() — роль по Redis lease
+            module.__dict__["WORKER_BOT_ROLE"] = report_role
+
+            emit_log(token_id, "Выполнение top-level кода бота...", "stdout")
+            t_exec = time.perf_counter()
+            exec(compiled, module.__dict__)
+            exec_ms = (time.perf_counter() - t_exec) * 1000
+            iso.inject_bot_constants(
+                module, ctx.token, token_id, ctx.webhook_url, ctx.webhook_port
+            )
+            # Проставляем константы и в загруженные sibling-модули
+            for _name, smod in loaded.items():
+                smod.__dict__["BOT_TOKEN"] = ctx.token
+                smod.__dict__["TOKEN_ID"] = token_id
+            emit_log(token_id, f"Top-level код выполнен за {exec_ms:.0f} мс", "stdout")
+            startup_timeline.mark("exec", token_id)
+            return module
+        finally:
+            if alias_prev:
+                iso.restore_short_aliases(alias_prev)
+
+    async def _reload_bot(self, data: Dict[str, Any]) -> None:
+        """
+        Горячая замена кода: новая версия грузится рядом со старой, забирает её ресурсы
+        (_hot_reload_adopt), апдейты переключаются на новый dp, старые доигрывают.
+        Polling, Redis lock и пул БД не пересоздаются. Если бот не запущен или код
+        не поддерживает горячую замену — обычный перезапуск.
+        """
+        token_id = data.get("token_id")
+        ctx = self.bots.get(token_id) if token_id else None
+        old = ctx.module if ctx is not None else None
+        if ctx is None or old is None or ctx.status != "running":
+            await self._start_bot(data)
+            return
+        if ctx.update_router is None:
+            emit_log(token_id, "Горячая замена недоступна (нет dp) — перезапуск", "stdout")
+            await self._start_bot({**data, "token": data.get("token") or ctx.token})
+            return
+
+        bot_path = Path(data.get("bot_file") or ctx.bot_file)
+        if not bot_path.exists():
+            emit_log(token_id, f"Файл не найден: {bot_path}", "stderr")
+            return
+        t0 = time.perf_counter()
+        emit_log(token_id, "─── Горячая замена кода бота ───", "stdout")
+
+        tid_token = iso.current_token_id.set(token_id)
+        env_token = iso.bind_bot_env(
+            ctx.token, token_id, ctx.webhook_url, ctx.webhook_port, ctx.webhook_secret
+        )
+        try:
+            try:
+                module = await self._load_bot_module(ctx, bot_path)
+                adopt = getattr(module, "_hot_reload_adopt", None)
+                if adopt is None:
+                    raise RuntimeError("код бота собран без _hot_reload_adopt")
+                await adopt(old)
+            except Exception as e:
+                emit_log(token_id, f"Горячая замена не удалась, работает прежняя версия: {e}", "stderr")
+                emit_system(f"bot_reload_failed:{token_id}")
+                raise
+
+            router = ctx.update_router
+            # Без await между этими строками: апдейты видят либо старый, либо новый код
+            previous = router.switch(module.dp)
+            ctx.module = module
+            ctx.bot_file = str(bot_path)
+            switch_ms = (time.perf_counter() - t0) * 1000
+            emit_log(
+                token_id,
+                f"Новый код принимает апдейты через {switch_ms:.0f} мс, "
+                f"на старом доигрывают: {router.inflight(previous)}",
+                "stdout",
+            )
+            emit_system(f"bot_reloaded:{token_id}")
+
+            if not await router.drain(previous, _RELOAD_DRAIN_TIMEOUT_S):
+                emit_log(
+                    token_id,
+                    f"Старые обработчики не завершились за {_RELOAD_DRAIN_TIMEOUT_S:.0f}с: "
+                    f"{router.inflight(previous)} апдейтов ещё выполняются",
+                    "stderr",
+                )
+        finally:
+            iso.reset_bot_env(env_token)
+            iso.current_token_id.reset(tid_token)
+
     async def _stop_bot(self, data: Dict[str, Any]) -> None:
         """Останавливает бота: сначала graceful request_bot_stop, затем cancel."""
         token_id = data.get("token_id")
@@ -359,16 +897,88 @@ class BotWorker:
         emit_log(token_id, "Бот остановлен", "stdout")
         emit_system(f"bot_stopped:{token_id}")
 
-    def _emit_status(self) -> None:
+    def _set_log_level(self, data: Dict[str, Any]) -> None:
+        """Уровень логов бота (token_id) или всех ботов воркера; ошибка → reply ok=false."""
+        log_control.set_level(
+            int(data.get("token_id") or 0),
+            data.get("level"),
+            logger=data.get("logger") or None,
+            sample=data.get("sample"),
+        )
+
+    def _set_log_limit(self, data: Dict[str, Any]) -> None:
+        """Лимит строк лога бота (token_id) или всех ботов воркера; rate=null — сброс."""
+        log_limit.set_limit(int(data.get("token_id") or 0), data.get("rate"), data.get("burst"))
+
+    async def _flush_log_summaries(self) -> None:
+        """Раз в WORKER_LOG_SUMMARY_S: «пропущено N строк» по ботам, упёршимся в лимит."""
+        while True:
+            await asyncio.sleep(log_limit.summary_interval_s)
+            log_limit.flush()
+
+    def _emit_status(self, req_id: Any = None) -> None:
         """Статус всех ботов."""
         status = {
             "project_id": PROJECT_ID,
+            "shard": WORKER_SHARD,
+            "event_loop": EVENT_LOOP,
             "bots_count": len(self.bots),
             "bots": [ctx.to_dict() for ctx in self.bots.values()],
+            "log_transport": _transport.stats(),
+            "code_cache": bot_code_cache.cache_stats(),
+            "loop": worker_metrics.loop_summary(),
+            "db_pools": shared_db.pools_stats(),
+            "redis": shared_redis.stats(),
+            "telegram": shared_telegram.stats(),
+            "webhook": shared_webhook.stats(),
+            "project_cache": shared_cache.stats(),
+            "logging": log_control.stats(),
+            "log_limit": log_limit.stats(),
+            "state_snapshot": state_snapshot.stats(),
         }
-        line = json.dumps({"type": "status", "data": status}, ensure_ascii=False)
-        sys.stdout.write(line + "\n")
-        sys.stdout.flush()
+        frame: Dict[str, Any] = {"type": "status", "data": status}
+        if req_id is not None:
+            frame["req_id"] = req_id
+        line = json.dumps(frame, ensure_ascii=False)
+        _transport.write_frame(line)
+
+    async def _emit_metrics(self, req_id: Any = None) -> None:
+        """
+        Нагрузка по ботам: доля wall-времени loop с прошлого metrics, задачи, память
+        (свежий снимок tracemalloc, если включён), lag loop и CPU процесса.
+        """
+        bot_dirs = [(tid, ctx.bot_dir) for tid, ctx in self.bots.items()]
+        loop = asyncio.get_running_loop()
+        memory_sampled = await loop.run_in_executor(None, worker_metrics.sample_memory, bot_dirs)
+        window_s, shares = worker_metrics.take_window()
+        bots = []
+        for tid, ctx in self.bots.items():
+            bots.append({
+                "token_id": tid,
+                "status": ctx.status,
+                "loop_share": round(shares.get(tid, 0.0), 4),
+                **worker_metrics.bot_summary(tid),
+                "db": shared_db.bot_stats(tid),
+                "telegram": shared_telegram.bot_stats(tid),
+            })
+        data = {
+            "project_id": PROJECT_ID,
+            "shard": WORKER_SHARD,
+            "event_loop": EVENT_LOOP,
+            "window_s": round(window_s, 1),
+            "loop_busy": round(min(1.0, sum(shares.values())), 4),
+            "worker_loop_share": round(shares.get(0, 0.0), 4),
+            "memory_sampled": memory_sampled,
+            "loop": worker_metrics.loop_summary(),
+            "process": worker_metrics.process_summary(),
+            "db_pools": shared_db.pools_stats(),
+            "telegram": shared_telegram.stats(),
+            "bots": bots,
+        }
+        frame: Dict[str, Any] = {"type": "metrics", "data": data}
+        if req_id is not None:
+            frame["req_id"] = req_id
+        _transport.write_frame(json.dumps(frame, ensure_ascii=False))
 
     async def _shutdown(self) -> None:
         """Останавливает все боты."""
@@ -379,50 +989,88 @@ class BotWorker:
         self._shutdown_event.set()
 
     async def run(self) -> None:
-        """Главный цикл: stdin → команды."""
+        """Главный цикл: stdin → команды (каждая — своя задача)."""
+        worker_metrics.install()
+        stdin = _StdinLines()
+        await stdin.open()
         emit_system("worker_ready")
-        loop = asyncio.get_event_loop()
-        stdin_queue: asyncio.Queue = asyncio.Queue()
-
-        def _stdin_reader():
-            try:
-                for line in sys.stdin:
-                    loop.call_soon_threadsafe(stdin_queue.put_nowait, line.strip())
-            except (EOFError, OSError):
-                pass
-            finally:
-                loop.call_soon_threadsafe(stdin_queue.put_nowait, None)
-
-        import threading
-
-        threading.Thread(target=_stdin_reader, daemon=True).start()
+        shutdown_wait = asyncio.create_task(self._shutdown_event.wait())
+        log_summaries = asyncio.create_task(self._flush_log_summaries())
 
         while not self._shutdown_event.is_set():
+            read = asyncio.create_task(stdin.readline())
             try:
-                line_str = await asyncio.wait_for(stdin_queue.get(), timeout=1.0)
-                if line_str is None:
-                    emit_system("stdin_closed")
+                await asyncio.wait({read, shutdown_wait}, return_when=asyncio.FIRST_COMPLETED)
+                if not read.done():
+                    read.cancel()
                     break
-                if not line_str:
-                    continue
-                try:
-                    data = json.loads(line_str)
-                    await self.handle_command(data)
-                except json.JSONDecodeError as e:
-                    emit_system(f"json_error: {e}")
-            except asyncio.TimeoutError:
-                continue
+                line_str = read.result()
             except Exception as e:
                 emit_system(f"read_error: {e}")
                 break
+            if line_str is None:
+                emit_system("stdin_closed")
+                break
+            if not line_str:
+                continue
+            try:
+                data = json.loads(line_str)
+            except json.JSONDecodeError as e:
+                emit_system(f"json_error: {e}")
+                continue
+            if not isinstance(data, dict):
+                emit_system("json_error: ожидался объект")
+                continue
+            self._spawn_command(data)
 
+        shutdown_wait.cancel()
+        if self._command_tasks:
+            await asyncio.gather(*list(self._command_tasks), return_exceptions=True)
         if self.bots:
             await self._shutdown()
+        await shared_db.close_all()
+        await shared_redis.close_all()
+        await shared_telegram.close_all()
+        await shared_webhook.close_all()
+        await shared_cache.close_all()
+        log_summaries.cancel()
+        log_limit.flush()
         emit_system("worker_exited")
 
 
+def _read_identity() -> None:
+    """PROJECT_ID/WORKER_SHARD из env: в zygote-режиме env задаётся уже после import."""
+    global PROJECT_ID, WORKER_SHARD
+    PROJECT_ID = int(os.environ.get("PROJECT_ID", "0"))
+    WORKER_SHARD = int(os.environ.get("WORKER_SHARD", "0"))
+
+
+def _select_event_loop() -> str:
+    """
+    WORKER_EVENT_LOOP=uvloop — uvloop вместо стандартного loop (только POSIX).
+    Если uvloop не установлен, остаёмся на asyncio и пишем об этом в stderr.
+    """
+    mode = os.environ.get("WORKER_EVENT_LOOP", "asyncio").strip().lower()
+    if mode != "uvloop":
+        return "asyncio"
+    if sys.platform == "win32":
+        sys.stderr.write("[worker] uvloop недоступен на Windows — стандартный asyncio loop\n")
+        return "asyncio"
+    try:
+        import uvloop
+    except ImportError:
+        sys.stderr.write("[worker] uvloop не установлен — стандартный asyncio loop\n")
+        return "asyncio"
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return "uvloop"
+
+
 def main():
     """Точка входа воркера."""
+    global _transport, EVENT_LOOP
+    _read_identity()
+    EVENT_LOOP = _select_event_loop()
+    _transport = log_transport.create_transport()
     if sys.platform == "win32":
         sys.stdout = open(sys.stdout.fileno(), mode="w", encoding="utf-8", buffering=1, closefd=False)
         sys.stderr = open(sys.stderr.fileno(), mode="w", encoding="utf-8", buffering=1, closefd=False)
@@ -435,7 +1083,11 @@ def main():
     # Один раз на процесс воркера: боты не регистрируют свои signal_handler
     signal.signal = lambda *args, **kwargs: None  # type: ignore[method-assign]
 
-    asyncio.run(BotWorker().run())
+    try:
+        asyncio.run(BotWorker().run())
+    finally:
+        worker_metrics.uninstall()
+        _transport.close()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,9 @@
 """
-Изоляция ботов внутри worker-процесса: contextvars, уникальные модули, env-lock.
+Изоляция ботов внутри worker-процесса: contextvars, уникальные модули, env-view.
+
+os.environ подменяется на ContextEnviron: BOT_TOKEN/TOKEN_ID/WEBHOOK_* читаются из
+contextvar текущей задачи бота, глобальный словарь не меняется — загрузка ботов
+не требует общего lock и идёт параллельно.
 
 Контракт system-событий (stdout JSON type=system):
   worker_ready | bot_started:{token_id} | bot_exited:{token_id}:{status}
@@ -13,26 +17,97 @@ import importlib.util
 import os
 import sys
 import types
+from collections.abc import MutableMapping
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Set
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import bot_code_cache
 
 # Текущий token_id для root-logger (на задачу asyncio)
 current_token_id: contextvars.ContextVar[int] = contextvars.ContextVar(
     "worker_current_token_id", default=0
 )
 
-# Сериализация мутаций os.environ при загрузке бота
-_env_lock = None
+# Per-bot env поверх os.environ; None в значении = переменная «удалена» для бота
+current_bot_env: contextvars.ContextVar[Optional[Dict[str, Optional[str]]]] = (
+    contextvars.ContextVar("worker_current_bot_env", default=None)
+)
 
+# Ключи, которые всегда берутся из per-bot env
+BOT_ENV_KEYS = ("BOT_TOKEN", "TOKEN_ID", "WEBHOOK_URL", "WEBHOOK_PORT", "WEBHOOK_SECRET_TOKEN")
 
-def get_env_lock():
-    """Ленивый asyncio.Lock для подмены env при exec."""
-    global _env_lock
-    import asyncio
 
-    if _env_lock is None:
-        _env_lock = asyncio.Lock()
-    return _env_lock
+class ContextEnviron(MutableMapping):
+    """
+    Представление os.environ с per-bot слоем из contextvar.
+    Вне задачи бота ведёт себя как исходный os.environ.
+    """
+
+    def __init__(self, base: MutableMapping):
+        self._base = base
+
+    @property
+    def base(self) -> MutableMapping:
+        """Исходный process-wide os.environ."""
+        return self._base
+
+    def __getitem__(self, key: str) -> str:
+        overlay = current_bot_env.get()
+        if overlay is not None and key in overlay:
+            value = overlay[key]
+            if value is None:
+                raise KeyError(key)
+            return value
+        return self._base[key]
+
+    def __setitem__(self, key: str, value: str) -> None:
+        overlay = current_bot_env.get()
+        if overlay is not None and key in overlay:
+            overlay[key] = value
+            return
+        self._base[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        overlay = current_bot_env.get()
+        if overlay is not None and key in overlay:
+            if overlay[key] is None:
+                raise KeyError(key)
+            overlay[key] = None
+            return
+        del self._base[key]
+
+    def __iter__(self) -> Iterator[str]:
+        overlay = current_bot_env.get()
+        if overlay is None:
+            yield from self._base
+            return
+        for key in self._base:
+            if key not in overlay:
+                yield key
+        for key, value in overlay.items():
+            if value is not None:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key: object) -> bool:
+        overlay = current_bot_env.get()
+        if overlay is not None and key in overlay:
+            return overlay[key] is not None  # type: ignore[index]
+        return key in self._base
+
+    def copy(self) -> Dict[str, str]:
+        return dict(self)
+
+    def __repr__(self) -> str:
+        return f"ContextEnviron({dict(self)!r})"
+
+
+def install_env_view() -> None:
+    """Один раз на процесс: os.environ → ContextEnviron (os.getenv читает через него)."""
+    if not isinstance(os.environ, ContextEnviron):
+        os.environ = ContextEnviron(os.environ)  # type: ignore[assignment]
 
 
 def module_prefix(token_id: int) -> str:
@@ -55,27 +130,41 @@ def install_bot_package(token_id: int, bot_dir: Path) -> str:
     return pkg_name
 
 
-def load_sibling_modules(token_id: int, bot_dir: Path, names: Iterable[str]) -> Dict[str, Any]:
+def compile_sibling_modules(bot_dir: Path, names: Iterable[str]) -> List[Tuple[str, Path, Any]]:
     """
-    Грузит локальные модули (config, utils, …) под уникальными именами
-    и кладёт алиасы коротких имён только на время exec через sys.modules snapshot.
-    @returns карта short_name → module
+    Компилирует локальные модули (config, utils, …) без exec — безопасно в потоке.
+    Код берётся из общего bot_code_cache (одинаковые модули разных ботов — один compile).
+    @returns список (short_name, path, code) в порядке names
     """
-    loaded: Dict[str, Any] = {}
-    prefix = module_prefix(token_id)
+    compiled: List[Tuple[str, Path, Any]] = []
     for name in names:
         path = bot_dir / f"{name}.py"
         if not path.is_file():
             continue
+        compiled.append((name, path, bot_code_cache.load_code(path, _quiet)))
+    return compiled
+
+
+def _quiet(_msg: str) -> None:
+    """Лог загрузки sibling-модулей не пишем — их много и они однотипны."""
+
+
+def exec_sibling_modules(token_id: int, compiled: Iterable[Tuple[str, Path, Any]]) -> Dict[str, Any]:
+    """
+    Исполняет скомпилированные локальные модули под уникальными именами bot_{id}_*.
+    Короткие алиасы ставит вызывающий через apply_short_aliases только на время exec.
+    @returns карта short_name → module
+    """
+    loaded: Dict[str, Any] = {}
+    prefix = module_prefix(token_id)
+    for name, path, code in compiled:
         unique = f"{prefix}{name}"
         spec = importlib.util.spec_from_file_location(unique, path)
-        if spec is None or spec.loader is None:
+        if spec is None:
             continue
         mod = importlib.util.module_from_spec(spec)
         sys.modules[unique] = mod
-        # Короткое имя — чтобы `import config` в bot.py резолвился в наш модуль
-        # Сохраняем предыдущий и восстановим после exec
-        spec.loader.exec_module(mod)
+        exec(code, mod.__dict__)
         loaded[name] = mod
     return loaded
 
@@ -109,30 +198,30 @@ def cleanup_bot_modules(token_id: int, bot_dir: Optional[Path] = None) -> None:
             sys.path.remove(bot_dir_s)
 
 
-def apply_bot_env(token: str, token_id: int, webhook_url: Optional[str], webhook_port: Optional[int]) -> Dict[str, Optional[str]]:
+def bind_bot_env(
+    token: str,
+    token_id: int,
+    webhook_url: Optional[str],
+    webhook_port: Optional[int],
+    webhook_secret: Optional[str] = None,
+) -> contextvars.Token:
     """
-    Пишет per-bot env. Возвращает снимок прежних значений для restore.
+    Ставит per-bot env в контекст текущей задачи (и всех задач, созданных из неё).
+    @returns токен contextvar для reset_bot_env
     """
-    keys = ("BOT_TOKEN", "TOKEN_ID", "WEBHOOK_URL", "WEBHOOK_PORT")
-    prev = {k: os.environ.get(k) for k in keys}
-    os.environ["BOT_TOKEN"] = token
-    os.environ["TOKEN_ID"] = str(token_id)
+    overlay: Dict[str, Optional[str]] = dict.fromkeys(BOT_ENV_KEYS)
+    overlay["BOT_TOKEN"] = token
+    overlay["TOKEN_ID"] = str(token_id)
     if webhook_url:
-        os.environ["WEBHOOK_URL"] = webhook_url
-        os.environ["WEBHOOK_PORT"] = str(webhook_port or (9000 + token_id))
-    else:
-        os.environ.pop("WEBHOOK_URL", None)
-        os.environ.pop("WEBHOOK_PORT", None)
-    return prev
-
-
-def restore_env(prev: Dict[str, Optional[str]]) -> None:
-    """Откатывает env к снимку."""
-    for k, v in prev.items():
-        if v is None:
-            os.environ.pop(k, None)
-        else:
-            os.environ[k] = v
+        overlay["WEBHOOK_URL"] = webhook_url
+        overlay["WEBHOOK_PORT"] = str(webhook_port or (9000 + token_id))
+        overlay["WEBHOOK_SECRET_TOKEN"] = webhook_secret or None
+    return current_bot_env.set(overlay)
+
+
+def reset_bot_env(token: contextvars.Token) -> None:
+    """Снимает per-bot env, поставленный bind_bot_env."""
+    current_bot_env.reset(token)
 
 
 def inject_bot_constants(
@@ -0,0 +1,302 @@
+"""
+Учёт нагрузки ботов внутри общего event loop воркера.
+
+  - время loop по token_id: обёртка asyncio.Handle._run берёт iso.current_token_id
+    из контекста колбэка (задачи бота и их дочерние задачи наследуют контекст);
+  - задачи по token_id: task factory считает созданные и живые задачи;
+  - lag loop: фоновая задача спит WORKER_LAG_INTERVAL_MS и меряет опоздание
+    пробуждения, p50/p99 — по скользящему окну последних замеров;
+  - память: tracemalloc (WORKER_TRACEMALLOC=true) — аллокации из файлов каталога бота;
+  - watchdog: колбэк дольше WORKER_SLOW_CALLBACK_MS отдаётся в on_slow_callback вместе
+    со стеком, который поток-сторож снял с loop, пока колбэк ещё выполнялся.
+
+WORKER_METRICS=false отключает инструментирование loop (lag, задачи и watchdog тоже).
+На uvloop колбэки идут мимо asyncio.Handle: время по ботам и watchdog недоступны,
+lag и задачи считаются как обычно.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import traceback
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+import worker_isolation as iso
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+# Сколько замеров lag держать (при 100 мс — последняя минута)
+_LAG_WINDOW = 600
+
+_orig_handle_run = asyncio.events.Handle._run
+_installed = False
+# Обёртка Handle._run действует (loop на базе asyncio.BaseEventLoop)
+_callbacks_tracked = False
+
+# token_id → [время колбэков (с), число колбэков]; 0 — сам воркер
+_busy: Dict[int, List[float]] = {}
+# Окно для долей CPU: сбрасывается командой metrics
+_window_busy: Dict[int, float] = {}
+_window_started = time.monotonic()
+_tasks_live: Dict[int, int] = {}
+_tasks_created: Dict[int, int] = {}
+_lag_ms: Deque[float] = collections.deque(maxlen=_LAG_WINDOW)
+_lag_task: Optional[asyncio.Task] = None
+# token_id → КБ по последнему снимку tracemalloc
+_memory_kb: Dict[int, float] = {}
+
+# Watchdog: бюджет колбэка (с), текущий колбэк (seq, token_id, старт) и снятые стеки
+SlowCallbackHook = Callable[[int, float, str], None]
+on_slow_callback: Optional[SlowCallbackHook] = None
+_slow_budget = 0.0
+_seq = 0
+_running: Optional[Tuple[int, int, float]] = None
+_stack_samples: Dict[int, str] = {}
+_slow_counts: Dict[int, int] = {}
+_loop_thread_id = 0
+_watchdog_stop = threading.Event()
+# Кадров стека в сэмпле (ближайшие к месту блокировки)
+_STACK_DEPTH = 8
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__) + os.sep
+
+
+def enabled() -> bool:
+    return os.environ.get("WORKER_METRICS", "true").lower() != "false"
+
+
+def _timed_run(self: asyncio.Handle) -> None:
+    """Handle._run с учётом времени колбэка на token_id его контекста."""
+    global _seq, _running
+    tid = self._context.get(iso.current_token_id, 0)
+    _seq += 1
+    seq = _seq
+    t0 = time.perf_counter()
+    _running = (seq, tid, t0)
+    try:
+        _orig_handle_run(self)
+    finally:
+        dt = time.perf_counter() - t0
+        _running = None
+        acc = _busy.get(tid)
+        if acc is None:
+            _busy[tid] = [dt, 1]
+        else:
+            acc[0] += dt
+            acc[1] += 1
+        _window_busy[tid] = _window_busy.get(tid, 0.0) + dt
+        if _slow_budget and dt >= _slow_budget:
+            _report_slow(self, tid, dt, _stack_samples.pop(seq, None))
+        elif _stack_samples:
+            _stack_samples.pop(seq, None)
+
+
+def _report_slow(handle: asyncio.Handle, tid: int, dt: float, stack: Optional[str]) -> None:
+    _slow_counts[tid] = _slow_counts.get(tid, 0) + 1
+    hook = on_slow_callback
+    if hook is None:
+        return
+    if stack is None:
+        # Колбэк держал GIL целиком (json.dumps, C-код) — сторож не успел, берём сам колбэк
+        stack = f"  {handle!r}"
+    try:
+        hook(tid, dt * 1000, stack)
+    except Exception:
+        pass
+
+
+def _watchdog_main(budget: float) -> None:
+    """Поток-сторож: снимает стек loop с колбэка, который дольше бюджета."""
+    period = max(0.005, budget / 2)
+    while not _watchdog_stop.wait(period):
+        current = _running
+        if current is None:
+            continue
+        seq, _tid, t0 = current
+        if seq in _stack_samples or time.perf_counter() - t0 < budget:
+            continue
+        frame = sys._current_frames().get(_loop_thread_id)
+        if frame is None:
+            continue
+        # Кадры самого loop (asyncio, эта обёртка) — шум: оставляем код колбэка
+        summary = traceback.extract_stack(frame)
+        start = 0
+        for i, fs in enumerate(summary):
+            if fs.filename.startswith(_ASYNCIO_DIR) or fs.filename == __file__:
+                start = i + 1
+        lines = traceback.format_list(summary[start:][-_STACK_DEPTH:] or summary[-_STACK_DEPTH:])
+        # Колбэк мог завершиться, пока снимали стек
+        if _running is not None and _running[0] == seq:
+            _stack_samples[seq] = "".join(lines).rstrip()
+
+
+def _task_done(tid: int):
+    def _done(_task: asyncio.Task) -> None:
+        left = _tasks_live.get(tid, 0)
+        if left > 0:
+            _tasks_live[tid] = left - 1
+
+    return _done
+
+
+def _task_factory(loop: asyncio.AbstractEventLoop, coro, context=None, **kwargs) -> asyncio.Task:
+    """
+    Создаёт задачу и относит её к token_id контекста создания.
+    С Python 3.13.3 loop.create_task передаёт фабрике name= и др. — они уходят в Task.
+    """
+    task = asyncio.Task(coro, loop=loop, context=context, **kwargs)
+    tid = (context.get(iso.current_token_id, 0) if context is not None
+           else iso.current_token_id.get())
+    _tasks_created[tid] = _tasks_created.get(tid, 0) + 1
+    _tasks_live[tid] = _tasks_live.get(tid, 0) + 1
+    task.add_done_callback(_task_done(tid))
+    return task
+
+
+async def _lag_sampler(interval: float) -> None:
+    """Опоздание пробуждения после sleep(interval) = задержка loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        _lag_ms.append(max(0.0, (loop.time() - t0 - interval) * 1000))
+
+
+def install() -> None:
+    """Включает учёт в текущем loop (вызывать из работающего loop)."""
+    global _installed, _lag_task, _window_started, _slow_budget, _loop_thread_id, _callbacks_tracked
+    if not enabled() or _installed:
+        return
+    _installed = True
+    loop = asyncio.get_running_loop()
+    _callbacks_tracked = isinstance(loop, asyncio.BaseEventLoop)
+    if _callbacks_tracked:
+        asyncio.events.Handle._run = _timed_run  # type: ignore[method-assign]
+        _slow_budget = max(0, int(os.environ.get("WORKER_SLOW_CALLBACK_MS", "200"))) / 1000
+    if _slow_budget:
+        _loop_thread_id = threading.get_ident()
+        _watchdog_stop.clear()
+        threading.Thread(
+            target=_watchdog_main, args=(_slow_budget,), name="worker-loop-watchdog", daemon=True
+        ).start()
+    loop.set_task_factory(_task_factory)
+    _window_started = time.monotonic()
+    if os.environ.get("WORKER_TRACEMALLOC", "false").lower() == "true" and not tracemalloc.is_tracing():
+        tracemalloc.start(1)
+    interval = max(10, int(os.environ.get("WORKER_LAG_INTERVAL_MS", "100"))) / 1000
+    _lag_task = loop.create_task(_lag_sampler(interval))
+
+
+def uninstall() -> None:
+    """Снимает инструментирование (в конце main воркера)."""
+    global _installed, _lag_task
+    if not _installed:
+        return
+    _installed = False
+    asyncio.events.Handle._run = _orig_handle_run  # type: ignore[method-assign]
+    _watchdog_stop.set()
+    if _lag_task is not None:
+        _lag_task.cancel()
+        _lag_task = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def forget(token_id: int) -> None:
+    """Сбрасывает счётчики бота после его выхода (живые задачи досчитаются сами)."""
+    _busy.pop(token_id, None)
+    _window_busy.pop(token_id, None)
+    _tasks_created.pop(token_id, None)
+    _memory_kb.pop(token_id, None)
+    _slow_counts.pop(token_id, None)
+    if not _tasks_live.get(token_id):
+        _tasks_live.pop(token_id, None)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return round(ordered[idx], 2)
+
+
+def loop_summary() -> Dict[str, Any]:
+    """Lag loop и общее время колбэков (для status и metrics)."""
+    samples = list(_lag_ms)
+    return {
+        "enabled": _installed,
+        "callbacks_tracked": _callbacks_tracked,
+        "lag_p50_ms": _percentile(samples, 0.50),
+        "lag_p99_ms": _percentile(samples, 0.99),
+        "lag_max_ms": round(max(samples), 2) if samples else None,
+        "lag_samples": len(samples),
+        "busy_ms": round(sum(v[0] for v in _busy.values()) * 1000, 1),
+        "tasks_live": sum(_tasks_live.values()),
+        "slow_callback_ms": round(_slow_budget * 1000) or None,
+    }
+
+
+def bot_summary(token_id: int) -> Dict[str, Any]:
+    """Счётчики одного бота (поля для BotContext.to_dict)."""
+    acc = _busy.get(token_id)
+    return {
+        "loop_ms": round(acc[0] * 1000, 1) if acc else 0.0,
+        "callbacks": int(acc[1]) if acc else 0,
+        "tasks_live": _tasks_live.get(token_id, 0),
+        "tasks_created": _tasks_created.get(token_id, 0),
+        "memory_kb": _memory_kb.get(token_id),
+        "slow_callbacks": _slow_counts.get(token_id, 0),
+    }
+
+
+def sample_memory(bot_dirs: Iterable[Tuple[int, Optional[Path]]]) -> bool:
+    """
+    Снимок tracemalloc → КБ по каталогам ботов (аллокации кода самого бота,
+    не aiogram внутри его вызовов). Тяжёлый — вызывать из потока. False — выключен.
+    """
+    if not tracemalloc.is_tracing():
+        return False
+    prefixes = [(tid, str(d) + os.sep) for tid, d in bot_dirs if d is not None]
+    totals: Dict[int, int] = {tid: 0 for tid, _ in prefixes}
+    snapshot = tracemalloc.take_snapshot()
+    for stat in snapshot.statistics("filename"):
+        filename = stat.traceback[0].filename
+        for tid, prefix in prefixes:
+            if filename.startswith(prefix):
+                totals[tid] += stat.size
+                break
+    _memory_kb.clear()
+    _memory_kb.update({tid: round(size / 1024, 1) for tid, size in totals.items()})
+    return True
+
+
+def process_summary() -> Dict[str, Any]:
+    """CPU процесса и пиковый RSS."""
+    rss_kb = None
+    if resource is not None:
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"cpu_ms": round(time.process_time() * 1000, 1), "max_rss_kb": rss_kb}
+
+
+def take_window() -> Tuple[float, Dict[int, float]]:
+    """
+    Доли wall-времени окна, которые loop был занят колбэками token_id (0..1, сумма —
+    загрузка loop), и длина окна в секундах. Окно сбрасывается.
+    """
+    global _window_started
+    now = time.monotonic()
+    window_s = now - _window_started
+    shares = {tid: (min(1.0, v / window_s) if window_s > 0 else 0.0) for tid, v in _window_busy.items()}
+    _window_busy.clear()
+    _window_started = now
+    return window_s, shares
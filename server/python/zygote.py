@@ -0,0 +1,192 @@
+"""
+Zygote — долгоживущий Python-процесс с заранее импортированными тяжёлыми модулями.
+По команде делает fork() и превращает ребёнка в готовый worker.py: холодный старт
+проекта и восстановление после падения воркера без повторного import aiogram & co.
+
+Протокол (JSON-строки):
+  stdin  → {"cmd": "fork", "socket": "/tmp/x.sock", "env": {"PROJECT_ID": "12", ...}}
+  stdin  → {"cmd": "import_times"}
+  stdout ← {"type": "zygote_ready", "imports": {"aiogram": 812.4, ...}, "total_ms": 1490.2}
+  stdout ← {"type": "forked", "socket": "...", "pid": 123}
+  stdout ← {"type": "fork_error", "socket": "...", "error": "..."}
+  stdout ← {"type": "exited", "pid": 123, "code": 0, "signal": null}
+
+Ребёнок открывает к unix-сокету supervisor'а три соединения — stdin, stdout и stderr
+воркера; первый байт каждого (b"i", b"o", b"e") говорит Node, какой это поток.
+Отдельные соединения нужны, чтобы O_NONBLOCK, который ставит на stdin
+loop.connect_read_pipe, не делал неблокирующим stdout. Только POSIX (нужен os.fork).
+"""
+
+from __future__ import annotations
+
+import importlib
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Модули, которые тянут сгенерированные боты (порядок = порядок импорта)
+_DEFAULT_PRELOAD = (
+    "asyncio",
+    "uvloop",
+    "aiohttp",
+    "aiogram",
+    "aiogram.fsm.storage.memory",
+    "asyncpg",
+    "redis.asyncio",
+    "pytz",
+    "dotenv",
+    "telethon",
+)
+
+_out_lock = threading.Lock()
+_import_times: Dict[str, Optional[float]] = {}
+_children = threading.Condition()
+_live_children = 0
+
+
+def _send(payload: Dict[str, Any]) -> None:
+    """JSON-строка в stdout zygote (из нескольких потоков)."""
+    line = json.dumps(payload, ensure_ascii=False)
+    with _out_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def preload(names: tuple[str, ...]) -> float:
+    """
+    Импортирует модули и замеряет время каждого (мс, None — модуль не установлен).
+    @returns суммарное время импорта в мс
+    """
+    t_total = time.perf_counter()
+    for name in names:
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            _import_times[name] = round((time.perf_counter() - t0) * 1000, 1)
+        except Exception:
+            _import_times[name] = None
+    # Сам воркер и его модули — тоже заранее
+    t0 = time.perf_counter()
+    import worker  # noqa: F401
+
+    _import_times["worker"] = round((time.perf_counter() - t0) * 1000, 1)
+    return round((time.perf_counter() - t_total) * 1000, 1)
+
+
+def _reaper() -> None:
+    """Собирает завершившихся детей и сообщает код выхода."""
+    global _live_children
+    while True:
+        with _children:
+            while _live_children == 0:
+                _children.wait()
+        try:
+            pid, status = os.waitpid(-1, 0)
+        except ChildProcessError:
+            with _children:
+                _live_children = 0
+            continue
+        with _children:
+            _live_children = max(0, _live_children - 1)
+        sig = os.WTERMSIG(status) if os.WIFSIGNALED(status) else None
+        code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else None
+        _send({"type": "exited", "pid": pid, "code": code, "signal": sig})
+
+
+# Роли соединений ребёнка: fd → первый байт соединения
+_CHILD_STREAMS = ((0, b"i"), (1, b"o"), (2, b"e"))
+
+
+def _become_worker(sock_path: str, env: Dict[str, str]) -> None:
+    """Код ребёнка после fork: соединения → stdin/stdout/stderr, env проекта, worker.main()."""
+    code = 0
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        for fd, role in _CHILD_STREAMS:
+            # Своё соединение (open file description) на каждый fd — флаги fd не общие
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.connect(sock_path)
+            conn.sendall(role)
+            os.dup2(conn.fileno(), fd)
+            conn.close()
+        sys.stdin = open(0, mode="r", encoding="utf-8", closefd=False)
+        sys.stdout = open(1, mode="w", encoding="utf-8", buffering=1, closefd=False)
+        sys.stderr = open(2, mode="w", encoding="utf-8", buffering=1, closefd=False)
+        os.environ.update(env)
+
+        import worker
+
+        worker.main()
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except BaseException as e:  # noqa: BLE001 — ребёнок не должен вернуться в цикл zygote
+        try:
+            sys.stderr.write(f"[zygote-child] {type(e).__name__}: {e}\n")
+            sys.stderr.flush()
+        except Exception:
+            pass
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def _fork(sock_path: str, env: Dict[str, str]) -> None:
+    global _live_children
+    sys.stdout.flush()
+    sys.stderr.flush()
+    with _out_lock:
+        # Lock держим на время fork, чтобы ребёнок не унаследовал его захваченным
+        pid = os.fork()
+        if pid == 0:
+            _out_lock.release()
+            _become_worker(sock_path, env)
+    with _children:
+        _live_children += 1
+        _children.notify()
+    _send({"type": "forked", "socket": sock_path, "pid": pid})
+
+
+def main() -> None:
+    """Точка входа zygote."""
+    if not hasattr(os, "fork"):
+        _send({"type": "zygote_unsupported", "error": "os.fork недоступен"})
+        sys.exit(2)
+    sys.stdout.reconfigure(line_buffering=True)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    raw = os.environ.get("ZYGOTE_PRELOAD", "")
+    names = tuple(n.strip() for n in raw.split(",") if n.strip()) or _DEFAULT_PRELOAD
+    total_ms = preload(names)
+    threading.Thread(target=_reaper, name="zygote-reaper", daemon=True).start()
+    _send({"type": "zygote_ready", "imports": _import_times, "total_ms": total_ms})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            _send({"type": "json_error", "error": str(e)})
+            continue
+        cmd = data.get("cmd")
+        if cmd == "fork":
+            sock_path = str(data.get("socket", ""))
+            env = {str(k): str(v) for k, v in (data.get("env") or {}).items()}
+            try:
+                _fork(sock_path, env)
+            except OSError as e:
+                _send({"type": "fork_error", "socket": sock_path, "error": str(e)})
+        elif cmd == "import_times":
+            _send({"type": "import_times", "imports": _import_times})
+        else:
+            _send({"type": "unknown_command", "cmd": cmd})
+
+
+if __name__ == "__main__":
+    main()
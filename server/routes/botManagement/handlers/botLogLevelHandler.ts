@@ -0,0 +1,50 @@
+/**
+ * @fileoverview Хендлер уровня логов ботов проекта без рестарта
+ *
+ * Передаёт правило set_log_level воркерам проекта. Правило запоминается
+ * менеджером и повторяется в шардах, которые поднимутся позже, поэтому
+ * ответ успешен и без запущенного воркера (applied: false).
+ * Проверка доступа выполняется middleware requireProjectAccess.
+ *
+ * @module botManagement/handlers/botLogLevelHandler
+ */
+
+import type { Request, Response } from 'express';
+import { workerManager } from '../../../bots/botWorkerManager';
+import { parseLogLevelRule } from '../../../bots/workerLogLevels';
+import { storage } from '../../../storages/storage';
+
+/**
+ * Обрабатывает POST /api/projects/:id/bot/log-level
+ *
+ * @param req - Тело: { tokenId?, logger?, level? (null — снять), sample? }
+ * @param res - Объект ответа Express
+ */
+export async function handleBotLogLevel(req: Request, res: Response): Promise<void> {
+    try {
+        const projectId = parseInt(req.params.id);
+        const rule = parseLogLevelRule(req.body);
+        if ('error' in rule) {
+            res.status(400).json({ message: rule.error });
+            return;
+        }
+
+        if (rule.tokenId !== undefined) {
+            const tokenRow = await storage.getBotToken(rule.tokenId);
+            if (!tokenRow || tokenRow.projectId !== projectId) {
+                res.status(404).json({ message: "Токен не найден в этом проекте" });
+                return;
+            }
+        }
+
+        const reply = await workerManager.setLogLevel(projectId, rule);
+        if (reply && !reply.ok) {
+            res.status(400).json({ message: reply.error || "Воркер отклонил правило логов" });
+            return;
+        }
+        res.json({ message: "Уровень логов обновлён", applied: reply !== null });
+    } catch (error) {
+        console.error('Ошибка установки уровня логов:', error);
+        res.status(500).json({ message: "Не удалось изменить уровень логов" });
+    }
+}
@@ -0,0 +1,50 @@
+/**
+ * @fileoverview Хендлер лимита строк лога ботов проекта без рестарта
+ *
+ * Передаёт лимит set_log_limit воркерам проекта. Лимит запоминается
+ * менеджером и повторяется в шардах, которые поднимутся позже, поэтому
+ * ответ успешен и без запущенного воркера (applied: false).
+ * Проверка доступа выполняется middleware requireProjectAccess.
+ *
+ * @module botManagement/handlers/botLogLimitHandler
+ */
+
+import type { Request, Response } from 'express';
+import { workerManager } from '../../../bots/botWorkerManager';
+import { parseLogLimitRule } from '../../../bots/workerLogLevels';
+import { storage } from '../../../storages/storage';
+
+/**
+ * Обрабатывает POST /api/projects/:id/bot/log-limit
+ *
+ * @param req - Тело: { tokenId?, rate (null — сброс), burst? }
+ * @param res - Объект ответа Express
+ */
+export async function handleBotLogLimit(req: Request, res: Response): Promise<void> {
+    try {
+        const projectId = parseInt(req.params.id);
+        const rule = parseLogLimitRule(req.body);
+        if ('error' in rule) {
+            res.status(400).json({ message: rule.error });
+            return;
+        }
+
+        if (rule.tokenId !== undefined) {
+            const tokenRow = await storage.getBotToken(rule.tokenId);
+            if (!tokenRow || tokenRow.projectId !== projectId) {
+                res.status(404).json({ message: "Токен не найден в этом проекте" });
+                return;
+            }
+        }
+
+        const reply = await workerManager.setLogLimit(projectId, rule);
+        if (reply && !reply.ok) {
+            res.status(400).json({ message: reply.error || "Воркер отклонил лимит логов" });
+            return;
+        }
+        res.json({ message: "Лимит логов обновлён", applied: reply !== null });
+    } catch (error) {
+        console.error('Ошибка установки лимита логов:', error);
+        res.status(500).json({ message: "Не удалось изменить лимит логов" });
+    }
+}
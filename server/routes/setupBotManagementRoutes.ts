@@ -26,6 +26,8 @@ import { handleWorkerStats } from './botManagement/handlers/workerStatsHandler';
 import { handleClearLogs } from './botManagement/handlers/clearLogsHandler';
 import { handleGetLiveBotLogs } from './botManagement/handlers/botLiveLogsHandler';
 import { handleGetBotLogById } from './botManagement/handlers/botLogByIdHandler';
+import { handleBotLogLevel } from './botManagement/handlers/botLogLevelHandler';
+import { handleBotLogLimit } from './botManagement/handlers/botLogLimitHandler';
 
 /**
  * Настраивает маршруты управления ботами
@@ -59,5 +61,7 @@ export function setupBotManagementRoutes(app: Express): void {
     app.post("/api/projects/:id/bot/restart-all", requireProjectAccess, handleBotRestartAll);
     app.post("/api/projects/:id/bot/start-offline-all", requireProjectAccess, handleBotStartOfflineAll);
     app.get("/api/projects/:id/bot/statuses", requireProjectAccess, handleBotProjectStatuses);
+    app.post("/api/projects/:id/bot/log-level", requireProjectAccess, handleBotLogLevel);
+    app.post("/api/projects/:id/bot/log-limit", requireProjectAccess, handleBotLogLimit);
     app.delete("/api/projects/:projectId/tokens/:tokenId/logs", requireProjectAccess, handleClearLogs);
 }
@@ -4,10 +4,14 @@
  */
 
 import type { Express } from 'express';
+import { workerManager } from '../bots/botWorkerManager';
 
 /** Базовый порт для aiohttp серверов ботов */
 const BASE_WEBHOOK_PORT = 9000;
 
+/** Заголовок секрета webhook (проверяет Python-сторона) */
+const SECRET_TOKEN_HEADER = 'x-telegram-bot-api-secret-token';
+
 /**
  * Вычисляет порт aiohttp сервера бота по tokenId.
  * Формула: BASE_WEBHOOK_PORT + tokenId
@@ -18,12 +22,25 @@ export function getBotWebhookPort(tokenId: number): number {
   return BASE_WEBHOOK_PORT + tokenId;
 }
 
+/**
+ * Куда проксировать апдейт бота: общий webhook-сервер воркера
+ * (/webhook/{tokenId}) или собственный aiohttp бота на 9000 + tokenId.
+ * @param projectId - ID проекта
+ * @param tokenId - Идентификатор токена бота
+ * @returns URL для POST апдейта
+ */
+export function resolveBotWebhookTarget(projectId: number, tokenId: number): string {
+  return workerManager.webhookTarget(projectId, tokenId)
+    ?? `http://localhost:${getBotWebhookPort(tokenId)}/webhook`;
+}
+
 /**
  * Регистрирует роут приёма webhook-апдейтов от Telegram.
  *
  * Telegram шлёт POST на /api/webhook/:projectId/:tokenId,
- * Node.js проксирует тело запроса в Python aiohttp сервер бота
- * на localhost:{BASE_WEBHOOK_PORT + tokenId}/webhook.
+ * Node.js проксирует тело запроса в общий webhook-сервер воркера
+ * (один порт на шард) или в aiohttp сервер бота на localhost:{BASE_WEBHOOK_PORT + tokenId}/webhook.
+ * Заголовок секрета Telegram передаётся как есть — сверяет его Python.
  *
  * Роут работает всегда — webhook режим управляется настройками токена в БД.
  *
@@ -43,13 +60,15 @@ export function setupWebhookRoutes(app: Express): void {
       return;
     }
 
-    const botPort = getBotWebhookPort(tokenId);
-    const targetUrl = `http://localhost:${botPort}/webhook`;
+    const targetUrl = resolveBotWebhookTarget(projectId, tokenId);
+    const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+    const secretToken = req.get(SECRET_TOKEN_HEADER);
+    if (secretToken) headers[SECRET_TOKEN_HEADER] = secretToken;
 
     try {
       const response = await fetch(targetUrl, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers,
         body: JSON.stringify(req.body),
         signal: AbortSignal.timeout(55_000), // Telegram ждёт ответ максимум 60 сек
       });
@@ -58,7 +77,7 @@ export function setupWebhookRoutes(app: Express): void {
     } catch (error) {
       const message = error instanceof Error ? error.message : 'Неизвестная ошибка';
       console.error(
-        `[Webhook] Ошибка проксирования апдейта → проект ${projectId}, токен ${tokenId}, порт ${botPort}: ${message}`
+        `[Webhook] Ошибка проксирования апдейта → проект ${projectId}, токен ${tokenId}, ${targetUrl}: ${message}`
       );
       // Возвращаем 200 чтобы Telegram не повторял апдейт при недоступном боте
       res.status(200).end();
@@ -31,15 +31,17 @@ export function registerWebhookPaths(
       "`{webhookBaseUrl}/api/webhook/{projectId}/{tokenId}`\n\n" +
       "**Поток:**\n" +
       "1. Telegram → POST этот URL с JSON Update\n" +
-      "2. Node.js (`setupWebhookRoutes`) проксирует body на `http://localhost:{9000+tokenId}/webhook`\n" +
+      "2. Node.js (`setupWebhookRoutes`) проксирует body в общий webhook-сервер воркера " +
+      "`http://127.0.0.1:{порт шарда}/webhook/{tokenId}` или, вне воркера, на `http://localhost:{9000+tokenId}/webhook`\n" +
       "3. Python aiohttp + aiogram (`SimpleRequestHandler`) обрабатывает сценарий\n\n" +
       "**UI:** превью URL в `BotLaunchSettings` (`buildWebhookPreview`).\n\n" +
       "**Порт Python:** `9000 + tokenId` (константа `BASE_WEBHOOK_PORT` в `setupWebhookRoutes.ts`). " +
-      "В Worker Pool каждый бот внутри `worker.py` поднимает свой aiohttp на этом порту.\n\n" +
+      "В Worker Pool боты шарда обслуживает один aiohttp воркера (порт из system-события `webhook_server:PORT`), " +
+      "9000+tokenId — только для ботов вне общего сервера.\n\n" +
       "**Ответ:** обычно **пустое body** — статус копируется с Python-сервера или `200` при ошибке прокси " +
       "(чтобы Telegram не ретраил апдейт, если процесс бота недоступен).\n\n" +
-      "**Безопасность:** Node **не** проверяет `webhookSecretToken` из настроек токена — " +
-      "секрет можно задать только при `set_webhook` на стороне бота (отдельная задача). " +
+      "**Безопасность:** `webhookSecretToken` из настроек токена бот передаёт в `set_webhook`; " +
+      "Node пересылает заголовок `X-Telegram-Bot-Api-Secret-Token`, сверяет его Python (401 при несовпадении). " +
       "Не публикуйте URL без TLS на production.\n\n" +
       "**Polling vs webhook:** при `launchMode: polling` этот URL не регистрируется в Telegram; " +
       "эндпоинт может оставаться доступным, но апдейты не приходят.",